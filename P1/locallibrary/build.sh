@@ -15,6 +15,12 @@ python manage.py flush --no-input
 
 python populate_catalog.py
 
+# flush no vacia el indice de busqueda (tabla sin modelo)
+python manage.py rebuild_search_index
+
+# Estadisticas del planificador tras la carga inicial
+python manage.py optimize_database --analyze
+
 # 4. Crear el superusuario automáticamente (usando el comando que creamos antes)
 python manage.py createsu
 
@@ -1,5 +1,9 @@
 from django.contrib import admin
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+
 from .models import Author, Genre, Book, BookInstance, Language
+from .pagination import EstimatedCountPaginator
 
 # admin.site.register(Book)
 # admin.site.register(Author)
@@ -8,9 +12,42 @@ admin.site.register(Genre)
 admin.site.register(Language)
 
 
-class BooksInline(admin.TabularInline):
+class CappedInlineFormSet(BaseInlineFormSet):
+    """Inline formset that edits at most ``max_rows`` related objects.
+
+    An author with thousands of books (or a book with thousands of
+    copies) would otherwise render, and post back, a form per row. The
+    template links to the change list with all of them.
+    """
+
+    max_rows = 50
+
+    def get_queryset(self):
+        if not hasattr(self, '_capped_queryset'):
+            queryset = super().get_queryset()
+            # Una fila de mas para saber si hay que contar el resto
+            rows = list(queryset[:self.max_rows + 1])
+            self.truncated = len(rows) > self.max_rows
+            self.total = queryset.count() if self.truncated else len(rows)
+            self._capped_queryset = rows[:self.max_rows]
+        return self._capped_queryset
+
+    def changelist_url(self):
+        opts = self.model._meta
+        url = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')
+        return f'{url}?{self.fk.name}__id__exact={self.instance.pk}'
+
+
+class CappedTabularInline(admin.TabularInline):
+    formset = CappedInlineFormSet
+    template = 'admin/catalog/capped_tabular.html'
+
+
+class BooksInline(CappedTabularInline):
     model = Book
     extra = 0
+    # Orden estable entre el GET y el POST del formulario
+    ordering = ('title', 'id')
 
 
 @admin.register(Author)
@@ -20,29 +57,47 @@ class AuthorAdmin(admin.ModelAdmin):
     )
     fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death')]
     inlines = [BooksInline]
+    # Para los autocompletados de autor
+    search_fields = ('^last_name', '^first_name')
 
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
     list_filter = ('status', 'due_back')
+    list_select_related = ('book', 'borrower')
+    autocomplete_fields = ('book', 'borrower')
+    paginator = EstimatedCountPaginator
+    # Sin el COUNT(*) de la tabla entera al filtrar
+    show_full_result_count = False
 
     fieldsets = (
         (None, {
             'fields': ('book', 'imprint', 'id')
         }),
         ('Availability', {
-            'fields': ('status', 'due_back')
+            'fields': ('status', 'due_back', 'borrower')
         }),
     )
 
 
-class BooksInstanceInline(admin.TabularInline):
+class BooksInstanceInline(CappedTabularInline):
     model = BookInstance
     extra = 0
+    ordering = ('imprint', 'id')
+    autocomplete_fields = ('borrower',)
 
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'display_genre')
+    list_select_related = ('author',)
+    autocomplete_fields = ('author',)
+    search_fields = ('^title', '=isbn')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [BooksInstanceInline]
+
+    def get_queryset(self, request):
+        # Los generos de toda la pagina en una consulta (display_genre)
+        return super().get_queryset(request).prefetch_related('genre')
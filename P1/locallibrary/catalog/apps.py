@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
 
 
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        # Registramos los receivers de señales (contadores del catálogo)
+        from . import signals  # noqa: F401
+        from .maintenance import periodic_optimize
+
+        # PRAGMA optimize periodico de SQLite (ver catalog/maintenance.py)
+        request_finished.connect(
+            periodic_optimize, dispatch_uid='catalog.periodic_optimize'
+        )
@@ -0,0 +1,229 @@
+"""
+Async versions of the read-only catalog views, served to ASGI requests.
+
+Same URLs, templates, context, page cache and conditional GET as their
+counterparts in catalog.views; ``AsyncViewsMiddleware`` routes ASGI
+requests here, WSGI requests keep the synchronous views. Independent
+queries (a page of rows and its COUNT, the genres and the copies of a
+book) are awaited together with ``asyncio.gather``.
+
+Django's async ORM runs each query through ``sync_to_async`` in the
+request's thread-sensitive worker, so the queries of one request still
+reach the database one after another; what changes is that waiting on
+the database or on a slow client no longer holds a worker thread, so
+one ASGI worker keeps many more connections open than WSGI threads.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Page
+from django.db.models import aprefetch_related_objects
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from django.template.response import TemplateResponse
+from django.views.decorators.http import require_safe
+
+from . import facets, page_cache
+from .models import Author, Book, CatalogStats
+from .pagination import (
+    AFTER, BEFORE, EstimatedCountPaginator, InvalidCursor, KeysetPaginator,
+)
+from .views import BOOK_ORDERINGS, book_sort
+from .visits import record_visit
+
+
+async def _resolve_user(request):
+    # request.user es un objeto perezoso que consulta la BD de forma
+    # sincrona: lo resolvemos una vez para el resto de la peticion.
+    request.user = await request.auser()
+
+
+async def _cached(request, dependencies, render):
+    """Async counterpart of ``CachedPageMixin.dispatch``."""
+    timeout = getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 600)
+    if not timeout:
+        return await render()
+    key = await sync_to_async(page_cache.page_key)(request, dependencies)
+    if key is None:
+        return await render()
+    response = await cache.aget(key)
+    if response is not None:
+        return page_cache.cached_response(request, response)
+    response = await render()
+    page_cache.store_page(key, response, timeout)
+    return response
+
+
+async def _paginate(request, queryset, per_page, count=None):
+    """Returns ``(paginator, page)`` like ``MultipleObjectMixin``.
+
+    ``count``, if known, saves the ``COUNT`` query.
+    """
+    mode = getattr(settings, 'CATALOG_PAGINATION_MODE', 'offset')
+    if mode == 'keyset':
+        paginator = KeysetPaginator(queryset, per_page)
+        try:
+            page = await sync_to_async(paginator.page)(
+                after=request.GET.get(AFTER), before=request.GET.get(BEFORE),
+            )
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return paginator, page
+
+    paginator = EstimatedCountPaginator(queryset, per_page)
+    if count is not None:
+        paginator.count = count
+    number = request.GET.get('page') or 1
+    if number == 'last':
+        if count is None:
+            paginator.count = await _count(paginator)
+        number = paginator.num_pages
+    try:
+        number = int(number)
+    except ValueError:
+        raise Http404('Page is not “last”, nor can it be converted to an int.')
+
+    # La pagina se pide a la vez que el COUNT, antes de validar el numero
+    bottom = (number - 1) * per_page
+    page = _list(queryset[max(bottom, 0):bottom + per_page])
+    if count is None:
+        paginator.count, objects = await asyncio.gather(
+            _count(paginator), page,
+        )
+    else:
+        objects = await page
+    try:
+        number = paginator.validate_number(number)
+    except InvalidPage as e:
+        raise Http404(f'Invalid page ({number}): {e}')
+    return paginator, Page(objects, number, paginator)
+
+
+async def _count(paginator):
+    # COUNT(*) o estimacion del planificador (ver catalog/pagination.py)
+    return await sync_to_async(lambda: paginator.count)()
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _list_response(request, template_name, name, queryset, per_page,
+                         count=None):
+    paginator, page = await _paginate(request, queryset, per_page, count)
+    return TemplateResponse(request, template_name, {
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'is_keyset_paginated': isinstance(paginator, KeysetPaginator),
+        'object_list': page.object_list,
+        name: page.object_list,
+    })
+
+
+async def _detail_response(request, obj, template_name, name, *lookups):
+    """Renders ``obj`` after the conditional GET check.
+
+    The related ``lookups`` are only loaded when the page is rendered.
+    """
+    variant = page_cache.user_variant(request)
+    headers = page_cache.validators(obj, variant) if variant else {}
+    if headers:
+        not_modified = page_cache.not_modified(request, headers)
+        if not_modified is not None:
+            return not_modified
+    await asyncio.gather(*(
+        aprefetch_related_objects([obj], lookup) for lookup in lookups
+    ))
+    response = TemplateResponse(
+        request, template_name, {'object': obj, name: obj}
+    )
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+@require_safe
+async def index(request):
+    await _resolve_user(request)
+    stats, num_visits = await asyncio.gather(
+        sync_to_async(CatalogStats.load)(),
+        sync_to_async(record_visit)(request),
+    )
+    context = {
+        'num_books': stats.num_books,
+        'num_instances': stats.num_instances,
+        'num_instances_available': stats.num_instances_available,
+        'num_genres': stats.num_genres,
+        'num_authors': stats.num_authors,
+        'num_visits': num_visits,
+        'num_books_a': stats.num_books_a,
+    }
+    return TemplateResponse(request, 'index.html', context=context)
+
+
+@require_safe
+async def book_list(request):
+    await _resolve_user(request)
+
+    async def render():
+        sort = book_sort(request)
+        book_facets = await sync_to_async(facets.facet_counts)(request.GET)
+        response = await _list_response(
+            request, 'catalog/book_list.html', 'book_list',
+            facets.filter_books(
+                Book.objects.select_related('author'), book_facets.selection,
+            ).order_by(*BOOK_ORDERINGS[sort]),
+            per_page=2, count=book_facets.total,
+        )
+        response.context_data['sort'] = sort
+        response.context_data['facets'] = book_facets
+        return response
+
+    return await _cached(request, [page_cache.BOOK_LIST], render)
+
+
+@require_safe
+async def book_detail(request, pk):
+    await _resolve_user(request)
+
+    async def render():
+        book = await aget_object_or_404(
+            Book.objects.select_related('author', 'language'), pk=pk
+        )
+        return await _detail_response(
+            request, book, 'catalog/book_detail.html', 'book',
+            'genre', 'bookinstance_set',
+        )
+
+    return await _cached(request, [page_cache.book_key(pk)], render)
+
+
+@require_safe
+async def author_list(request):
+    await _resolve_user(request)
+
+    async def render():
+        return await _list_response(
+            request, 'catalog/author_list.html', 'author_list',
+            Author.objects.all(), per_page=10,
+        )
+
+    return await _cached(request, [page_cache.AUTHOR_LIST], render)
+
+
+@require_safe
+async def author_detail(request, pk):
+    await _resolve_user(request)
+
+    async def render():
+        author = await aget_object_or_404(Author, pk=pk)
+        return await _detail_response(
+            request, author, 'catalog/author_detail.html', 'author',
+            'book_set',
+        )
+
+    return await _cached(request, [page_cache.author_key(pk)], render)
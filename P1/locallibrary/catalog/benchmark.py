@@ -0,0 +1,519 @@
+"""
+HTTP benchmark of the catalog URLs.
+
+Drives ``index``, ``books``, ``book-detail``, ``authors``, ``author-detail``,
+``all-borrowed``, ``my-borrowed`` and the renew form either in-process
+(through the Django test client, which also counts the SQL queries of every
+request) or against a local server started on a free port: Django's
+threaded WSGI server, or uvicorn for the ASGI application when it is
+installed. The ASGI modes (``inprocess-asgi`` and ``asgi``) go through
+the async read-only views and can be compared with their WSGI
+counterpart. For every URL it reports p50/p95/p99 latency, queries per
+request and throughput, and results are saved as JSON so that runs can be
+compared across commits. Used by ``manage.py benchmark_catalog``.
+
+``RenewalLoad`` renews loans from background threads (each one with its
+own connection) while the reads run, to measure read throughput under
+concurrent writes; with SQLite, ``sqlite_profile`` switches between the
+``DB_SQLITE_PROFILE`` profiles to compare them on the same data.
+"""
+
+import datetime
+import http.cookiejar
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from locallibrary.database import sqlite_options
+
+from . import circulation
+from .models import Author, Book, BookInstance, CatalogStats
+
+LIBRARIAN = 'bench_librarian'
+
+# Modos de ejecucion y su equivalente WSGI, para comparar manejadores
+WSGI_VARIANT = {
+    'inprocess': 'inprocess',
+    'inprocess-asgi': 'inprocess',
+    'wsgi': 'wsgi',
+    'asgi': 'wsgi',
+}
+MODES = list(WSGI_VARIANT)
+
+
+@dataclass
+class Target:
+    name: str
+    urls: list
+    user: str = None
+
+
+@dataclass
+class Result:
+    name: str
+    requests: int = 0
+    errors: int = 0
+    latencies: list = field(default_factory=list, repr=False)
+    queries: list = field(default_factory=list, repr=False)
+    wall_time: float = 0.0
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            'name': self.name,
+            'requests': self.requests,
+            'errors': self.errors,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'mean_queries': (
+                sum(self.queries) / len(self.queries) if self.queries else None
+            ),
+            'throughput_rps': (
+                self.requests / self.wall_time if self.wall_time else 0.0
+            ),
+        }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def sample_pks(queryset, count, rng):
+    """Picks ``count`` pks without loading the whole table."""
+    total = queryset.count()
+    if not total:
+        return []
+    offsets = sorted(rng.randrange(total) for _ in range(count))
+    return [
+        queryset.order_by('pk').values_list('pk', flat=True)[offset]
+        for offset in offsets
+    ]
+
+
+def get_librarian():
+    user, created = get_user_model().objects.get_or_create(username=LIBRARIAN)
+    if created:
+        user.set_unusable_password()
+        user.save()
+        user.user_permissions.add(
+            Permission.objects.get(codename='can_mark_returned')
+        )
+    return user
+
+
+def get_reader():
+    """A user with copies on loan (or the librarian if nobody has any)."""
+    borrower = BookInstance.objects.filter(
+        status='o', borrower__isnull=False
+    ).values_list('borrower', flat=True).order_by('borrower').first()
+    if borrower is None:
+        return get_librarian()
+    return get_user_model().objects.get(pk=borrower)
+
+
+def build_targets(samples=20, seed=0):
+    rng = random.Random(seed)
+    books = sample_pks(Book.objects.all(), samples, rng)
+    authors = sample_pks(Author.objects.all(), samples, rng)
+    copies = sample_pks(
+        BookInstance.objects.filter(status='o'), samples, rng
+    )
+    targets = [
+        Target('index', [reverse('index')]),
+        Target('books', [reverse('books')]),
+        Target('authors', [reverse('authors')]),
+        Target('all-borrowed', [reverse('all-borrowed')], user='librarian'),
+        Target('my-borrowed', [reverse('my-borrowed')], user='reader'),
+    ]
+    if books:
+        targets.append(Target(
+            'book-detail', [reverse('book-detail', args=[pk]) for pk in books]
+        ))
+    if authors:
+        targets.append(Target(
+            'author-detail',
+            [reverse('author-detail', args=[pk]) for pk in authors],
+        ))
+    if copies:
+        targets.append(Target(
+            'renew',
+            [reverse('renew-book-librarian', args=[pk]) for pk in copies],
+            user='librarian',
+        ))
+    return targets
+
+
+def _users():
+    return {'librarian': get_librarian(), 'reader': get_reader()}
+
+
+def run_in_process(targets, requests=100, warmup=5, asgi=False):
+    """Runs every target sequentially through the test client.
+
+    With ``asgi`` the requests go through the ASGI handler (AsyncClient),
+    and so through the async views.
+    """
+    users = _users()
+    results = []
+    for target in targets:
+        client = AsyncClient() if asgi else Client()
+        get = async_to_sync(client.get) if asgi else client.get
+        if target.user:
+            client.force_login(users[target.user])
+        result = Result(target.name)
+        for i in range(warmup):
+            get(target.urls[i % len(target.urls)])
+        start = time.perf_counter()
+        for i in range(requests):
+            url = target.urls[i % len(target.urls)]
+            with CaptureQueriesContext(connection) as queries:
+                t0 = time.perf_counter()
+                response = get(url)
+                result.latencies.append(time.perf_counter() - t0)
+            result.queries.append(len(queries))
+            result.requests += 1
+            result.errors += response.status_code >= 400
+        result.wall_time = time.perf_counter() - start
+        results.append(result)
+    return results
+
+
+class RenewalLoad:
+    """Renews random loans from ``writers`` threads until exited.
+
+    Each renewal is one ``circulation.circulate`` call (a locked SELECT
+    and an UPDATE in one transaction, plus the counters and page cache
+    invalidation), like a librarian renewing at the desk.
+    """
+
+    def __init__(self, writers, copies, seed=0):
+        self.writers = writers
+        self.copies = copies
+        self.rng = random.Random(seed)
+        self.result = Result('renewals')
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.threads = []
+
+    def renew_once(self):
+        copy_id = self.rng.choice(self.copies)
+        due_back = datetime.date.today() + datetime.timedelta(
+            days=self.rng.randint(7, 28)
+        )
+        t0 = time.perf_counter()
+        try:
+            outcome = circulation.circulate(
+                circulation.RENEW, [copy_id], due_back=due_back
+            )
+            failed = not outcome.done
+        except (DatabaseError, circulation.CirculationError):
+            # "database is locked" cuando se agota el busy timeout
+            failed = True
+        elapsed = time.perf_counter() - t0
+        with self.lock:
+            self.result.latencies.append(elapsed)
+            self.result.requests += 1
+            self.result.errors += failed
+
+    def _work(self):
+        try:
+            while not self.stop.is_set():
+                self.renew_once()
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        if self.writers and self.copies:
+            self.start = time.perf_counter()
+            self.threads = [
+                threading.Thread(target=self._work, daemon=True)
+                for _ in range(self.writers)
+            ]
+            for thread in self.threads:
+                thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+        if self.threads:
+            self.result.wall_time = time.perf_counter() - self.start
+
+
+def loan_ids(count=200, seed=0):
+    """IDs of copies on loan, for ``RenewalLoad``."""
+    return [
+        str(pk) for pk in sample_pks(
+            BookInstance.objects.filter(status='o'), count, random.Random(seed)
+        )
+    ]
+
+
+def current_sqlite_profile(using=DEFAULT_DB_ALIAS):
+    if connections[using].vendor != 'sqlite':
+        return None
+    return os.environ.get('DB_SQLITE_PROFILE') or 'production'
+
+
+@contextmanager
+def sqlite_profile(profile, using=DEFAULT_DB_ALIAS):
+    """Opens the connections of the block with another SQLite profile."""
+    options = connections[using].settings_dict['OPTIONS']
+    saved = dict(options)
+    for name in ('init_command', 'timeout', 'transaction_mode'):
+        options.pop(name, None)
+    options.update(sqlite_options(os.environ, profile))
+    # Las conexiones nuevas (una por hilo) leen las opciones al abrirse;
+    # el modo del journal se guarda en el fichero y se cambia aqui, sin
+    # otras conexiones abiertas.
+    connections.close_all()
+    journal_mode = _journal_mode(using, 'wal' if profile == 'production' else 'delete')
+    try:
+        yield
+    finally:
+        connections.close_all()
+        options.clear()
+        options.update(saved)
+        _journal_mode(using, journal_mode)
+
+
+def _journal_mode(using, mode):
+    """Sets the journal mode of the database file; returns the old one."""
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        old = cursor.fetchone()[0]
+        cursor.execute(f'PRAGMA journal_mode={mode}')
+    connections[using].close()
+    return old
+
+
+class LocalServer:
+    """Serves the project on 127.0.0.1 from a background thread."""
+
+    def __init__(self, kind='wsgi'):
+        self.kind = kind
+        self.port = None
+
+    def __enter__(self):
+        if self.kind == 'asgi':
+            self._start_asgi()
+        else:
+            self._start_wsgi()
+        return self
+
+    def _start_wsgi(self):
+        from django.core.servers.basehttp import (
+            ThreadedWSGIServer,
+            WSGIRequestHandler,
+        )
+        from django.core.wsgi import get_wsgi_application
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+        self.server.set_app(get_wsgi_application())
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+
+    def _start_asgi(self):
+        try:
+            import uvicorn
+        except ImportError:
+            raise RuntimeError('The ASGI benchmark needs uvicorn installed')
+        import socket
+        from django.core.asgi import get_asgi_application
+
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+        config = uvicorn.Config(
+            get_asgi_application(), log_level='warning', lifespan='off'
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(
+            target=self.server.run, kwargs={'sockets': [sock]}, daemon=True
+        )
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def __exit__(self, *exc_info):
+        if self.kind == 'asgi':
+            self.server.should_exit = True
+            self.thread.join()
+        else:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.port}{path}'
+
+
+def _session_opener(user):
+    """urllib opener carrying the session cookie of ``user``."""
+    jar = http.cookiejar.CookieJar()
+    if user is not None:
+        client = Client()
+        client.force_login(user)
+        for morsel in client.cookies.values():
+            jar.set_cookie(http.cookiejar.Cookie(
+                0, morsel.key, morsel.value, None, False, '127.0.0.1', False,
+                False, '/', True, False, None, True, None, None, {},
+            ))
+    return urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(jar)
+    )
+
+
+def run_server(targets, requests=100, concurrency=8, warmup=5, kind='wsgi'):
+    """Runs every target with ``concurrency`` clients against a server."""
+    users = _users()
+    results = []
+    with LocalServer(kind) as server:
+        for target in targets:
+            opener = _session_opener(users.get(target.user))
+            result = Result(target.name)
+            lock = threading.Lock()
+
+            def fetch(i):
+                url = server.url(target.urls[i % len(target.urls)])
+                t0 = time.perf_counter()
+                try:
+                    with opener.open(url) as response:
+                        response.read()
+                    failed = False
+                except OSError:
+                    failed = True
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    result.latencies.append(elapsed)
+                    result.requests += 1
+                    result.errors += failed
+
+            for i in range(warmup):
+                fetch(i)
+            result.latencies.clear()
+            result.requests = result.errors = 0
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(fetch, range(requests)))
+            result.wall_time = time.perf_counter() - start
+            results.append(result)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, mode, options=None, sqlite_profile=None):
+    stats = CatalogStats.load()
+    return {
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'mode': mode,
+        'database': connection.vendor,
+        'sqlite_profile': sqlite_profile or current_sqlite_profile(),
+        'db_pool': connection.settings_dict['OPTIONS'].get('pool'),
+        'options': options or {},
+        'dataset': {
+            'books': stats.num_books,
+            'copies': stats.num_instances,
+            'authors': stats.num_authors,
+        },
+        'results': [result.summary() for result in results],
+    }
+
+
+def save_report(data, directory):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = directory / f'{stamp}-{data["mode"]}-{data["revision"] or "norev"}.json'
+    path.write_text(json.dumps(data, indent=2))
+    return path
+
+
+def load_report(path):
+    return json.loads(Path(path).read_text())
+
+
+def latest_report(directory, mode, exclude=None):
+    """Most recent saved report of the same mode (to compare against)."""
+    # <fecha>-<hora>-<us>-<modo>-<revision>.json; el modo puede tener guiones
+    paths = sorted(
+        path for path in Path(directory).glob(f'*-{mode}-*.json')
+        if '-'.join(path.stem.split('-')[3:-1]) == mode and path != exclude
+    )
+    return paths[-1] if paths else None
+
+
+def format_table(data, baseline=None):
+    previous = {}
+    if baseline:
+        previous = {row['name']: row for row in baseline['results']}
+        # Contra otro modo (WSGI frente a ASGI), otro perfil de SQLite o
+        # contra otro commit
+        label = baseline['revision']
+        for key in ('sqlite_profile', 'mode'):
+            if baseline.get(key) != data.get(key):
+                label = baseline.get(key)
+    lines = [
+        f'{"url":<14} {"reqs":>6} {"err":>4} {"p50 ms":>9} {"p95 ms":>9} '
+        f'{"p99 ms":>9} {"queries":>8} {"req/s":>9}'
+    ]
+    for row in data['results']:
+        queries = row['mean_queries']
+        line = (
+            f'{row["name"]:<14} {row["requests"]:>6} {row["errors"]:>4} '
+            f'{row["p50_ms"]:>9.2f} {row["p95_ms"]:>9.2f} '
+            f'{row["p99_ms"]:>9.2f} '
+            f'{"-" if queries is None else f"{queries:.1f}":>8} '
+            f'{row["throughput_rps"]:>9.1f}'
+        )
+        old = previous.get(row['name'])
+        if old and old['p95_ms']:
+            change = (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            line += f'  p95 {change:+.0f}%'
+            if old['throughput_rps']:
+                change = (
+                    row['throughput_rps'] - old['throughput_rps']
+                ) / old['throughput_rps'] * 100
+                line += f' req/s {change:+.0f}%'
+            line += f' vs {label}'
+        lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,206 @@
+"""
+Bulk circulation: return, lend or renew many copies in one request.
+
+``circulate(action, items)`` validates every item against a single
+``SELECT ... FOR UPDATE`` of the affected rows and applies the change to
+the valid ones with one set-based ``UPDATE``, all inside one transaction.
+Items are UUIDs, as typed or as read by a barcode scanner (one per line);
+each gets its own result, so a bad scan does not reject the whole batch.
+
+``QuerySet.update`` does not send signals, so the index counters, the
+books' copy counters, the cached book pages and the books' ``updated_at``
+are updated here.
+"""
+
+import datetime
+import re
+import uuid
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import page_cache
+from .models import Book, BookInstance, CatalogStats
+
+RETURN = 'return'
+LEND = 'lend'
+RENEW = 'renew'
+
+ACTIONS = (
+    (RETURN, 'Devolver'),
+    (LEND, 'Prestar'),
+    (RENEW, 'Renovar'),
+)
+
+# Estados desde los que se permite cada accion
+ALLOWED_STATUS = {
+    RETURN: ('o',),
+    LEND: ('a', 'r'),
+    RENEW: ('o',),
+}
+
+# Limite de copias por operacion: acota el tamano del IN (...) y la
+# duracion del bloqueo de filas.
+MAX_ITEMS = 1000
+
+LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+_SEPARATORS = re.compile(r'[\s,;]+')
+
+
+class CirculationError(Exception):
+    pass
+
+
+@dataclass
+class ItemResult:
+    item: str
+    ok: bool
+    message: str
+    title: str = ''
+
+
+@dataclass
+class CirculationResult:
+    action: str
+    items: list = field(default_factory=list)
+
+    @property
+    def done(self):
+        return sum(1 for item in self.items if item.ok)
+
+    @property
+    def failed(self):
+        return len(self.items) - self.done
+
+    def as_dict(self):
+        return {
+            'action': self.action,
+            'done': self.done,
+            'failed': self.failed,
+            'items': [
+                {'item': item.item, 'ok': item.ok, 'message': item.message}
+                for item in self.items
+            ],
+        }
+
+
+def parse_items(text):
+    """Splits a scan stream (newlines, spaces, commas) into items."""
+    return [item for item in _SEPARATORS.split(text or '') if item]
+
+
+def _parse_uuid(item):
+    try:
+        return uuid.UUID(str(item).strip())
+    except ValueError:
+        return None
+
+
+def circulate(action, items, borrower=None, due_back=None):
+    """Applies ``action`` to the copies in ``items``.
+
+    ``borrower`` (a user) is required to lend; ``due_back`` defaults to
+    three weeks from today when lending or renewing.
+    """
+    if action not in ALLOWED_STATUS:
+        raise CirculationError(f'Unknown action: {action}')
+    if action == LEND and borrower is None:
+        raise CirculationError('A borrower is required to lend copies')
+    if len(items) > MAX_ITEMS:
+        raise CirculationError(
+            f'At most {MAX_ITEMS} copies per operation ({len(items)} given)'
+        )
+    if due_back is None and action != RETURN:
+        due_back = datetime.date.today() + LOAN_PERIOD
+
+    result = CirculationResult(action)
+    # Primera pasada sin BD: formato y duplicados
+    pending = {}
+    for item in items:
+        copy_id = _parse_uuid(item)
+        if copy_id is None:
+            result.items.append(ItemResult(str(item), False, 'ID no valido'))
+        elif copy_id in pending:
+            result.items.append(ItemResult(str(item), False, 'Duplicado'))
+        else:
+            pending[copy_id] = ItemResult(str(copy_id), False, '')
+            result.items.append(pending[copy_id])
+    if not pending:
+        return result
+
+    allowed = ALLOWED_STATUS[action]
+    with transaction.atomic():
+        rows = {
+            row['id']: row
+            for row in BookInstance.objects.select_for_update().filter(
+                pk__in=list(pending)
+            ).values('id', 'status', 'book_id', 'book__title')
+        }
+        valid = []
+        for copy_id, item in pending.items():
+            row = rows.get(copy_id)
+            if row is None:
+                item.message = 'No existe'
+                continue
+            item.title = row['book__title'] or ''
+            if row['status'] not in allowed:
+                status = dict(BookInstance.LOAN_STATUS).get(row['status'])
+                item.message = f'Estado no permitido ({status})'
+                continue
+            valid.append(copy_id)
+
+        if valid:
+            updated = BookInstance.objects.filter(
+                pk__in=valid, status__in=allowed
+            ).update(**_changes(action, borrower, due_back))
+            if updated != len(valid):
+                # Las filas estan bloqueadas: solo puede pasar si otra
+                # conexion ignora el bloqueo. Mejor abortar que mentir.
+                raise CirculationError(
+                    'Copies changed while being processed, try again'
+                )
+            for copy_id in valid:
+                pending[copy_id].ok = True
+                pending[copy_id].message = 'OK'
+            _update_denormalized(action, [rows[pk] for pk in valid])
+    return result
+
+
+def _changes(action, borrower, due_back):
+    # QuerySet.update no aplica auto_now
+    changes = {'updated_at': timezone.now()}
+    if action == RETURN:
+        changes.update(status='a', borrower=None, due_back=None)
+    elif action == LEND:
+        changes.update(status='o', borrower=borrower, due_back=due_back)
+    else:
+        changes.update(due_back=due_back)
+    return changes
+
+
+def _update_denormalized(action, rows):
+    if action == RETURN:
+        CatalogStats.bump(num_instances_available=len(rows))
+    elif action == LEND:
+        CatalogStats.bump(num_instances_available=-sum(
+            1 for row in rows if row['status'] == 'a'
+        ))
+    # Contadores de copias de cada libro: un UPDATE por cada combinacion
+    # distinta de deltas, que tambien fija su updated_at
+    deltas = {}
+    if action != RENEW:
+        new_status = 'a' if action == RETURN else 'o'
+        for row in rows:
+            book = deltas.setdefault(row['book_id'], {})
+            for status, n in ((row['status'], -1), (new_status, 1)):
+                name = Book.STATUS_COUNTERS[status]
+                book[name] = book.get(name, 0) + n
+        Book.count_copies(deltas, touch=True)
+    book_ids = {row['book_id'] for row in rows}
+    Book.touch(book_ids - deltas.keys())
+    page_cache.bump(
+        *(page_cache.book_key(book_id) for book_id in book_ids),
+        *([page_cache.BOOK_LIST] if deltas else []),
+    )
@@ -0,0 +1,258 @@
+"""
+Faceted filtering of the book list by genre, language, author and
+availability.
+
+The selection comes from the query string (``?genre=3&genre=7&language=1
+&author=12&available=1``): values of one facet are OR-ed, facets are
+AND-ed. The counts of each facet are computed over the books matching
+the *other* facets, so selecting a genre still shows how many books the
+other genres have and the user can widen the selection.
+
+All the counts come from a single ``UNION ALL`` of one ``GROUP BY`` per
+facet, labels included, instead of one ``COUNT`` per value. The author
+facet, the only one with thousands of values, lists the ``AUTHOR_LIMIT``
+authors with most books plus the selected ones. Availability reads the
+``copies_available`` counter of each book (see ``Book.count_copies``),
+and the size of the filtered list is the sum of its two groups, so the
+paginator does not need its own ``COUNT``.
+
+Every combination is a different URL, cached by the page cache until the
+book list changes; the unfiltered counts, the most expensive ones, are
+also cached on their own, shared by every page and sort order. Those are
+versioned by ``page_cache.FACETS``, which books, genres, languages and
+authors bump but copies do not, so the returns desk does not discard
+them on every status change; the availability facet is cached apart for
+``CATALOG_FACET_AVAILABILITY_TIMEOUT`` seconds and may lag that long.
+"""
+
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Case,
+    CharField,
+    Count,
+    F,
+    IntegerField,
+    Value,
+    When,
+)
+from django.db.models.functions import Concat
+
+from . import page_cache
+from .models import Book
+
+GENRE = 'genre'
+LANGUAGE = 'language'
+AUTHOR = 'author'
+AVAILABLE = 'available'
+
+# Autores listados en la faceta (ademas de los seleccionados)
+AUTHOR_LIMIT = 20
+
+# Valores como maximo por faceta en la URL
+MAX_VALUES = 20
+
+# Parametros que se descartan al cambiar los filtros: se vuelve a la
+# primera pagina
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+@dataclass
+class FacetValue:
+    value: int
+    label: str
+    count: int
+    selected: bool = False
+    query: str = ''
+
+
+@dataclass
+class Facets:
+    selection: dict
+    # Libros que cumplen todos los filtros
+    total: int = 0
+    values: dict = field(default_factory=dict)
+
+    @property
+    def active(self):
+        return any(self.selection.values())
+
+
+def selection(params):
+    """Parses the facet filters of a query string (a QueryDict)."""
+    selected = {}
+    for name in (GENRE, LANGUAGE, AUTHOR):
+        values = []
+        for value in params.getlist(name)[:MAX_VALUES]:
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+            if value not in values:
+                values.append(value)
+        selected[name] = values
+    selected[AVAILABLE] = params.get(AVAILABLE) == '1'
+    return selected
+
+
+def filter_books(queryset, selected, skip=None):
+    """Applies the ``selected`` filters but ``skip``'s to ``queryset``."""
+    if selected[GENRE] and skip != GENRE:
+        # Con IN (subconsulta) un libro con varios generos elegidos no se
+        # repite
+        queryset = queryset.filter(pk__in=Book.genre.through.objects.filter(
+            genre__in=selected[GENRE]
+        ).values('book_id'))
+    if selected[LANGUAGE] and skip != LANGUAGE:
+        queryset = queryset.filter(language__in=selected[LANGUAGE])
+    if selected[AUTHOR] and skip != AUTHOR:
+        queryset = queryset.filter(author__in=selected[AUTHOR])
+    if selected[AVAILABLE] and skip != AVAILABLE:
+        queryset = queryset.filter(copies_available__gt=0)
+    return queryset
+
+
+def _filtered(selected, skip):
+    """Books matching the other facets, or None if none is selected."""
+    if not any(value for name, value in selected.items() if name != skip):
+        return None
+    return filter_books(Book.objects.all(), selected, skip)
+
+
+def _grouped(queryset, facet, value, label):
+    return queryset.annotate(
+        facet=Value(facet, output_field=CharField()),
+        value=value,
+        label=label,
+    ).values('facet', 'value', 'label').annotate(n=Count('pk')).order_by()
+
+
+def _genre_counts(selected):
+    queryset = Book.genre.through.objects.all()
+    books = _filtered(selected, GENRE)
+    if books is not None:
+        queryset = queryset.filter(book__in=books.values('pk'))
+    return _grouped(queryset, GENRE, F('genre_id'), F('genre__name'))
+
+
+def _language_counts(selected):
+    books = _filtered(selected, LANGUAGE)
+    queryset = Book.objects.all() if books is None else books
+    return _grouped(
+        queryset.filter(language__isnull=False),
+        LANGUAGE, F('language_id'), F('language__name'),
+    )
+
+
+def _author_counts(selected):
+    books = _filtered(selected, AUTHOR)
+    queryset = Book.objects.all() if books is None else books
+    queryset = queryset.filter(author__isnull=False)
+    top = queryset.values('author').annotate(n=Count('pk')).order_by(
+        '-n', 'author'
+    ).values_list('author', flat=True)[:AUTHOR_LIMIT]
+    shown = queryset.filter(author__in=top)
+    if selected[AUTHOR]:
+        shown = shown | queryset.filter(author__in=selected[AUTHOR])
+    return _grouped(
+        shown, AUTHOR, F('author_id'),
+        Concat('author__last_name', Value(', '), 'author__first_name',
+               output_field=CharField()),
+    )
+
+
+def _availability_counts(selected):
+    books = _filtered(selected, AVAILABLE)
+    queryset = Book.objects.all() if books is None else books
+    return _grouped(
+        queryset, AVAILABLE,
+        Case(When(copies_available__gt=0, then=Value(1)), default=Value(0),
+             output_field=IntegerField()),
+        Value('', output_field=CharField()),
+    )
+
+
+def facet_counts(params):
+    """Returns the ``Facets`` of the request's query string ``params``.
+
+    Runs one query (two for the cached unfiltered counts); the values of
+    each facet are sorted by count.
+    """
+    selected = selection(params)
+    facets = Facets(selected)
+    for row in _rows(selected):
+        if row['facet'] == AVAILABLE:
+            # Disponibilidad de los libros que cumplen los demas filtros
+            if row['value'] or not selected[AVAILABLE]:
+                facets.total += row['n']
+            if not row['value']:
+                continue
+        facets.values.setdefault(row['facet'], []).append(FacetValue(
+            row['value'], row['label'], row['n'],
+        ))
+    for name, values in facets.values.items():
+        values.sort(key=lambda value: (-value.count, value.label))
+        for value in values:
+            value.selected = (
+                selected[name] if name == AVAILABLE
+                else value.value in selected[name]
+            )
+            value.query = toggle(params, name, value.value)
+    return facets
+
+
+def _rows(selected):
+    timeout = getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 600)
+    if not timeout or any(selected.values()):
+        return _genre_counts(selected).union(
+            _language_counts(selected),
+            _author_counts(selected),
+            _availability_counts(selected),
+            all=True,
+        )
+    # Los recuentos sin filtros son los mas caros (recorren todo el
+    # catalogo) y los comparten todas las paginas y ordenaciones
+    available_timeout = min(timeout, getattr(
+        settings, 'CATALOG_FACET_AVAILABILITY_TIMEOUT', 60
+    ))
+    return [
+        *_cached('facets', timeout, lambda: _genre_counts(selected).union(
+            _language_counts(selected), _author_counts(selected), all=True,
+        )),
+        *_cached('facets:available', available_timeout,
+                 lambda: _availability_counts(selected)),
+    ]
+
+
+def _cached(name, timeout, rows):
+    key = page_cache.data_key(name, [page_cache.FACETS])
+    if key is None:
+        return rows()
+    cached = cache.get(key)
+    if cached is None:
+        cached = list(rows())
+        cache.set(key, cached, timeout)
+    return cached
+
+
+def toggle(params, name, value):
+    """Query string that adds or removes ``value`` from facet ``name``."""
+    params = params.copy()
+    for param in PAGE_PARAMS:
+        params.pop(param, None)
+    if name == AVAILABLE:
+        if params.get(AVAILABLE) == '1':
+            params.pop(AVAILABLE)
+        else:
+            params[AVAILABLE] = '1'
+    else:
+        values = params.getlist(name)
+        if str(value) in values:
+            values.remove(str(value))
+        else:
+            values.append(str(value))
+        params.setlist(name, values)
+    return '?' + urlencode(sorted(params.lists()), doseq=True)
@@ -1,8 +1,11 @@
 import datetime
 from django import forms
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+from catalog import circulation
+
 
 class RenewBookForm(forms.Form):
     # Definimos el campo de fecha con una etiqueta y un texto de ayuda
@@ -12,19 +15,70 @@ class RenewBookForm(forms.Form):
 
     # Esta es la parte de VALIDACIÓN:
     def clean_renewal_date(self):
-        data = self.cleaned_data['renewal_date']
+        return validate_due_date(self.cleaned_data['renewal_date'])
+
+
+def validate_due_date(data):
+    """Due dates must fall between today and four weeks from now."""
+    # Comprobar que la fecha no sea en el pasado
+    if data < datetime.date.today():
+        raise ValidationError(
+            _('Fecha de renovación inválida - fecha en el pasado')
+        )
+
+    # Comprobar que la fecha no sea más de 4 semanas en el futuro
+    if data > datetime.date.today() + datetime.timedelta(weeks=4):
+        raise ValidationError(
+            _('Fecha de renovación inválida - más de 4 semanas de plazo')
+        )
+
+    # Siempre devuelve los datos limpios
+    return data
 
-        # Comprobar que la fecha no sea en el pasado
-        if data < datetime.date.today():
-            raise ValidationError(
-                _('Fecha de renovación inválida - fecha en el pasado')
-            )
 
-        # Comprobar que la fecha no sea más de 4 semanas en el futuro
-        if data > datetime.date.today() + datetime.timedelta(weeks=4):
+class BulkCirculationForm(forms.Form):
+    action = forms.ChoiceField(choices=circulation.ACTIONS)
+    items = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 10, 'autofocus': True}),
+        help_text="IDs de copia, uno por línea (lector de códigos de barras).",
+    )
+    borrower = forms.CharField(
+        required=False,
+        help_text="Usuario al que se presta (solo para préstamos).",
+    )
+    due_back = forms.DateField(
+        required=False,
+        help_text="Por defecto, dentro de 3 semanas.",
+    )
+
+    def clean_items(self):
+        items = circulation.parse_items(self.cleaned_data['items'])
+        if not items:
+            raise ValidationError(_('Introduce al menos un ID de copia'))
+        if len(items) > circulation.MAX_ITEMS:
             raise ValidationError(
-                _('Fecha de renovación inválida - más de 4 semanas de plazo')
+                _('Como máximo %(max)d copias por operación'),
+                params={'max': circulation.MAX_ITEMS},
             )
+        return items
+
+    def clean_due_back(self):
+        data = self.cleaned_data['due_back']
+        return validate_due_date(data) if data else data
+
+    def clean_borrower(self):
+        username = self.cleaned_data['borrower'].strip()
+        if not username:
+            return None
+        try:
+            return get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise ValidationError(_('El usuario no existe'))
 
-        # Siempre devuelve los datos limpios
-        return data
+    def clean(self):
+        cleaned_data = super().clean()
+        if (cleaned_data.get('action') == circulation.LEND
+                and not cleaned_data.get('borrower')
+                and 'borrower' not in self.errors):
+            self.add_error('borrower', _('Indica a quién se presta'))
+        return cleaned_data
@@ -0,0 +1,276 @@
+"""
+Deterministic synthetic catalog generator for load and regression tests.
+
+``CatalogGenerator(seed=...)`` produces the same catalog for the same seed,
+sizes and reference date: authors, books with one to three genres, copies
+with a realistic status mix and borrowers drawn from a pool of readers.
+Popularity is skewed (a few books have many copies, a few readers borrow a
+lot) so that per-row query patterns show up the way they would in
+production. Rows are written in batches (``bulk_create``, or executemany
+for the copies); the index counters, the copy counters of the books and
+the search index are rebuilt once at the end.
+
+Running it again on a populated database adds a new batch: reader
+usernames and ISBNs continue from the highest existing ones, and copy ids
+depend on the number of copies already there as well as on the seed.
+"""
+
+import datetime
+import random
+import time
+import uuid
+from array import array
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import page_cache
+from .models import Author, Book, BookInstance, CatalogStats, Genre, Language
+from .search import get_backend
+
+FIRST_NAMES = (
+    'Ana', 'Isaac', 'Stephen', 'Ursula', 'Jorge', 'Carmen', 'Gabriel',
+    'Mary', 'Arthur', 'Lucia', 'Pedro', 'Agatha', 'Julio', 'Rosa', 'Philip',
+    'Elena', 'Miguel', 'Octavia', 'Terry', 'Isabel',
+)
+LAST_NAMES = (
+    'Asimov', 'King', 'Le Guin', 'Borges', 'Laforet', 'Garcia', 'Shelley',
+    'Clarke', 'Etxebarria', 'Galdos', 'Christie', 'Verne', 'Montero', 'Dick',
+    'Allende', 'Delibes', 'Butler', 'Pratchett', 'Matute', 'Cortazar',
+)
+TITLE_WORDS = (
+    'Shadow', 'Garden', 'Robot', 'Storm', 'Silence', 'River', 'Empire',
+    'Night', 'Mirror', 'Winter', 'Machine', 'Island', 'Secret', 'Fire',
+    'Library', 'Ocean', 'Dream', 'Stone', 'City', 'Memory', 'Star', 'Wolf',
+    'Labyrinth', 'Harvest', 'Tower', 'Letter', 'Orchard', 'Crown', 'Road',
+)
+SUMMARY_WORDS = TITLE_WORDS + (
+    'a', 'the', 'of', 'and', 'young', 'old', 'lost', 'family', 'war',
+    'journey', 'discovers', 'returns', 'hidden', 'between', 'worlds',
+)
+GENRES = (
+    'Science Fiction', 'Fantasy', 'Horror', 'Thriller', 'Historical',
+    'Romance', 'Mystery', 'Poetry', 'Biography', 'Essay', 'Adventure',
+    'Drama', 'Humor', 'Travel', 'Philosophy',
+)
+LANGUAGES = (
+    'English', 'Spanish', 'French', 'German', 'Italian', 'Portuguese',
+    'Catalan', 'Basque', 'Galician', 'Japanese',
+)
+
+# Primer ISBN generado (prefijo 979, sin usar por ningun libro real)
+ISBN_BASE = 9790000000000
+
+# Reparto de estados de las copias: disponible, prestada, reservada,
+# mantenimiento
+STATUS_WEIGHTS = (('a', 60), ('o', 25), ('r', 10), ('m', 5))
+
+
+class CatalogGenerator:
+    def __init__(self, seed=0, authors=1000, books=10000, copies=30000,
+                 readers=500, today=None, batch_size=5000, progress=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.num_authors = authors
+        self.num_books = books
+        self.num_copies = copies
+        self.num_readers = readers
+        self.today = today or datetime.date.today()
+        self.batch_size = batch_size
+        self.progress = progress
+        self.created = {}
+        self.elapsed = 0.0
+        statuses, weights = zip(*STATUS_WEIGHTS)
+        self._statuses = statuses
+        self._status_weights = weights
+
+    def skewed(self, n, power=3):
+        """Index in ``range(n)`` biased towards 0 (popular first)."""
+        return min(int(n * self.rng.random() ** power), n - 1)
+
+    def words(self, vocabulary, count):
+        return ' '.join(self.rng.choices(vocabulary, k=count))
+
+    def run(self):
+        start = time.monotonic()
+        languages = self._names(Language, LANGUAGES)
+        genres = self._names(Genre, GENRES)
+        authors = self._bulk(Author, self.num_authors, self._author)
+        reader_base = self._reader_base()
+        readers = self._bulk(
+            get_user_model(), self.num_readers,
+            lambda i: self._reader(reader_base + i),
+        )
+        isbn_base = self._isbn_base()
+        self.id_rng = random.Random(
+            f'{self.seed}:{BookInstance.objects.count()}'
+        )
+        books = self._bulk(
+            Book, self.num_books,
+            lambda i: self._book(i, isbn_base, authors, languages),
+            after=lambda objs: self._add_genres(objs, genres),
+        )
+        self._insert_copies(books, readers)
+        with transaction.atomic():
+            CatalogStats.rebuild()
+            Book.recount_copies()
+            get_backend().rebuild()
+        page_cache.bump(
+            page_cache.BOOK_LIST, page_cache.AUTHOR_LIST, page_cache.FACETS,
+        )
+        self.elapsed = time.monotonic() - start
+        return self.created
+
+    def _names(self, model, names):
+        existing = dict(model.objects.values_list('name', 'pk'))
+        missing = [name for name in names if name not in existing]
+        for obj in model.objects.bulk_create(
+            model(name=name) for name in missing
+        ):
+            existing[obj.name] = obj.pk
+        return [existing[name] for name in names]
+
+    def _bulk(self, model, count, build, after=None):
+        """bulk_create ``count`` objects in batches; returns their pks."""
+        pks = array('q')
+        done = 0
+        while done < count:
+            size = min(self.batch_size, count - done)
+            objs = [build(done + i) for i in range(size)]
+            with transaction.atomic():
+                objs = model.objects.bulk_create(objs)
+                if after:
+                    after(objs)
+            pks.extend(obj.pk for obj in objs)
+            done += size
+            self._done(model, done, count)
+        return pks
+
+    def _done(self, model, done, count):
+        self.created[model._meta.verbose_name_plural] = done
+        if self.progress:
+            self.progress(model, done, count)
+
+    def _insert_copies(self, books, readers):
+        """Inserts the copies with executemany instead of bulk_create.
+
+        Copies are the biggest table (millions of rows), and building model
+        instances and compiling the INSERT through the ORM costs several
+        times more than the insert itself.
+        """
+        fields = [
+            BookInstance._meta.get_field(name) for name in (
+                'id', 'book', 'imprint', 'status', 'due_back', 'borrower',
+                'updated_at',
+            )
+        ]
+        connection = connections[router.db_for_write(BookInstance)]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(BookInstance._meta.db_table),
+            ', '.join(connection.ops.quote_name(f.column) for f in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        prepare = [
+            lambda value, field=field: field.get_db_prep_save(value, connection)
+            for field in fields
+        ]
+        now = timezone.now()
+        done = 0
+        while done < self.num_copies:
+            size = min(self.batch_size, self.num_copies - done)
+            rows = [
+                [prep(value) for prep, value in zip(prepare, (*self._copy(books, readers), now))]
+                for _ in range(size)
+            ]
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, rows)
+            done += size
+            self._done(BookInstance, done, self.num_copies)
+
+    def _date(self, start_year, end_year):
+        start = datetime.date(start_year, 1, 1).toordinal()
+        end = datetime.date(end_year, 12, 31).toordinal()
+        return datetime.date.fromordinal(self.rng.randint(start, end))
+
+    def _author(self, i):
+        born = self._date(1850, 1990)
+        died = None
+        if born.year < 1950 and self.rng.random() < 0.7:
+            died = born + datetime.timedelta(days=self.rng.randint(30, 90) * 365)
+            died = min(died, self.today)
+        return Author(
+            first_name=self.rng.choice(FIRST_NAMES),
+            last_name=f'{self.rng.choice(LAST_NAMES)} {i}',
+            date_of_birth=born,
+            date_of_death=died,
+        )
+
+    def _reader_base(self):
+        """Number of the first reader not in the database yet."""
+        last = get_user_model().objects.filter(
+            username__regex=r'^reader[0-9]{7}$'
+        ).order_by('-username').values_list('username', flat=True).first()
+        return int(last[len('reader'):]) + 1 if last else 0
+
+    def _isbn_base(self):
+        """First generated ISBN (979 prefix) not in the database yet."""
+        last = Book.objects.filter(
+            isbn__regex=r'^979[0-9]{10}$'
+        ).aggregate(last=Max('isbn'))['last']
+        return int(last) + 1 if last else ISBN_BASE
+
+    def _reader(self, i):
+        return get_user_model()(
+            username=f'reader{i:07d}',
+            password=UNUSABLE_PASSWORD_PREFIX,
+        )
+
+    def _book(self, i, isbn_base, authors, languages):
+        return Book(
+            title=f'{self.words(TITLE_WORDS, self.rng.randint(1, 4))} {i}',
+            summary=self.words(SUMMARY_WORDS, self.rng.randint(20, 60)),
+            isbn=str(isbn_base + i),
+            author_id=authors[self.skewed(len(authors), power=2)],
+            language_id=languages[self.skewed(len(languages))],
+        )
+
+    def _add_genres(self, books, genres):
+        Through = Book.genre.through
+        Through.objects.bulk_create(
+            Through(book_id=book.pk, genre_id=genre_id)
+            for book in books
+            for genre_id in set(
+                genres[self.skewed(len(genres), power=2)]
+                for _ in range(self.rng.randint(1, 3))
+            )
+        )
+
+    def _copy(self, books, readers):
+        status = self.rng.choices(self._statuses, self._status_weights)[0]
+        due_back = borrower = None
+        if status == 'o':
+            # Aproximadamente un tercio de los prestamos estan vencidos
+            due_back = self.today + datetime.timedelta(
+                days=self.rng.randint(-14, 28)
+            )
+            if readers:
+                borrower = readers[self.skewed(len(readers), power=2)]
+        elif status == 'r':
+            due_back = self.today + datetime.timedelta(
+                days=self.rng.randint(1, 14)
+            )
+        imprint = self.rng.choice(
+            ('Reprint', 'First edition', 'Donation', 'Paperback')
+        )
+        return (
+            uuid.UUID(int=self.id_rng.getrandbits(128), version=4),
+            books[self.skewed(len(books))],
+            f'{imprint} {self.rng.randint(1950, self.today.year)}',
+            status,
+            due_back,
+            borrower,
+        )
@@ -0,0 +1,352 @@
+"""
+Bulk loading of catalog records.
+
+``CatalogImporter`` consumes an iterable of dicts in fixed-size batches.
+Authors, genres and languages are resolved through in-memory maps (loaded
+once, and extended as new ones are created); books and copies are written
+with ``bulk_create``, one transaction per batch, so memory stays bounded by
+the batch size whatever the size of the input. Used by
+``manage.py import_catalog``.
+
+Book records::
+
+    {"title": ..., "summary": ..., "isbn": ...,
+     "author_first_name": ..., "author_last_name": ...,
+     "author_date_of_birth": "1947-09-21", "author_date_of_death": "",
+     "genres": ["Horror", "Thriller"] (or "Horror;Thriller"),
+     "language": "English"}
+
+Copy records::
+
+    {"isbn": ..., "imprint": ..., "status": "o", "due_back": "2021-10-10",
+     "borrower": "username"}
+
+Dates are ``YYYY-MM-DD``, statuses one of ``BookInstance.LOAN_STATUS``,
+borrowers existing usernames and texts no longer than their column; an
+invalid value stops the import with a ``CatalogImportError`` naming the
+line (batches already imported stay).
+
+bulk_create does not send signals, so the importer itself indexes the new
+books for search, recounts the copies of the books it adds copies to,
+invalidates the cached pages it affects (and touches their
+``updated_at``) and, once done, rebuilds the index counters.
+"""
+
+import csv
+import datetime
+import itertools
+import json
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import page_cache
+from .models import Author, Book, BookInstance, CatalogStats, Genre, Language
+from .search import get_backend
+
+BOOKS = 'books'
+COPIES = 'copies'
+
+GENRE_SEPARATOR = ';'
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+class Record(dict):
+    """A record read from a file, with the line it ends on."""
+
+    line = None
+
+
+def _where(record):
+    line = getattr(record, 'line', None)
+    return f'Line {line}' if line else f'Record {dict(record)}'
+
+
+def read_records(path, fmt=None):
+    """Yields the records of a CSV or JSON Lines file (``-`` is stdin)."""
+    if fmt is None:
+        fmt = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                record = Record(row)
+                record.line = reader.line_num
+                yield record
+        else:
+            for number, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = Record(json.loads(line))
+                except ValueError as e:
+                    raise CatalogImportError(f'Line {number}: {e}') from e
+                record.line = number
+                yield record
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _batches(records, size):
+    iterator = iter(records)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _text(record, field):
+    return (record.get(field) or '').strip()
+
+
+def _sized(record, field, model, name=None):
+    """``_text`` of ``field``, checked against the ``max_length`` of
+    ``model.name`` (the database would reject it without a line number)."""
+    value = _text(record, field)
+    _check_length(record, field, value, model, name)
+    return value
+
+
+def _check_length(record, field, value, model, name=None):
+    max_length = model._meta.get_field(name or field).max_length
+    if max_length and len(value) > max_length:
+        raise CatalogImportError(
+            f'{_where(record)}: {field} longer than {max_length} characters'
+        )
+
+
+def _date(record, field):
+    value = _text(record, field)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CatalogImportError(
+            f'{_where(record)}: invalid {field} {value!r} (YYYY-MM-DD)'
+        ) from None
+
+
+STATUSES = dict(BookInstance.LOAN_STATUS)
+
+
+def _status(record):
+    value = _text(record, 'status') or 'm'
+    if value not in STATUSES:
+        raise CatalogImportError(
+            f'{_where(record)}: invalid status {value!r} '
+            f'({", ".join(STATUSES)})'
+        )
+    return value
+
+
+class CatalogImporter:
+    def __init__(self, batch_size=1000, skip_existing=False, progress=None):
+        self.batch_size = batch_size
+        self.skip_existing = skip_existing
+        self.progress = progress
+        self.created = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+        self._languages = None
+        self._genres = None
+        self._authors = None
+        self._borrowers = {}
+
+    @property
+    def rate(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+    def run(self, records, kind=BOOKS):
+        """Imports ``records`` and returns the number of objects created."""
+        import_batch = self._import_books if kind == BOOKS else self._import_copies
+        start = time.monotonic()
+        try:
+            for batch in _batches(records, self.batch_size):
+                with transaction.atomic():
+                    import_batch(batch)
+                self.elapsed = time.monotonic() - start
+                if self.progress:
+                    self.progress(self)
+        finally:
+            # Tambien si falla un lote: los anteriores ya estan guardados
+            CatalogStats.rebuild()
+            page_cache.bump(
+                page_cache.BOOK_LIST, page_cache.AUTHOR_LIST, page_cache.FACETS,
+            )
+            self.elapsed = time.monotonic() - start
+        return self.created
+
+    # Mapas en memoria de nombre -> id
+
+    def _load_maps(self):
+        if self._languages is None:
+            self._languages = {
+                name.lower(): pk
+                for pk, name in Language.objects.values_list('pk', 'name')
+            }
+            self._genres = {
+                name.lower(): pk
+                for pk, name in Genre.objects.values_list('pk', 'name')
+            }
+            self._authors = {
+                (first, last): pk
+                for pk, first, last in Author.objects.values_list(
+                    'pk', 'first_name', 'last_name'
+                )
+            }
+
+    def _resolve_names(self, names, known, model):
+        """Returns ids for ``names``, bulk creating the unknown ones."""
+        new = {}
+        for name in names:
+            if name and name.lower() not in known:
+                new.setdefault(name.lower(), name)
+        if new:
+            for obj in model.objects.bulk_create(
+                model(name=name) for name in new.values()
+            ):
+                known[obj.name.lower()] = obj.pk
+        return known
+
+    def _genre_names(self, record):
+        genres = record.get('genres') or []
+        if isinstance(genres, str):
+            genres = genres.split(GENRE_SEPARATOR)
+        names = [name.strip() for name in genres if name.strip()]
+        for name in names:
+            _check_length(record, 'genres', name, Genre, 'name')
+        return names
+
+    def _import_books(self, batch):
+        self._load_maps()
+
+        # Descartamos ISBN repetidos (en el lote o ya en la base de datos)
+        isbns = [_sized(record, 'isbn', Book) for record in batch]
+        existing = set(
+            Book.objects.filter(isbn__in=isbns).values_list('isbn', flat=True)
+        )
+        if existing and not self.skip_existing:
+            raise CatalogImportError(
+                f'ISBN already in the catalog: {", ".join(sorted(existing))}'
+            )
+        records = {}
+        for isbn, record in zip(isbns, batch):
+            if not isbn:
+                raise CatalogImportError(f'{_where(record)}: record without ISBN')
+            if isbn in existing or isbn in records:
+                self.skipped += 1
+                continue
+            records[isbn] = record
+
+        self._resolve_names(
+            [_sized(record, 'language', Language, 'name')
+             for record in records.values()],
+            self._languages, Language,
+        )
+        self._resolve_names(
+            [name for record in records.values()
+             for name in self._genre_names(record)],
+            self._genres, Genre,
+        )
+
+        new_authors = {}
+        for record in records.values():
+            key = (
+                _sized(record, 'author_first_name', Author, 'first_name'),
+                _sized(record, 'author_last_name', Author, 'last_name'),
+            )
+            if any(key) and key not in self._authors:
+                new_authors.setdefault(key, Author(
+                    first_name=key[0],
+                    last_name=key[1],
+                    date_of_birth=_date(record, 'author_date_of_birth'),
+                    date_of_death=_date(record, 'author_date_of_death'),
+                ))
+        new_author_ids = set()
+        for author in Author.objects.bulk_create(new_authors.values()):
+            self._authors[(author.first_name, author.last_name)] = author.pk
+            new_author_ids.add(author.pk)
+
+        books = []
+        for isbn, record in records.items():
+            language = _text(record, 'language').lower()
+            author = (
+                _text(record, 'author_first_name'),
+                _text(record, 'author_last_name'),
+            )
+            books.append(Book(
+                title=_sized(record, 'title', Book),
+                summary=_sized(record, 'summary', Book),
+                isbn=isbn,
+                author_id=self._authors.get(author),
+                language_id=self._languages.get(language),
+            ))
+        books = Book.objects.bulk_create(books)
+
+        Through = Book.genre.through
+        Through.objects.bulk_create(
+            Through(book_id=book.pk, genre_id=genre_id)
+            for book, record in zip(books, records.values())
+            for genre_id in {
+                self._genres[name.lower()]
+                for name in self._genre_names(record)
+            }
+        )
+
+        book_ids = [book.pk for book in books]
+        get_backend().index_books(book_ids)
+        author_ids = {book.author_id for book in books}
+        # Los autores nuevos ya tienen updated_at de ahora
+        Author.touch(author_ids - new_author_ids)
+        page_cache.bump(*(
+            page_cache.author_key(author_id) for author_id in author_ids
+        ))
+        self.created += len(books)
+
+    def _borrower_id(self, record):
+        username = _text(record, 'borrower')
+        if not username:
+            return None
+        if username not in self._borrowers:
+            self._borrowers[username] = get_user_model().objects.filter(
+                username=username
+            ).values_list('pk', flat=True).first()
+        if self._borrowers[username] is None:
+            raise CatalogImportError(
+                f'{_where(record)}: unknown borrower {username!r}'
+            )
+        return self._borrowers[username]
+
+    def _import_copies(self, batch):
+        isbns = {_text(record, 'isbn') for record in batch}
+        book_ids = dict(
+            Book.objects.filter(isbn__in=isbns).values_list('isbn', 'pk')
+        )
+        missing = isbns - book_ids.keys()
+        if missing:
+            raise CatalogImportError(
+                f'Unknown ISBN for copies: {", ".join(sorted(missing))}'
+            )
+        copies = BookInstance.objects.bulk_create(
+            BookInstance(
+                book_id=book_ids[_text(record, 'isbn')],
+                imprint=_sized(record, 'imprint', BookInstance),
+                status=_status(record),
+                due_back=_date(record, 'due_back'),
+                borrower_id=self._borrower_id(record),
+            )
+            for record in batch
+        )
+        # Recuenta las copias de los libros afectados (y fija su updated_at)
+        Book.recount_copies(book_ids.values())
+        page_cache.bump(page_cache.BOOK_LIST, *{
+            page_cache.book_key(book_id) for book_id in book_ids.values()
+        })
+        self.created += len(copies)
@@ -0,0 +1,76 @@
+"""
+Planner statistics upkeep: ``ANALYZE`` / ``PRAGMA optimize``.
+
+SQLite has no autovacuum daemon: without ``ANALYZE`` the query planner
+knows nothing about the size and selectivity of the indexes (after a bulk
+import it may pick the wrong one). ``optimize`` refreshes the statistics
+that are missing or stale, which usually costs a few milliseconds, and a
+full ``ANALYZE`` recomputes all of them. PostgreSQL's autovacuum already
+analyzes changed tables, so there it only runs on demand.
+
+``manage.py optimize_database`` runs it once (e.g. from cron or after a
+bulk import); ``periodic_optimize``, connected to ``request_finished``,
+runs ``PRAGMA optimize`` on the open SQLite connection of the process at
+most every ``DATABASE_OPTIMIZE_INTERVAL`` seconds.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Filas que examina ANALYZE por indice en el modo rapido (0 = todas)
+ANALYSIS_LIMIT = 1000
+
+_lock = threading.Lock()
+_last_run = time.monotonic()
+
+
+def optimize(using=DEFAULT_DB_ALIAS, full=False):
+    """Refreshes the planner statistics of ``using``.
+
+    Returns False if the database backend has nothing to do.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            if full:
+                cursor.execute('ANALYZE')
+            else:
+                cursor.execute(f'PRAGMA analysis_limit={ANALYSIS_LIMIT}')
+                cursor.execute('PRAGMA optimize')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('ANALYZE')
+        else:
+            return False
+    return True
+
+
+def periodic_optimize(sender=None, **kwargs):
+    """``request_finished`` receiver: optimizes SQLite now and then."""
+    global _last_run
+    interval = getattr(settings, 'DATABASE_OPTIMIZE_INTERVAL', 0)
+    if not interval or time.monotonic() - _last_run < interval:
+        return
+    # Solo un hilo por proceso; los demas siguen sin esperar
+    if not _lock.acquire(blocking=False):
+        return
+    try:
+        _last_run = time.monotonic()
+        for alias in connections:
+            connection = connections[alias]
+            # No se abre una conexion solo para esto
+            if connection.vendor != 'sqlite' or connection.connection is None:
+                continue
+            if connection.in_atomic_block:
+                continue
+            try:
+                optimize(alias)
+            except DatabaseError:
+                logger.warning('PRAGMA optimize failed on %s', alias, exc_info=True)
+    finally:
+        _lock.release()
@@ -0,0 +1,154 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from catalog import benchmark
+from catalog.generator import CatalogGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia (p50/p95/p99), las consultas por petición y el '
+        'rendimiento de las URLs del catálogo, y guarda los resultados '
+        'para comparar entre commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=benchmark.MODES, default='inprocess',
+            help='Cliente de test en el proceso (WSGI o ASGI), o servidor '
+                 'WSGI/ASGI local',
+        )
+        parser.add_argument(
+            '--vs-wsgi', action='store_true',
+            help='Con un modo ASGI, ejecuta antes su equivalente WSGI y '
+                 'compara ambos',
+        )
+        parser.add_argument(
+            '--renewals', type=int, default=0, metavar='THREADS',
+            help='Hilos que renuevan préstamos sin parar mientras se miden '
+                 'las lecturas (escrituras concurrentes)',
+        )
+        parser.add_argument(
+            '--vs-sqlite-default', action='store_true',
+            help='Con SQLite, ejecuta antes con el perfil "default" (sin '
+                 'WAL) y compara con el configurado en DB_SQLITE_PROFILE',
+        )
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--only', nargs='+', metavar='URL_NAME',
+            help='Limita la prueba a estas URLs (p.ej. books book-detail)',
+        )
+        parser.add_argument(
+            '--no-page-cache', action='store_true',
+            help='Desactiva la caché de páginas para medir el renderizado',
+        )
+        parser.add_argument(
+            '--generate', type=int, metavar='BOOKS',
+            help='Genera antes un catálogo sintético de BOOKS libros (un '
+                 'autor cada 10 libros y 3 copias por libro; ver '
+                 'generate_catalog para más control)',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output-dir', default=str(settings.BASE_DIR / 'benchmarks'),
+        )
+        parser.add_argument(
+            '--compare', metavar='REPORT',
+            help='Informe JSON con el que comparar (por defecto, el último '
+                 'guardado del mismo modo)',
+        )
+        parser.add_argument('--no-save', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            books = options['generate']
+            CatalogGenerator(
+                seed=options['seed'],
+                authors=max(1, books // 10),
+                books=books,
+                copies=books * 3,
+                readers=max(1, books // 20),
+            ).run()
+
+        targets = benchmark.build_targets(seed=options['seed'])
+        if options['only']:
+            targets = [t for t in targets if t.name in options['only']]
+            if not targets:
+                raise CommandError('Ninguna URL coincide con --only')
+
+        overrides = {}
+        if options['no_page_cache']:
+            overrides['CATALOG_PAGE_CACHE_TIMEOUT'] = 0
+        # Ejecuciones (modo, perfil de SQLite). Con --vs-wsgi o
+        # --vs-sqlite-default la segunda se compara con la primera.
+        runs = [(options['mode'], None)]
+        if options['vs_wsgi'] and options['vs_sqlite_default']:
+            raise CommandError('Usa --vs-wsgi o --vs-sqlite-default, no ambos')
+        if options['vs_wsgi']:
+            if benchmark.WSGI_VARIANT[options['mode']] == options['mode']:
+                raise CommandError('--vs-wsgi necesita un modo ASGI')
+            runs.insert(0, (benchmark.WSGI_VARIANT[options['mode']], None))
+        if options['vs_sqlite_default']:
+            if benchmark.current_sqlite_profile() is None:
+                raise CommandError('--vs-sqlite-default necesita SQLite')
+            runs.insert(0, (options['mode'], 'default'))
+        copies = []
+        if options['renewals']:
+            copies = benchmark.loan_ids(seed=options['seed'])
+
+        baseline = None
+        for index, (mode, profile) in enumerate(runs):
+            with override_settings(**overrides), ExitStack() as stack:
+                if profile:
+                    stack.enter_context(benchmark.sqlite_profile(profile))
+                load = stack.enter_context(benchmark.RenewalLoad(
+                    options['renewals'], copies, seed=options['seed'],
+                ))
+                results = self.run(mode, targets, options)
+            if load.threads:
+                results.append(load.result)
+            data = benchmark.report(results, mode, {
+                name: options[name]
+                for name in (
+                    'requests', 'concurrency', 'no_page_cache', 'seed',
+                    'renewals',
+                )
+            }, sqlite_profile=profile)
+            path = None
+            if not options['no_save']:
+                path = benchmark.save_report(data, options['output_dir'])
+
+            if index == 0:
+                baseline_path = options['compare'] or benchmark.latest_report(
+                    options['output_dir'], mode, exclude=path
+                )
+                if baseline_path:
+                    baseline = benchmark.load_report(baseline_path)
+
+            self.stdout.write(f'[{mode}{f" sqlite={profile}" if profile else ""}]')
+            self.stdout.write(benchmark.format_table(data, baseline))
+            if path:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Resultados guardados en {path}')
+                )
+            # La segunda ejecucion se compara con la que acaba de correr
+            baseline = data
+
+    def run(self, mode, targets, options):
+        try:
+            if mode.startswith('inprocess'):
+                return benchmark.run_in_process(
+                    targets, options['requests'], options['warmup'],
+                    asgi=mode == 'inprocess-asgi',
+                )
+            return benchmark.run_server(
+                targets, options['requests'], options['concurrency'],
+                options['warmup'], kind=mode,
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
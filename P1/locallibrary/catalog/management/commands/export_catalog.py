@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from catalog.exporter import DEFAULT_CHUNK_SIZE, FORMATS, KINDS, export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta libros, copias o préstamos en CSV o JSON Lines leyendo la '
+        'base de datos por bloques (ver catalog/exporter.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS, help='Qué exportar')
+        parser.add_argument(
+            '--format', choices=FORMATS, default='csv', dest='fmt',
+            help='Formato de salida (por defecto csv)',
+        )
+        parser.add_argument(
+            '--output', '-o', default='-',
+            help='Fichero de salida ("-" para stdout, por defecto)',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f'Filas leídas por bloque (por defecto {DEFAULT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--database', default=None,
+            help='Alias de la base de datos a leer (p. ej. una réplica)',
+        )
+        parser.add_argument(
+            '--overdue', action='store_true',
+            help='Solo préstamos vencidos (con kind=loans)',
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser positivo')
+        extra = {}
+        if options['overdue']:
+            if options['kind'] != 'loans':
+                raise CommandError('--overdue solo se aplica a loans')
+            extra['overdue'] = True
+        if options['database'] and options['database'] not in connections:
+            raise CommandError(f'Base de datos desconocida: {options["database"]}')
+        lines = export_lines(
+            options['kind'], options['fmt'],
+            chunk_size=options['chunk_size'], using=options['database'],
+            **extra,
+        )
+        path = options['output']
+        if path == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        count = 0
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                for line in lines:
+                    stream.write(line)
+                    count += 1
+        except OSError as e:
+            raise CommandError(str(e))
+        rows = count - 1 if options['fmt'] == 'csv' else count
+        self.stdout.write(
+            self.style.SUCCESS(f'Exportadas {rows} filas a {path}')
+        )
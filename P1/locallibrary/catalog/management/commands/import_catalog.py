@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import (
+    BOOKS,
+    COPIES,
+    CatalogImporter,
+    CatalogImportError,
+    read_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa libros o copias desde un fichero CSV o JSON Lines usando '
+        'inserciones masivas por lotes (ver catalog/importer.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichero CSV/JSONL ("-" para stdin)')
+        parser.add_argument(
+            '--kind', choices=[BOOKS, COPIES], default=BOOKS,
+            help='Tipo de registro del fichero (por defecto books)',
+        )
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'], dest='fmt',
+            help='Formato del fichero (por defecto, según la extensión)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Registros por lote/transacción (por defecto 1000)',
+        )
+        parser.add_argument(
+            '--skip-existing', action='store_true',
+            help='Ignora libros cuyo ISBN ya existe en vez de abortar',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser positivo')
+        verbosity = options['verbosity']
+
+        def progress(importer):
+            if verbosity >= 2:
+                self.stdout.write(
+                    f'{importer.created} registros '
+                    f'({importer.rate:.0f} filas/s)'
+                )
+
+        importer = CatalogImporter(
+            batch_size=options['batch_size'],
+            skip_existing=options['skip_existing'],
+            progress=progress,
+        )
+        try:
+            importer.run(
+                read_records(options['path'], options['fmt']),
+                kind=options['kind'],
+            )
+        except (CatalogImportError, OSError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Importados {importer.created} registros '
+                f'({importer.skipped} omitidos) en {importer.elapsed:.1f}s: '
+                f'{importer.rate:.0f} filas/s'
+            )
+        )
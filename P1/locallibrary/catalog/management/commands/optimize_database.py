@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from catalog.maintenance import optimize
+
+
+class Command(BaseCommand):
+    help = (
+        'Actualiza las estadísticas del planificador de consultas '
+        '(PRAGMA optimize o ANALYZE; ver catalog/maintenance.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Alias de la base de datos (por defecto default)',
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='ANALYZE completo en SQLite (tras cargas masivas)',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if using not in connections:
+            raise CommandError(f'Base de datos desconocida: {using}')
+        start = time.perf_counter()
+        if not optimize(using, full=options['analyze']):
+            self.stdout.write(
+                f'Nada que hacer en {connections[using].vendor}'
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Estadísticas de {using} actualizadas en '
+            f'{time.perf_counter() - start:.2f}s'
+        ))
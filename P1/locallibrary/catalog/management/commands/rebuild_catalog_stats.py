@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import CatalogStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde cero los contadores de la portada del catálogo '
+        '(usar tras cargas masivas que no disparan señales)'
+    )
+
+    def handle(self, *args, **options):
+        stats = CatalogStats.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Contadores recalculados: {stats.num_books} libros, '
+                f'{stats.num_instances} copias '
+                f'({stats.num_instances_available} disponibles), '
+                f'{stats.num_authors} autores, {stats.num_genres} géneros'
+            )
+        )
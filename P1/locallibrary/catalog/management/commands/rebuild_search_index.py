@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog.search import get_backend
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye el índice de búsqueda de texto completo del catálogo '
+        '(usar tras cargas masivas que no disparan señales)'
+    )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        with transaction.atomic():
+            backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Índice de búsqueda reconstruido ({type(backend).__name__})'
+            )
+        )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog import page_cache
+from catalog.models import Book
+
+# Libros corregidos por UPDATE (acota el tamano del IN (...))
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Comprueba los contadores de copias de cada libro (total, '
+        'disponibles, prestadas, reservadas) contra sus copias y corrige '
+        'los que no cuadran (usar tras cargas masivas que no disparan señales)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Solo muestra los libros descuadrados, sin corregirlos',
+        )
+
+    def handle(self, *args, **options):
+        drifted = Book.drifted().order_by('pk')
+        if options['dry_run']:
+            for book in drifted[:20]:
+                self.stdout.write(
+                    f'{book.pk} {book.title}: total/disp./prest./res. '
+                    f'{book.copies_total}/{book.copies_available}/'
+                    f'{book.copies_on_loan}/{book.copies_reserved}, '
+                    f'deberían ser {book.actual_copies_total}/'
+                    f'{book.actual_copies_available}/'
+                    f'{book.actual_copies_on_loan}/'
+                    f'{book.actual_copies_reserved}'
+                )
+            self.stdout.write(f'{drifted.count()} libros descuadrados')
+            return
+
+        pks = list(drifted.values_list('pk', flat=True))
+        fixed = 0
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch = pks[start:start + BATCH_SIZE]
+            with transaction.atomic():
+                fixed += Book.recount_copies(batch)
+            page_cache.bump(*(page_cache.book_key(pk) for pk in batch))
+        if fixed:
+            page_cache.bump(page_cache.BOOK_LIST)
+        self.stdout.write(
+            self.style.SUCCESS(f'Contadores corregidos en {fixed} libros')
+        )
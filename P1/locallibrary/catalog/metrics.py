@@ -0,0 +1,218 @@
+"""
+Per-view request metrics in Prometheus text format.
+
+Samples are aggregated without locks on the request path: every thread
+writes to its own bucket (a plain dict only that thread mutates), and the
+exporter sums all buckets when scraped. The only lock is taken once per
+thread, to register its bucket.
+
+With gunicorn each worker is a separate process, so when ``METRICS_DIR``
+is set every process also dumps its totals to ``<METRICS_DIR>/<pid>.json``
+at most every ``METRICS_DUMP_INTERVAL`` seconds, and the endpoint adds up
+the files of all workers (whichever worker serves the scrape). Without it
+the endpoint only reports the process that serves it.
+
+The files of workers that are gone must not be added up again, or a
+recycled worker would count twice and a reused pid would make counters
+go backwards: a worker deletes its file when it exits, and gunicorn.conf.py
+empties the directory when the server starts (``clear``) and deletes the
+file of every worker that dies (``mark_process_dead``), also those killed
+without running their exit handlers.
+"""
+
+import atexit
+
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+# Limites (en segundos) de los histogramas de latencia y de renderizado
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = {
+    'catalog_http_requests_total': 'Requests served, by view, method and status.',
+    'catalog_db_queries_total': 'SQL queries executed, by view.',
+    'catalog_db_query_seconds_total': 'Time spent in SQL queries, by view.',
+}
+HISTOGRAMS = {
+    'catalog_http_request_duration_seconds': 'Request latency, by view.',
+    'catalog_template_render_seconds': 'Template rendering time, by view.',
+}
+
+_local = threading.local()
+_buckets = []
+_register_lock = threading.Lock()
+_last_dump = 0.0
+# Proceso que ya borra su fichero al salir (cambia tras un fork)
+_exit_pid = None
+
+
+def _bucket():
+    bucket = getattr(_local, 'bucket', None)
+    if bucket is None:
+        bucket = _local.bucket = {}
+        with _register_lock:
+            _buckets.append(bucket)
+    return bucket
+
+
+def inc(name, labels, value=1):
+    """Adds ``value`` to a counter. ``labels`` is a tuple of pairs."""
+    bucket = _bucket()
+    key = (name, labels)
+    bucket[key] = bucket.get(key, 0) + value
+
+
+def observe(name, labels, value):
+    """Records one observation of a histogram."""
+    bucket = _bucket()
+    key = (name, labels)
+    histogram = bucket.get(key)
+    if histogram is None:
+        # Un contador por limite, mas +Inf, suma y numero de observaciones
+        histogram = bucket[key] = [0] * (len(BUCKETS) + 1) + [0.0, 0]
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            histogram[i] += 1
+            break
+    else:
+        histogram[len(BUCKETS)] += 1
+    histogram[-2] += value
+    histogram[-1] += 1
+
+
+def _merge(total, key, value):
+    if isinstance(value, list):
+        current = total.setdefault(key, [0] * len(value))
+        for i, v in enumerate(value):
+            current[i] += v
+    else:
+        total[key] = total.get(key, 0) + value
+
+
+def snapshot():
+    """Totals of this process: ``{(name, labels): value}``."""
+    total = {}
+    with _register_lock:
+        buckets = list(_buckets)
+    for bucket in buckets:
+        # dict() copia el dict de golpe (el hilo dueño puede seguir escribiendo)
+        for key, value in dict(bucket).items():
+            _merge(total, key, list(value) if isinstance(value, list) else value)
+    return total
+
+
+def reset():
+    with _register_lock:
+        for bucket in _buckets:
+            bucket.clear()
+
+
+def _metrics_dir(directory=None):
+    if directory is None:
+        directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+def _encode(data):
+    return [[name, list(map(list, labels)), value] for (name, labels), value in data.items()]
+
+
+def _decode(rows):
+    return {(name, tuple(map(tuple, labels))): value for name, labels, value in rows}
+
+
+def dump(force=False):
+    """Writes this process' totals to METRICS_DIR (rate limited)."""
+    global _last_dump, _exit_pid
+    directory = _metrics_dir()
+    now = time.monotonic()
+    interval = getattr(settings, 'METRICS_DUMP_INTERVAL', 5)
+    if directory is None or (not force and now - _last_dump < interval):
+        return
+    _last_dump = now
+    directory.mkdir(parents=True, exist_ok=True)
+    if _exit_pid != os.getpid():
+        _exit_pid = os.getpid()
+        atexit.register(mark_process_dead, _exit_pid, directory)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(_encode(snapshot()), f)
+    os.replace(tmp, directory / f'{os.getpid()}.json')
+
+
+def mark_process_dead(pid, directory=None):
+    """Deletes the file of worker ``pid`` from METRICS_DIR."""
+    directory = _metrics_dir(directory)
+    if directory is not None:
+        (directory / f'{pid}.json').unlink(missing_ok=True)
+
+
+def clear(directory=None):
+    """Deletes every worker file from METRICS_DIR.
+
+    Call it once when the server starts, before any worker is up.
+    """
+    directory = _metrics_dir(directory)
+    if directory is not None and directory.is_dir():
+        for path in directory.glob('*.json'):
+            path.unlink(missing_ok=True)
+
+
+def collect():
+    """Totals of every worker (or of this process without METRICS_DIR)."""
+    total = snapshot()
+    directory = _metrics_dir()
+    if directory is not None and directory.is_dir():
+        own = f'{os.getpid()}.json'
+        for path in directory.glob('*.json'):
+            if path.name == own:
+                continue
+            try:
+                data = _decode(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+            for key, value in data.items():
+                _merge(total, key, value)
+    return total
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for k, v in pairs
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def render(data=None):
+    """Prometheus text exposition format (version 0.0.4)."""
+    data = collect() if data is None else data
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (metric, labels), value in sorted(data.items()):
+            if metric == name:
+                lines.append(f'{name}{_labels(labels)} {value}')
+    for name, help_text in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (metric, labels), value in sorted(data.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), value):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}'
+                )
+            lines.append(f'{name}_sum{_labels(labels)} {value[-2]}')
+            lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,245 @@
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, routers
+from .slow_queries import RequestRecorder
+
+
+def _wrap_connections(stack, wrapper):
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+
+
+class WrapQueriesMiddleware:
+    """Base for middleware that wraps every query of the request.
+
+    Works in both handler modes. The connections are per thread, and
+    under ASGI the async ORM runs the queries of a request in its own
+    (thread-sensitive) worker thread, so the wrappers are installed and
+    removed from that thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def get_wrapper(self, request):
+        """Returns the execute wrapper for the request, or None to skip."""
+        raise NotImplementedError
+
+    def finish(self, request, response, wrapper):
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        wrapper = self.get_wrapper(request)
+        if wrapper is None:
+            return self.get_response(request)
+        with ExitStack() as stack:
+            _wrap_connections(stack, wrapper)
+            response = self.get_response(request)
+        return self.finish(request, response, wrapper)
+
+    async def __acall__(self, request):
+        wrapper = self.get_wrapper(request)
+        if wrapper is None:
+            return await self.get_response(request)
+        stack = ExitStack()
+        await sync_to_async(_wrap_connections)(stack, wrapper)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, wrapper)
+
+
+class MetricsMiddleware(WrapQueriesMiddleware):
+    """Records latency, SQL queries and render time of every request.
+
+    Samples are labelled with the URL name of the view that served them
+    (``<unresolved>`` for 404s and static files) and exported by the
+    ``metrics`` view; see catalog.metrics.
+    """
+
+    def get_wrapper(self, request):
+        request._metrics_start = time.perf_counter()
+        queries = request._metrics_queries = [0, 0.0]
+
+        def count_query(execute, sql, params, many, context):
+            t0 = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - t0
+
+        return count_query
+
+    def finish(self, request, response, wrapper):
+        start = request._metrics_start
+        queries = request._metrics_queries
+        view = self.view_name(request)
+        labels = (('view', view),)
+        metrics.inc('catalog_http_requests_total', labels + (
+            ('method', request.method), ('status', response.status_code),
+        ))
+        metrics.observe(
+            'catalog_http_request_duration_seconds', labels,
+            time.perf_counter() - start,
+        )
+        metrics.inc('catalog_db_queries_total', labels, queries[0])
+        metrics.inc('catalog_db_query_seconds_total', labels, queries[1])
+        render_time = getattr(response, '_metrics_render_time', None)
+        if render_time is not None:
+            metrics.observe('catalog_template_render_seconds', labels, render_time)
+        metrics.dump()
+        return response
+
+    def process_template_response(self, request, response):
+        render_start = time.perf_counter()
+
+        def render_done(response):
+            response._metrics_render_time = time.perf_counter() - render_start
+
+        response.add_post_render_callback(render_done)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return '<unresolved>'
+        return match.view_name or match._func_path
+
+
+class SlowQueryMiddleware(WrapQueriesMiddleware):
+    """Logs slow and repeated queries (opt-in, see catalog.slow_queries)."""
+
+    def get_wrapper(self, request):
+        threshold_ms = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+        if threshold_ms is None:
+            return None
+        request._slow_query_recorder = RequestRecorder(threshold_ms / 1000)
+        return request._slow_query_recorder
+
+    def finish(self, request, response, recorder):
+        recorder.finish()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = getattr(request, '_slow_query_recorder', None)
+        if recorder is not None and request.resolver_match:
+            recorder.view = request.resolver_match.view_name
+
+
+class AsyncViewsMiddleware:
+    """Routes ASGI requests to the async read-only views.
+
+    ASGI requests are resolved with ``CATALOG_ASYNC_URLCONF`` (the same
+    routes, with catalog.async_views for the read-only pages); WSGI
+    requests, and every request when the setting is None, keep
+    ``ROOT_URLCONF``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.urlconf = getattr(settings, 'CATALOG_ASYNC_URLCONF', None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.urlconf and isinstance(request, ASGIRequest):
+            request.urlconf = self.urlconf
+        return self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """Sends the reads of GET/HEAD requests to a read replica.
+
+    Requests that may write use the primary and pin the client to it for
+    ``DATABASE_REPLICA_PIN_SECONDS``, as do the requests of a pinned
+    client; see catalog.routers. Does nothing without replicas.
+    """
+
+    sync_capable = True
+    async_capable = True
+    read_methods = ('GET', 'HEAD')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def replica_for(self, request):
+        if request.method not in self.read_methods:
+            return None
+        if routers.PIN_COOKIE in request.COOKIES:
+            return None
+        return routers.choose_replica()
+
+    def pin(self, request, response):
+        if request.method not in self.read_methods and routers.replicas():
+            response.set_cookie(
+                routers.PIN_COOKIE, '1', max_age=routers.lag_window(),
+                httponly=True, samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.use_replica(self.replica_for(request)):
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        # Las consultas del ORM asincrono heredan el contexto (y la replica)
+        with routers.use_replica(self.replica_for(request)):
+            response = await self.get_response(request)
+        return self.pin(request, response)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise usable in an async middleware chain.
+
+    WhiteNoiseMiddleware is sync-only, which makes Django run the whole
+    ASGI request (and the async views) through a worker thread. Requests
+    that are not for a static file only need a dict lookup, so they go
+    straight to the next handler; static files are served from a thread.
+    """
+
+    async_capable = True
+
+    def __init__(self, get_response, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_alter_book_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_books', models.PositiveIntegerField(default=0)),
+                ('num_books_a', models.PositiveIntegerField(default=0)),
+                ('num_instances', models.PositiveIntegerField(default=0)),
+                ('num_instances_available', models.PositiveIntegerField(default=0)),
+                ('num_authors', models.PositiveIntegerField(default=0)),
+                ('num_genres', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'catalog stats',
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:40
+
+from django.db import migrations
+
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE catalog_book_fts USING fts5(
+    title, authors, genres, summary,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+SQLITE_POPULATE = """
+INSERT INTO catalog_book_fts (rowid, title, authors, genres, summary)
+SELECT b.id, b.title,
+       COALESCE(a.first_name || ' ' || a.last_name, ''),
+       COALESCE((SELECT group_concat(g.name, ' ')
+                 FROM catalog_book_genre bg
+                 JOIN catalog_genre g ON g.id = bg.genre_id
+                 WHERE bg.book_id = b.id), ''),
+       b.summary
+FROM catalog_book b
+LEFT JOIN catalog_author a ON a.id = b.author_id
+"""
+
+POSTGRESQL_CREATE = """
+CREATE TABLE catalog_book_search (
+    book_id bigint PRIMARY KEY
+        REFERENCES catalog_book (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    document tsvector NOT NULL
+);
+CREATE INDEX catalog_book_search_document_idx
+    ON catalog_book_search USING GIN (document);
+"""
+
+POSTGRESQL_POPULATE = """
+INSERT INTO catalog_book_search (book_id, document)
+SELECT b.id,
+       setweight(to_tsvector('simple', b.title), 'A')
+       || setweight(to_tsvector('simple', COALESCE(
+              a.first_name || ' ' || a.last_name, '')), 'B')
+       || setweight(to_tsvector('simple', COALESCE(
+              (SELECT string_agg(g.name, ' ')
+               FROM catalog_book_genre bg
+               JOIN catalog_genre g ON g.id = bg.genre_id
+               WHERE bg.book_id = b.id), '')), 'C')
+       || setweight(to_tsvector('simple', b.summary), 'D')
+FROM catalog_book b
+LEFT JOIN catalog_author a ON a.id = b.author_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_POPULATE)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_CREATE)
+        schema_editor.execute(POSTGRESQL_POPULATE)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE catalog_book_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE catalog_book_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_bookinstance_loan_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
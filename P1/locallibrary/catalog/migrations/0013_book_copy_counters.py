@@ -0,0 +1,70 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+STATUS_COUNTERS = {
+    'a': 'copies_available',
+    'o': 'copies_on_loan',
+    'r': 'copies_reserved',
+}
+
+
+def count_copies(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    db = schema_editor.connection.alias
+
+    def count(status=None):
+        copies = BookInstance.objects.using(db).filter(book=OuterRef('pk'))
+        if status is not None:
+            copies = copies.filter(status=status)
+        return Coalesce(Subquery(
+            copies.order_by().values('book').annotate(n=Count('pk')).values('n')
+        ), 0)
+
+    counts = {'copies_total': count()}
+    for status, name in STATUS_COUNTERS.items():
+        counts[name] = count(status)
+    # Una sola UPDATE para todos los libros
+    Book.objects.using(db).update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='copies_available',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_on_loan',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_reserved',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(
+                models.OrderBy(models.F('copies_available'), descending=True),
+                models.F('title'),
+                name='book_available_title_idx',
+            ),
+        ),
+        migrations.RunPython(count_copies, migrations.RunPython.noop),
+    ]
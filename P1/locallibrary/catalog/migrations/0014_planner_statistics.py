@@ -0,0 +1,22 @@
+# Generated by Django 5.2.2 on 2026-10-18 19:10
+
+from django.db import migrations
+
+
+def analyze(apps, schema_editor):
+    # EstimatedCountPaginator lee sqlite_stat1, que no existe hasta el
+    # primer ANALYZE (ver catalog/pagination.py y catalog/maintenance.py)
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('PRAGMA analysis_limit=1000')
+        schema_editor.execute('ANALYZE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_book_copy_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(analyze, migrations.RunPython.noop),
+    ]
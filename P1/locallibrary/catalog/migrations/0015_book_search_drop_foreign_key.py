@@ -0,0 +1,44 @@
+# Generated by Django 5.2.2 on 2026-10-18 21:05
+
+from django.db import migrations
+
+# manage.py flush hace TRUNCATE de las tablas de Django sin CASCADE, y
+# PostgreSQL no lo permite si otra tabla (la de busqueda, que Django no
+# conoce) las referencia. Como en SQLite, el indice no lleva clave
+# foranea: los receptores de catalog.signals borran los documentos y
+# search.py ignora los huerfanos.
+
+DROP_FOREIGN_KEY = """
+ALTER TABLE catalog_book_search
+    DROP CONSTRAINT IF EXISTS catalog_book_search_book_id_fkey
+"""
+
+ADD_FOREIGN_KEY = """
+DELETE FROM catalog_book_search
+    WHERE book_id NOT IN (SELECT id FROM catalog_book);
+ALTER TABLE catalog_book_search
+    ADD CONSTRAINT catalog_book_search_book_id_fkey
+    FOREIGN KEY (book_id) REFERENCES catalog_book (id)
+    ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED
+"""
+
+
+def drop_foreign_key(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_FOREIGN_KEY)
+
+
+def add_foreign_key(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADD_FOREIGN_KEY)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_planner_statistics'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_foreign_key, add_foreign_key),
+    ]
@@ -1,14 +1,50 @@
 import uuid
 from datetime import date
 
-from django.db import models
+from django.db import models, router, transaction
 from django.urls import reverse
-from django.db.models import UniqueConstraint
-from django.db.models.functions import Lower
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    DateField,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Subquery,
+    UniqueConstraint,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest, Lower
 from django.conf import settings
+from django.utils import timezone
 
 
-class Genre(models.Model):
+class TimestampedModel(models.Model):
+    """Adds ``updated_at``, the Last-Modified of the object's page.
+
+    ``save()`` sets it; changes that show on the page of another object
+    (a copy on its book, a book on its author) ``touch()`` that object
+    from catalog.signals, and bulk writes (QuerySet.update, raw SQL) must
+    touch the affected objects themselves.
+    """
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def touch(cls, pks):
+        """Sets ``updated_at`` to now on the objects in ``pks``."""
+        pks = {pk for pk in pks if pk is not None}
+        if pks:
+            cls.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+
+
+class Genre(TimestampedModel):
     """Model representing a book genre."""
 
     name = models.CharField(
@@ -35,7 +71,7 @@ class Genre(models.Model):
         ]
 
 
-class Book(models.Model):
+class Book(TimestampedModel):
     """Model representing a book (but not a specific copy of a book)."""
 
     title = models.CharField(max_length=200)
@@ -59,24 +95,180 @@ class Book(models.Model):
         'Language', on_delete=models.SET_NULL, null=True
     )
 
+    # Copias del libro por estado, mantenidas por catalog.signals (y por
+    # las escrituras masivas) para no contar bookinstance_set al mostrar
+    # la disponibilidad. Las que estan en mantenimiento son el resto.
+    copies_total = models.PositiveIntegerField(default=0, editable=False)
+    copies_available = models.PositiveIntegerField(default=0, editable=False)
+    copies_on_loan = models.PositiveIntegerField(default=0, editable=False)
+    copies_reserved = models.PositiveIntegerField(default=0, editable=False)
+
+    # Contador de cada estado de copia (ver BookInstance.LOAN_STATUS)
+    STATUS_COUNTERS = {
+        'a': 'copies_available',
+        'o': 'copies_on_loan',
+        'r': 'copies_reserved',
+    }
+    COPY_COUNTERS = ('copies_total', *STATUS_COUNTERS.values())
+
     class Meta:
         ordering = ['title']
+        indexes = [
+            # Listado de libros ordenado por disponibilidad
+            models.Index(
+                F('copies_available').desc(), 'title',
+                name='book_available_title_idx',
+            ),
+            # Listado por titulo y sus paginas por cursor (titulo, id)
+            models.Index(fields=['title', 'id'], name='book_title_idx'),
+        ]
 
     def __str__(self):
         """String for representing the Model object."""
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Los contadores solo cambian con UPDATE ... F() (count_copies): un
+        # save() de un objeto leido antes de esos cambios (un formulario,
+        # el admin) no debe sobrescribirlos con sus valores en memoria.
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COPY_COUNTERS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def copies_in_maintenance(self):
+        return (
+            self.copies_total - self.copies_available
+            - self.copies_on_loan - self.copies_reserved
+        )
+
+    @classmethod
+    def copy_deltas(cls, status, n=1):
+        """Counter deltas of adding ``n`` copies in ``status``."""
+        deltas = {'copies_total': n}
+        if status in cls.STATUS_COUNTERS:
+            deltas[cls.STATUS_COUNTERS[status]] = n
+        return deltas
+
+    @classmethod
+    def count_copies(cls, deltas, touch=False):
+        """Atomically applies ``{book_id: {counter: delta}}``.
+
+        Books with the same deltas share one UPDATE, so a batch of copies
+        changing status the same way costs one query. With ``touch`` the
+        books' ``updated_at`` is set in the same UPDATE. Counters never go
+        below zero: after writes that skip the signals they may have
+        drifted low, and reconcile_copy_counts repairs them.
+        """
+        groups = {}
+        for book_id, changes in deltas.items():
+            changes = tuple(sorted(
+                (name, n) for name, n in changes.items() if n
+            ))
+            if book_id is not None and changes:
+                groups.setdefault(changes, []).append(book_id)
+        for changes, book_ids in groups.items():
+            values = {name: Greatest(F(name) + n, 0) for name, n in changes}
+            if touch:
+                values['updated_at'] = timezone.now()
+            cls.objects.filter(pk__in=book_ids).update(**values)
+
+    @classmethod
+    def actual_copy_counts(cls):
+        """Expressions counting the copies of each book by status."""
+        def count(status=None):
+            copies = BookInstance.objects.filter(book=OuterRef('pk'))
+            if status is not None:
+                copies = copies.filter(status=status)
+            return Coalesce(Subquery(
+                copies.order_by().values('book').annotate(
+                    n=Count('pk')
+                ).values('n')
+            ), 0)
+
+        counts = {'copies_total': count()}
+        for status, name in cls.STATUS_COUNTERS.items():
+            counts[name] = count(status)
+        return counts
+
+    @classmethod
+    def drifted(cls, queryset=None):
+        """Books of ``queryset`` whose counters disagree with their copies."""
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.annotate(**{
+            f'actual_{name}': expression
+            for name, expression in cls.actual_copy_counts().items()
+        }).exclude(**{
+            name: F(f'actual_{name}') for name in cls.COPY_COUNTERS
+        })
+
+    @classmethod
+    def recount_copies(cls, pks=None):
+        """Recomputes the counters of the books in ``pks`` (all if None).
+
+        One set-based UPDATE of the books that drifted, which also sets
+        their ``updated_at``; returns how many there were. Used after bulk
+        writes that skip the signals and by ``reconcile_copy_counts``.
+        """
+        books = cls.objects.all() if pks is None else cls.objects.filter(pk__in=pks)
+        return cls.objects.filter(
+            pk__in=cls.drifted(books).values('pk')
+        ).update(**cls.actual_copy_counts(), updated_at=timezone.now())
+
     def get_absolute_url(self):
         """Returns the URL to access a detail record for this book."""
         return reverse('book-detail', args=[str(self.id)])
 
     def display_genre(self):
+        """The first three genres, for the admin change list.
+
+        Reads the prefetched genres when there are any (``BookAdmin``
+        prefetches them for the whole page).
+        """
         return ', '.join(genre.name for genre in self.genre.all()[:3])
 
     display_genre.short_description = 'Genre'
 
 
-class BookInstance(models.Model):
+class BookInstanceQuerySet(models.QuerySet):
+    """Loan queries evaluated in the database.
+
+    ``today`` defaults to the current date; pass it explicitly to get a
+    stable result across midnight (reports, exports, tests).
+    """
+
+    def on_loan(self):
+        return self.filter(status__exact='o')
+
+    def overdue(self, today=None):
+        # status + due_back: usa el indice bookinst_status_due_idx
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def with_overdue(self, today=None):
+        """Annotates ``overdue`` (bool) and ``days_late`` (timedelta).
+
+        ``days_late`` is negative for loans not yet due and None for
+        copies without a due date.
+        """
+        today = today or date.today()
+        return self.annotate(
+            overdue=Case(
+                When(status='o', due_back__lt=today, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+            days_late=ExpressionWrapper(
+                Value(today, output_field=DateField()) - F('due_back'),
+                output_field=DurationField(),
+            ),
+        )
+
+
+class BookInstance(TimestampedModel):
     """Model representing a specific copy of a book."""
 
     id = models.UUIDField(
@@ -109,11 +301,36 @@ class BookInstance(models.Model):
         help_text='Book availability',
     )
 
+    objects = BookInstanceQuerySet.as_manager()
+
     class Meta:
         ordering = ['due_back']
         permissions = (
             ("can_mark_returned", "Set book as returned"),
         )
+        indexes = [
+            # Listado de prestamos (AllBorrowedListView): status + due_back,
+            # con el id que desempata las paginas por cursor
+            models.Index(
+                fields=['status', 'due_back', 'id'],
+                name='bookinst_status_due_idx',
+            ),
+            # Prestamos de un usuario (LoanedBooksByUserListView)
+            models.Index(
+                fields=['borrower', 'due_back', 'id'],
+                name='bookinst_borrower_due_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # El estado anterior se lee con la fila bloqueada en pre_save para
+        # ajustar los contadores (ver catalog/signals.py), asi que la
+        # lectura y el UPDATE van en la misma transaccion
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         """String for representing the Model object."""
@@ -122,10 +339,17 @@ class BookInstance(models.Model):
     @property
     def is_overdue(self):
         """Determina si el libro está fuera de plazo."""
-        return bool(self.due_back and date.today() > self.due_back)
+        # Si la consulta viene de with_overdue(), el calculo ya esta hecho
+        if 'overdue' in self.__dict__:
+            return self.overdue
+        # Mismo criterio que with_overdue(): solo los prestamos vencen
+        return bool(
+            self.status == 'o' and self.due_back
+            and date.today() > self.due_back
+        )
 
 
-class Author(models.Model):
+class Author(TimestampedModel):
     """Model representing an author."""
 
     first_name = models.CharField(max_length=100)
@@ -135,6 +359,13 @@ class Author(models.Model):
 
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # Listado de autores y sus paginas por cursor
+            models.Index(
+                fields=['last_name', 'first_name', 'id'],
+                name='author_name_idx',
+            ),
+        ]
 
     def get_absolute_url(self):
         """Returns the URL to access a particular author instance."""
@@ -169,3 +400,93 @@ class Language(models.Model):
                 violation_error_message="Language already exists"
             ),
         ]
+
+
+class CatalogStats(models.Model):
+    """Model holding the precomputed record counts shown on the index page.
+
+    There is a single row (pk=1), kept current by the receivers in
+    catalog.signals so the index can render from one primary key lookup.
+    """
+
+    num_books = models.PositiveIntegerField(default=0)
+    num_books_a = models.PositiveIntegerField(default=0)
+    num_instances = models.PositiveIntegerField(default=0)
+    num_instances_available = models.PositiveIntegerField(default=0)
+    num_authors = models.PositiveIntegerField(default=0)
+    num_genres = models.PositiveIntegerField(default=0)
+
+    SINGLETON_PK = 1
+
+    class Meta:
+        verbose_name_plural = 'catalog stats'
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.num_books} books, {self.num_instances} copies'
+
+    @classmethod
+    def load(cls):
+        """Returns the stats row, rebuilding it if it does not exist yet."""
+        try:
+            return cls.objects.get(pk=cls.SINGLETON_PK)
+        except cls.DoesNotExist:
+            return cls.rebuild()
+
+    @classmethod
+    def rebuild(cls):
+        """Recomputes every counter from scratch (e.g. after bulk loads).
+
+        The counts are read from the database the row is written to, not
+        from a replica that may lag behind it.
+        """
+        using = router.db_for_write(cls)
+        counts = {
+            'num_books': Book.objects.using(using).count(),
+            'num_books_a': Book.objects.using(using).filter(
+                title__icontains='a'
+            ).count(),
+            'num_instances': BookInstance.objects.using(using).count(),
+            'num_instances_available': BookInstance.objects.using(using).filter(
+                status__exact='a'
+            ).count(),
+            'num_authors': Author.objects.using(using).count(),
+            'num_genres': Genre.objects.using(using).count(),
+        }
+        stats, _ = cls.objects.using(using).update_or_create(
+            pk=cls.SINGLETON_PK, defaults=counts
+        )
+        return stats
+
+    @classmethod
+    def bump(cls, **deltas):
+        """Atomically adds the given deltas to the counters.
+
+        Counters stop at zero instead of failing the write if they drifted
+        low (``rebuild`` recomputes them).
+        """
+        deltas = {name: n for name, n in deltas.items() if n}
+        if not deltas:
+            return
+        updated = cls.objects.filter(pk=cls.SINGLETON_PK).update(
+            **{name: Greatest(F(name) + n, 0) for name, n in deltas.items()}
+        )
+        if not updated:
+            # La fila no existe (p.ej. tras un flush): la recalculamos
+            # entera, lo que ya incluye el cambio que nos ha traido aqui.
+            cls.rebuild()
+
+
+class PageVisit(models.Model):
+    """Model storing the flushed visit count of a session or user.
+
+    Visits are buffered in memory by catalog.visits and written here in
+    batches, so counting a visit does not write to the database.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    count = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.key}: {self.count}'
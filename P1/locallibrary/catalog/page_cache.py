@@ -0,0 +1,268 @@
+"""
+Rendered page cache for the read-only catalog views.
+
+Responses are stored under a key made of the request path, the current
+version token of every object the page depends on and a user variant.
+Writes never delete cached pages: the receivers in catalog.signals replace
+the version tokens of the affected objects (see ``bump``), so the next
+request computes a new key and stale entries simply expire. Inside a
+transaction the tokens are replaced again when it commits: until then
+other connections still read the old rows, and a page rendered from them
+under the first new token must not outlive the commit.
+
+The user variant is ``anon`` for anonymous visitors, who all see the same
+page. Authenticated users get their own variant (the sidebar shows their
+name and permissions, and the staff-only "Renew book" links), which also
+includes a hash of their CSRF cookie because the page embeds a CSRF token
+for the logout form. Authenticated requests without a CSRF cookie yet are
+not cached.
+
+With read replicas, a page read from a replica is not cached while any of
+its dependencies changed less than the replication lag ago: the replica
+might not have the change yet, and the stale page would be stored under
+the new version token.
+
+``ConditionalGetMixin`` adds ETag/Last-Modified validators, taken from the
+object's ``updated_at``, so repeat visits get a 304 without rendering;
+cached pages keep their validators and answer conditional requests
+without touching the database.
+"""
+
+import hashlib
+import time
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from . import routers
+
+KEY_PREFIX = 'catalog:page:'
+DATA_PREFIX = 'catalog:data:'
+VERSION_PREFIX = 'catalog:version:'
+
+BOOK_LIST = 'book-list'
+AUTHOR_LIST = 'author-list'
+# Recuentos de las facetas sin filtros (ver facets.py): no cambian con el
+# estado de las copias
+FACETS = 'facets'
+
+
+def book_key(pk):
+    return f'book:{pk}'
+
+
+def author_key(pk):
+    return f'author:{pk}'
+
+
+def _token():
+    # El instante de creacion va en el token para saber si es reciente
+    return f'{time.time():.3f}:{uuid.uuid4().hex}'
+
+
+def _is_recent(token, seconds):
+    created, _, _ = token.partition(':')
+    try:
+        return time.time() - float(created) < seconds
+    except ValueError:
+        return False
+
+
+def _replace(names):
+    cache.set_many(
+        {VERSION_PREFIX + name: _token() for name in names}, timeout=None,
+    )
+
+
+def bump(*names, using=None):
+    """Invalidates every page depending on the given objects.
+
+    Inside a transaction the tokens are replaced right away, so later
+    reads in the same transaction see the change, and again on commit:
+    a request on another connection can render the old rows before the
+    commit and cache them under the first token.
+    """
+    names = [name for name in names if name is not None]
+    if not names:
+        return
+    _replace(names)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(partial(_replace, names), using=using)
+
+
+def versions(names):
+    """Returns the version tokens of ``names``, creating missing ones.
+
+    A missing token (never bumped, or evicted) gets a fresh one, so a page
+    cached under an older token can never be served again.
+    """
+    keys = [VERSION_PREFIX + name for name in names]
+    found = cache.get_many(keys)
+    missing = {key: _token() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def user_variant(request):
+    """Returns the cache variant of the user, or None to skip caching."""
+    if not request.user.is_authenticated:
+        return 'anon'
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if not csrf_cookie:
+        return None
+    digest = hashlib.sha256(csrf_cookie.encode()).hexdigest()[:16]
+    return f'user:{request.user.pk}:{digest}'
+
+
+def page_key(request, dependencies):
+    """Cache key of the page for this request, or None to skip caching."""
+    variant = user_variant(request)
+    if variant is None:
+        return None
+    return _key(KEY_PREFIX, [request.get_full_path(), variant], dependencies)
+
+
+def data_key(name, dependencies):
+    """Cache key of data shared by all the pages (e.g. the unfiltered
+    facet counts), or None to skip caching."""
+    return _key(DATA_PREFIX, [name], dependencies)
+
+
+def _key(prefix, parts, dependencies):
+    tokens = versions(dependencies)
+    if routers.current_replica() is not None:
+        lag = routers.lag_window()
+        if any(_is_recent(token, lag) for token in tokens):
+            return None
+    raw = '|'.join([*parts, *tokens])
+    return prefix + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def store_page(key, response, timeout):
+    """Caches ``response`` under ``key`` once it is rendered."""
+    if response.status_code != 200 or response.streaming:
+        return
+
+    def store(response):
+        # No guardamos respuestas que fijan cookies
+        if not response.cookies:
+            cache.set(key, response, timeout)
+
+    if hasattr(response, 'render') and callable(response.render):
+        response.add_post_render_callback(store)
+    else:
+        store(response)
+
+
+def cached_response(request, response):
+    """Returns the cached ``response``, or a 304 if the request's
+    validators match its ETag/Last-Modified."""
+    if 'ETag' not in response and 'Last-Modified' not in response:
+        return response
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response,
+    ) or response
+
+
+def validators(obj, variant, last_modified=None):
+    """ETag and Last-Modified headers for the page of ``obj``."""
+    last_modified = last_modified or obj.updated_at
+    raw = ':'.join([
+        obj._meta.label, str(obj.pk), last_modified.isoformat(), variant,
+    ])
+    return {
+        'ETag': quote_etag(hashlib.sha256(raw.encode()).hexdigest()[:32]),
+        'Last-Modified': http_date(last_modified.timestamp()),
+    }
+
+
+def not_modified(request, headers):
+    """Returns a 304 carrying ``headers`` if the request's validators match."""
+    response = get_conditional_response(
+        request,
+        etag=headers['ETag'],
+        last_modified=parse_http_date_safe(headers['Last-Modified']),
+    )
+    if response is not None:
+        for name, value in headers.items():
+            response[name] = value
+    return response
+
+
+class CachedPageMixin:
+    """Caches the rendered GET response of a view.
+
+    Views list the objects their page depends on in
+    ``get_cache_dependencies()``; any change to one of them (signalled
+    through ``bump``) invalidates the page.
+    """
+
+    page_cache_timeout = None
+
+    def get_page_cache_timeout(self):
+        if self.page_cache_timeout is not None:
+            return self.page_cache_timeout
+        return getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 600)
+
+    def get_cache_dependencies(self):
+        raise NotImplementedError
+
+    def get_page_cache_key(self, request):
+        return page_key(request, self.get_cache_dependencies())
+
+    def dispatch(self, request, *args, **kwargs):
+        timeout = self.get_page_cache_timeout()
+        if request.method not in ('GET', 'HEAD') or not timeout:
+            return super().dispatch(request, *args, **kwargs)
+        key = self.get_page_cache_key(request)
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        response = cache.get(key)
+        if response is not None:
+            # Pagina en cache: el 304 sale de sus propias cabeceras
+            return cached_response(request, response)
+
+        response = super().dispatch(request, *args, **kwargs)
+        store_page(key, response, timeout)
+        return response
+
+
+class ConditionalGetMixin:
+    """ETag/Last-Modified for detail views of a ``TimestampedModel``.
+
+    The object is fetched first, without the related data the page needs
+    (load that in ``get_context_data``), and a matching ``If-None-Match``
+    or ``If-Modified-Since`` gets a 304 before any rendering. The ETag
+    includes the user variant, because the page differs per user.
+    """
+
+    def get_last_modified(self):
+        return self.object.updated_at
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        variant = user_variant(request)
+        if variant is None:
+            context = self.get_context_data(object=self.object)
+            return self.render_to_response(context)
+
+        headers = validators(self.object, variant, self.get_last_modified())
+        response = not_modified(request, headers)
+        if response is None:
+            response = self.render_to_response(
+                self.get_context_data(object=self.object)
+            )
+            for name, value in headers.items():
+                response[name] = value
+        return response
@@ -0,0 +1,379 @@
+"""
+Keyset (cursor) pagination for the catalog list views.
+
+Django's Paginator runs a COUNT(*) and an OFFSET scan that grows with the
+page number. In keyset mode a page is fetched as "the next ``page_size``
+rows after the last row of the previous page" on the view's ordering plus
+the primary key as tie-breaker, so every page costs the same single query
+and there is no COUNT. Pages are addressed with opaque ``after``/``before``
+cursors instead of page numbers.
+
+``EstimatedCountPaginator`` keeps page numbers but, for unfiltered
+listings of big tables, takes the row count from the planner statistics
+instead of running the COUNT(*).
+"""
+
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import F, Q
+from django.db.models.fields.tuple_lookups import (
+    Tuple, TupleGreaterThan, TupleLessThan,
+)
+from django.http import Http404
+from django.utils.functional import cached_property
+
+AFTER = 'after'
+BEFORE = 'before'
+
+# Filas a partir de las cuales se usa la estimacion en vez de COUNT(*)
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(values):
+    data = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+
+class KeysetPage:
+    """A page of results, with the same flags a Django Page offers."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Pages a queryset on its ordering fields plus ``pk``.
+
+    NULLs sort where the backend puts them by default (last on PostgreSQL,
+    first on SQLite), which is also the order of its indexes, so the
+    indexes over nullable ordering fields such as ``BookInstance.due_back``
+    serve the ORDER BY of every page in both directions.
+
+    When the remaining keys share a direction the seek is a row-value
+    comparison, ``(due_back, id) > (%s, %s)``, which the database can
+    answer with a single index range scan (Django expands it into ORs on
+    backends without ``supports_tuple_lookups``, such as SQLite).
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        ordering = list(
+            ordering or queryset.query.order_by
+            or queryset.model._meta.ordering
+        )
+        fields = [name.lstrip('-') for name in ordering]
+        if 'pk' not in fields and queryset.model._meta.pk.name not in fields:
+            ordering.append('pk')
+        self.keys = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        self.nulls_largest = connections[
+            queryset.db
+        ].features.nulls_order_largest
+
+    def _field(self, name):
+        opts = self.queryset.model._meta
+        if name == 'pk':
+            return opts.pk
+        try:
+            return opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def _nullable(self, name):
+        field = self._field(name)
+        return field is not None and field.null
+
+    def _order_by(self, reverse):
+        return [
+            F(name).desc() if descending != reverse else F(name).asc()
+            for name, descending in self.keys
+        ]
+
+    def _nulls_after(self, descending):
+        """Whether NULLs come after the other values in this direction."""
+        return descending != self.nulls_largest
+
+    def _after(self, name, descending, value):
+        """Rows strictly after ``value`` in the direction of the key."""
+        nulls_after = self._nulls_after(descending)
+        if value is None:
+            if nulls_after:
+                return Q(pk__in=[])
+            return Q(**{f'{name}__isnull': False})
+        q = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+        if nulls_after and self._nullable(name):
+            q |= Q(**{f'{name}__isnull': True})
+        return q
+
+    def _equal(self, name, value):
+        if value is None:
+            return Q(**{f'{name}__isnull': True})
+        return Q(**{name: value})
+
+    def _after_row(self, keys, values):
+        """Row-value form of ``_seek`` for keys sharing a direction and
+        non-NULL cursor values."""
+        descending = keys[0][1]
+        lookup = TupleLessThan if descending else TupleGreaterThan
+        condition = Q(lookup(Tuple(*(F(name) for name, _ in keys)), values))
+        if self._nulls_after(descending):
+            # Una columna NULL anula la comparacion, pero esas filas van
+            # despues si las anteriores coinciden con el cursor
+            prefix = Q()
+            for (name, _), value in zip(keys, values):
+                if self._nullable(name):
+                    condition |= prefix & Q(**{f'{name}__isnull': True})
+                prefix &= Q(**{name: value})
+        return condition
+
+    def _seek(self, values, reverse):
+        """Lexicographic "row after the cursor" condition over the keys."""
+        keys = [
+            (name, descending != reverse) for name, descending in self.keys
+        ]
+        condition = Q(pk__in=[])
+        prefix = Q()
+        for i, ((name, descending), value) in enumerate(zip(keys, values)):
+            rest = keys[i:]
+            if (len(rest) > 1 and None not in values[i:]
+                    and len({d for _, d in rest}) == 1):
+                return condition | prefix & self._after_row(rest, values[i:])
+            condition |= prefix & self._after(name, descending, value)
+            prefix &= self._equal(name, value)
+        return condition
+
+    def _values(self, cursor):
+        """Cursor values converted to the python type of their field."""
+        values = decode_cursor(cursor)
+        if len(values) != len(self.keys):
+            raise InvalidCursor(cursor)
+        try:
+            return [
+                value if value is None or field is None
+                else field.to_python(value)
+                for value, field in zip(
+                    values, (self._field(name) for name, _ in self.keys)
+                )
+            ]
+        except (ValidationError, ValueError, TypeError) as e:
+            raise InvalidCursor(cursor) from e
+
+    def _cursor(self, obj):
+        values = []
+        for name, _ in self.keys:
+            value = getattr(obj, name)
+            values.append(value if value is None else str(value))
+        return encode_cursor(values)
+
+    def page(self, after=None, before=None):
+        """Returns the page following ``after`` or preceding ``before``."""
+        reverse = before is not None
+        cursor = before if reverse else after
+        queryset = self.queryset.order_by(*self._order_by(reverse))
+        if cursor is not None:
+            values = self._values(cursor)
+            try:
+                queryset = queryset.filter(self._seek(values, reverse))
+            except (ValidationError, ValueError, TypeError) as e:
+                raise InvalidCursor(cursor) from e
+
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        # Si venimos hacia atras seguro que hay pagina siguiente (de ella
+        # venimos), y si venimos hacia delante, pagina anterior.
+        if reverse:
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, cursor is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self._cursor(rows[-1])
+        if rows and has_previous:
+            previous_cursor = self._cursor(rows[0])
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def _is_unfiltered(queryset):
+    query = queryset.query
+    return not (
+        query.where or query.distinct or query.combinator
+        or query.group_by is not None or query.is_sliced
+    )
+
+
+def _estimate_sql(connection, table):
+    """Scalar query with the planner's estimate of the rows of ``table``
+    (NULL if there are no statistics), or None on other databases."""
+    if connection.vendor == 'postgresql':
+        # reltuples es -1 en tablas nunca analizadas (PostgreSQL 14+)
+        return (
+            'SELECT MAX(reltuples)::bigint FROM pg_class '
+            'WHERE oid = to_regclass(%s) AND reltuples >= 0',
+            [connection.ops.quote_name(table)],
+        )
+    if connection.vendor == 'sqlite':
+        # stat empieza por el numero de filas de la tabla
+        return (
+            'SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s',
+            [table],
+        )
+    return None
+
+
+def estimated_count(queryset):
+    """Planner's estimate of the rows of an unfiltered ``queryset``.
+
+    Reads ``pg_class.reltuples`` on PostgreSQL and the ``sqlite_stat1``
+    table written by ``ANALYZE`` on SQLite (see catalog.maintenance).
+    Returns None if the queryset is filtered, grouped or sliced, or if
+    the table has no statistics yet.
+    """
+    if not _is_unfiltered(queryset):
+        return None
+    connection = connections[queryset.db]
+    estimate = _estimate_sql(connection, queryset.model._meta.db_table)
+    if estimate is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(*estimate)
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        # sqlite_stat1 no existe hasta el primer ANALYZE
+        return None
+
+
+def count_rows(queryset, threshold):
+    """Number of rows of ``queryset``, in a single query.
+
+    For an unfiltered queryset it is the planner's estimate if that
+    reaches ``threshold`` rows, else the exact ``COUNT(*)`` (the database
+    only evaluates the count in that case).
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    estimate = _estimate_sql(connection, table)
+    if estimate is None or not _is_unfiltered(queryset):
+        return queryset.count()
+    sql, params = estimate
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT CASE WHEN e >= %s THEN e ELSE '
+                f'(SELECT COUNT(*) FROM {connection.ops.quote_name(table)}) '
+                f'END FROM (SELECT ({sql}) AS e) AS s',
+                [threshold, *params],
+            )
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        return queryset.count()
+
+
+def estimated_count_threshold():
+    return getattr(
+        settings, 'CATALOG_ESTIMATED_COUNT_THRESHOLD',
+        ESTIMATED_COUNT_THRESHOLD,
+    )
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count is the planner's estimate on big tables.
+
+    Unfiltered querysets whose estimate reaches
+    ``CATALOG_ESTIMATED_COUNT_THRESHOLD`` rows skip the COUNT(*);
+    smaller or filtered ones get the exact count, in the same single
+    query. The estimate is as fresh as the last ``ANALYZE``, so the last
+    page may be short or empty.
+    """
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        return count_rows(self.object_list, estimated_count_threshold())
+
+
+class KeysetPaginationMixin:
+    """Opt-in keyset pagination for generic ListViews.
+
+    Set ``pagination_mode = 'keyset'`` on the view, or
+    ``CATALOG_PAGINATION_MODE = 'keyset'`` in settings, to replace the
+    offset paginator. The ordering is the queryset's (or the model's
+    ``Meta.ordering``) with ``pk`` appended as tie-breaker. The offset
+    paginator is an ``EstimatedCountPaginator``.
+    """
+
+    pagination_mode = None
+    paginator_class = EstimatedCountPaginator
+
+    def get_pagination_mode(self):
+        return self.pagination_mode or getattr(
+            settings, 'CATALOG_PAGINATION_MODE', 'offset'
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.get_pagination_mode() != 'keyset':
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(
+                after=self.request.GET.get(AFTER),
+                before=self.request.GET.get(BEFORE),
+            )
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['is_keyset_paginated'] = isinstance(
+            context.get('page_obj'), KeysetPage
+        )
+        return context
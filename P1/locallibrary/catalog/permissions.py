@@ -0,0 +1,75 @@
+"""
+Authentication backend that keeps each user's permission set in the
+shared cache.
+
+``ModelBackend`` loads the permissions of the user and of their groups
+with two queries the first time a request checks one (the sidebar's
+``perms`` checks, ``PermissionRequiredMixin``, ``permission_required``).
+``CachedModelBackend`` stores the resulting set under a key made of two
+version tokens, as the page cache does (see page_cache.py):
+
+* ``user_key(pk)``, bumped when the user's permissions, groups,
+  superuser or active flag change;
+* ``PERMISSIONS``, bumped when the permissions of a group change or a
+  group or permission is deleted, since that affects every member.
+
+The receivers in catalog.signals bump them with ``page_cache.bump``, which
+bumps them again when the transaction commits, and sets read inside a
+transaction are only cached once it commits. Warm requests check
+permissions without touching the database.
+"""
+
+import hashlib
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+from . import page_cache
+
+KEY_PREFIX = 'catalog:perms:'
+
+PERMISSIONS = 'permissions'
+
+
+def user_key(pk):
+    return f'user-permissions:{pk}'
+
+
+def permissions_key(user):
+    """Cache key of the permission set of ``user``."""
+    tokens = page_cache.versions([PERMISSIONS, user_key(user.pk)])
+    raw = '|'.join([str(user.pk), *tokens])
+    return KEY_PREFIX + hashlib.sha256(raw.encode()).hexdigest()
+
+
+class CachedModelBackend(ModelBackend):
+    """``ModelBackend`` whose permission sets live in the shared cache
+    for ``CATALOG_PERMISSION_CACHE_TIMEOUT`` seconds (0 disables it)."""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        # Como ModelBackend: una sola consulta a la cache por peticion
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = self._cached_permissions(user_obj)
+        return user_obj._perm_cache
+
+    async def aget_all_permissions(self, user_obj, obj=None):
+        return await sync_to_async(self.get_all_permissions)(user_obj, obj)
+
+    def _cached_permissions(self, user_obj):
+        timeout = getattr(settings, 'CATALOG_PERMISSION_CACHE_TIMEOUT', 3600)
+        if not timeout:
+            return super().get_all_permissions(user_obj)
+        key = permissions_key(user_obj)
+        perms = cache.get(key)
+        if perms is None:
+            perms = super().get_all_permissions(user_obj)
+            # Dentro de una transaccion, solo si se confirma: si se deshace,
+            # lo leido quedaria bajo el token nuevo
+            transaction.on_commit(partial(cache.set, key, perms, timeout))
+        return perms
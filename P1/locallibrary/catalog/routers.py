@@ -0,0 +1,94 @@
+"""
+Database router that sends catalog reads to the read replicas.
+
+Replicas are the aliases in ``DATABASE_REPLICAS`` (one per extra
+``DATABASE_URL_<NAME>`` variable, see locallibrary/database.py). Reads go
+to a replica only inside ``use_replica(alias)``, which
+``ReplicaRoutingMiddleware`` enters for GET/HEAD requests: management
+commands, tests and write requests read from the primary.
+
+Consistency rules:
+
+* Every write, and every ``select_for_update``, goes to the primary.
+* A request that may write (POST, PUT, PATCH, DELETE) reads from the
+  primary, and pins the client to it for ``DATABASE_REPLICA_PIN_SECONDS``
+  (a cookie), so the pages shown after renewing a loan or saving a form
+  already include the change.
+* Users, groups, permissions and sessions are always read from the
+  primary, so ``PermissionRequiredMixin`` never decides on a lagging
+  copy (a permission just revoked, a user just deactivated).
+* Each request reads from a single replica.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Apps cuyas lecturas van siempre a la primaria
+PRIMARY_APPS = {'auth', 'admin', 'contenttypes', 'sessions'}
+
+PIN_COOKIE = 'catalog_primary'
+
+_replica = ContextVar('catalog_replica', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def choose_replica():
+    """A random replica alias, or None if there are none."""
+    aliases = replicas()
+    return random.choice(aliases) if aliases else None
+
+
+def current_replica():
+    """The replica the current request reads from, or None."""
+    return _replica.get()
+
+
+@contextmanager
+def use_replica(alias):
+    """Sends the reads of the block to ``alias`` (None: the primary)."""
+    token = _replica.set(alias)
+    try:
+        yield alias
+    finally:
+        _replica.reset(token)
+
+
+def lag_window():
+    """Seconds a replica may lag behind the primary (0 without replicas).
+
+    Also the time a client stays pinned to the primary after a write.
+    """
+    if not replicas():
+        return 0
+    return getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Tambien para instancias leidas de una replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las replicas reciben el esquema por la replicacion
+        if db in replicas():
+            return False
+        return None
@@ -0,0 +1,259 @@
+"""
+Full-text search over the catalog.
+
+Each book is indexed as one document made of its title, its author's name,
+its genre names and its summary:
+
+* SQLite: an FTS5 virtual table (``catalog_book_fts``, rowid = book id),
+  ranked with ``bm25``.
+* PostgreSQL: a ``tsvector`` column with a GIN index
+  (``catalog_book_search``), ranked with ``ts_rank_cd``.
+* Any other backend falls back to unranked ``icontains`` filtering.
+
+Both tables are created by migration 0011 and kept in sync by the
+receivers in catalog.signals; documents are rebuilt with set-based
+INSERT ... SELECT statements so indexing never goes through Python
+objects. ``manage.py rebuild_search_index`` rebuilds the whole index.
+
+Neither table has a foreign key to ``catalog_book`` (``manage.py flush``
+truncates the books without CASCADE), so deletes that bypass the signals
+can leave orphan documents behind: searches skip them and a rebuild
+drops them.
+"""
+
+import re
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import Book
+
+# Trozos de ids para las sentencias IN (...) al reindexar muchos libros
+CHUNK_SIZE = 500
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _placeholders(ids):
+    return ', '.join(['%s'] * len(ids))
+
+
+class SearchBackend(ABC):
+    @abstractmethod
+    def index_books(self, book_ids):
+        """(Re)indexes the given books from their current database rows."""
+
+    @abstractmethod
+    def remove_books(self, book_ids):
+        """Drops the documents of the given books."""
+
+    @abstractmethod
+    def rebuild(self):
+        """Reindexes the whole catalog."""
+
+    @abstractmethod
+    def search(self, query, limit):
+        """Returns ``[(book_id, rank), ...]``, best match first."""
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    TABLE = 'catalog_book_fts'
+    DOCUMENT_SQL = """
+        SELECT b.id, b.title,
+               COALESCE(a.first_name || ' ' || a.last_name, ''),
+               COALESCE((SELECT group_concat(g.name, ' ')
+                         FROM catalog_book_genre bg
+                         JOIN catalog_genre g ON g.id = bg.genre_id
+                         WHERE bg.book_id = b.id), ''),
+               b.summary
+        FROM catalog_book b
+        LEFT JOIN catalog_author a ON a.id = b.author_id
+    """
+    # Pesos de bm25 por columna: titulo, autor, generos, resumen
+    WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+    def index_books(self, book_ids):
+        with connection.cursor() as cursor:
+            for ids in _chunks(book_ids):
+                self._delete(cursor, ids)
+                cursor.execute(
+                    f'INSERT INTO {self.TABLE} '
+                    '(rowid, title, authors, genres, summary) '
+                    f'{self.DOCUMENT_SQL} WHERE b.id IN ({_placeholders(ids)})',
+                    ids,
+                )
+
+    def remove_books(self, book_ids):
+        with connection.cursor() as cursor:
+            for ids in _chunks(book_ids):
+                self._delete(cursor, ids)
+
+    def _delete(self, cursor, ids):
+        cursor.execute(
+            f'DELETE FROM {self.TABLE} WHERE rowid IN ({_placeholders(ids)})',
+            ids,
+        )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.TABLE}')
+            cursor.execute(
+                f'INSERT INTO {self.TABLE} '
+                f'(rowid, title, authors, genres, summary) {self.DOCUMENT_SQL}'
+            )
+            cursor.execute(f"INSERT INTO {self.TABLE}({self.TABLE}) VALUES ('optimize')")
+
+    def match_expression(self, query):
+        # Cada palabra entre comillas (sin sintaxis FTS5 del usuario) y la
+        # ultima como prefijo, para que funcione mientras se escribe.
+        words = WORD_RE.findall(query)
+        if not words:
+            return None
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def search(self, query, limit):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        weights = ', '.join(str(w) for w in self.WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, bm25({self.TABLE}, {weights}) AS rank '
+                f'FROM {self.TABLE} WHERE {self.TABLE} MATCH %s '
+                'AND rowid IN (SELECT id FROM catalog_book) '
+                'ORDER BY rank LIMIT %s',
+                [expression, limit],
+            )
+            # bm25 es "menor es mejor": lo devolvemos en positivo
+            return [(book_id, -rank) for book_id, rank in cursor.fetchall()]
+
+
+class PostgreSQLBackend(SearchBackend):
+    TABLE = 'catalog_book_search'
+    CONFIG = 'simple'
+    DOCUMENT_SQL = """
+        SELECT b.id,
+               setweight(to_tsvector(%(config)s, b.title), 'A')
+               || setweight(to_tsvector(%(config)s, COALESCE(
+                      a.first_name || ' ' || a.last_name, '')), 'B')
+               || setweight(to_tsvector(%(config)s, COALESCE(
+                      (SELECT string_agg(g.name, ' ')
+                       FROM catalog_book_genre bg
+                       JOIN catalog_genre g ON g.id = bg.genre_id
+                       WHERE bg.book_id = b.id), '')), 'C')
+               || setweight(to_tsvector(%(config)s, b.summary), 'D')
+        FROM catalog_book b
+        LEFT JOIN catalog_author a ON a.id = b.author_id
+    """
+    UPSERT_SQL = (
+        ' ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document'
+    )
+
+    def index_books(self, book_ids):
+        with connection.cursor() as cursor:
+            for ids in _chunks(book_ids):
+                cursor.execute(
+                    f'INSERT INTO {self.TABLE} (book_id, document) '
+                    f'{self.DOCUMENT_SQL} WHERE b.id = ANY(%(ids)s)'
+                    f'{self.UPSERT_SQL}',
+                    {'config': self.CONFIG, 'ids': ids},
+                )
+
+    def remove_books(self, book_ids):
+        with connection.cursor() as cursor:
+            for ids in _chunks(book_ids):
+                cursor.execute(
+                    f'DELETE FROM {self.TABLE} WHERE book_id = ANY(%s)', [ids]
+                )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.TABLE}')
+            cursor.execute(
+                f'INSERT INTO {self.TABLE} (book_id, document) '
+                f'{self.DOCUMENT_SQL}',
+                {'config': self.CONFIG},
+            )
+
+    def search(self, query, limit):
+        if not WORD_RE.search(query):
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT book_id, ts_rank_cd(document, q) AS rank '
+                f'FROM {self.TABLE} '
+                'JOIN catalog_book b ON b.id = book_id, '
+                'websearch_to_tsquery(%s, %s) q '
+                'WHERE document @@ q ORDER BY rank DESC LIMIT %s',
+                [self.CONFIG, query, limit],
+            )
+            return cursor.fetchall()
+
+
+class FallbackBackend(SearchBackend):
+    """Unranked search for backends without a text index."""
+
+    def index_books(self, book_ids):
+        pass
+
+    def remove_books(self, book_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, limit):
+        condition = Q()
+        for word in WORD_RE.findall(query):
+            condition &= (
+                Q(title__icontains=word) | Q(summary__icontains=word)
+                | Q(author__first_name__icontains=word)
+                | Q(author__last_name__icontains=word)
+                | Q(genre__name__icontains=word)
+            )
+        if not condition:
+            return []
+        ids = Book.objects.filter(condition).values_list(
+            'pk', flat=True
+        ).distinct()[:limit]
+        return [(book_id, 0) for book_id in ids]
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgreSQLBackend,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, FallbackBackend)()
+
+
+def search_books(query, limit=None):
+    """Returns the books matching ``query``, best ranked first.
+
+    Each book carries its score in ``search_rank``.
+    """
+    if limit is None:
+        limit = getattr(settings, 'CATALOG_SEARCH_MAX_RESULTS', 100)
+    ranked = get_backend().search(query, limit)
+    books = Book.objects.select_related('author').in_bulk(
+        [book_id for book_id, _ in ranked]
+    )
+    results = []
+    for book_id, rank in ranked:
+        book = books.get(book_id)
+        if book is not None:
+            book.search_rank = rank
+            results.append(book)
+    return results
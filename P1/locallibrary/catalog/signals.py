@@ -0,0 +1,432 @@
+"""
+Signal receivers that keep the denormalized catalog data up to date:
+the index counters, the copy counters of each book, the search index, the
+page cache versions, the ``updated_at`` of the books and authors whose
+pages show the change and the versions of the cached permission sets.
+
+Every receiver runs inside the transaction of the save/delete that
+triggered it, so a rolled back write also rolls back its counter changes.
+Bulk operations (QuerySet.update, bulk_create, raw SQL) do not send these
+signals: run ``manage.py rebuild_catalog_stats``,
+``manage.py reconcile_copy_counts`` and ``manage.py rebuild_search_index``
+after them.
+"""
+
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import page_cache, permissions
+from .models import Author, Book, BookInstance, CatalogStats, Genre, Language
+from .search import get_backend
+
+
+def _has_a(title):
+    """Mirrors the ``title__icontains='a'`` filter used by the index."""
+    return 'a' in (title or '').lower()
+
+
+def _remember(sender, instance, *fields, using=None, lock=False):
+    """Stores the values ``fields`` had in the database before the save.
+
+    ``instance._old_state`` is None for new objects. With ``lock`` the
+    row stays locked until the end of the transaction, so concurrent
+    saves of the same object read it one after the other.
+    """
+    instance._old_state = None
+    if instance.pk is not None and not instance._state.adding:
+        queryset = sender._base_manager.using(using).filter(pk=instance.pk)
+        if lock:
+            queryset = queryset.select_for_update()
+        instance._old_state = queryset.values(*fields).first()
+
+
+def _old(instance, field):
+    old_state = getattr(instance, '_old_state', None)
+    return old_state[field] if old_state else None
+
+
+@receiver(pre_save, sender=Book)
+def remember_book_state(sender, instance, using, **kwargs):
+    _remember(sender, instance, 'title', 'author_id', using=using)
+
+
+@receiver(post_save, sender=Book)
+def count_saved_book(sender, instance, created, **kwargs):
+    if created:
+        CatalogStats.bump(num_books=1, num_books_a=int(_has_a(instance.title)))
+        return
+    old_title = _old(instance, 'title')
+    if old_title is not None:
+        CatalogStats.bump(
+            num_books_a=int(_has_a(instance.title)) - int(_has_a(old_title))
+        )
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_book(sender, instance, **kwargs):
+    CatalogStats.bump(num_books=-1, num_books_a=-int(_has_a(instance.title)))
+
+
+@receiver(pre_save, sender=BookInstance)
+@receiver(pre_delete, sender=BookInstance)
+def remember_bookinstance_state(sender, instance, using, **kwargs):
+    # Los contadores se ajustan con el estado de la base de datos, no con
+    # el de la instancia, que puede estar desfasado
+    _remember(sender, instance, 'status', 'book_id', using=using, lock=True)
+
+
+@receiver(post_save, sender=BookInstance)
+def count_saved_bookinstance(sender, instance, created, **kwargs):
+    available = int(instance.status == 'a')
+    if created:
+        CatalogStats.bump(num_instances=1, num_instances_available=available)
+        return
+    old_status = _old(instance, 'status')
+    if old_status is not None:
+        CatalogStats.bump(
+            num_instances_available=available - int(old_status == 'a')
+        )
+
+
+@receiver(post_delete, sender=BookInstance)
+def count_deleted_bookinstance(sender, instance, **kwargs):
+    old_status = _old(instance, 'status')
+    if old_status is not None:
+        CatalogStats.bump(
+            num_instances=-1,
+            num_instances_available=-int(old_status == 'a'),
+        )
+
+
+# Copias de cada libro por estado (Book.copies_*)
+
+@receiver(post_save, sender=BookInstance)
+def count_saved_copy(sender, instance, created, **kwargs):
+    if created:
+        Book.count_copies({
+            instance.book_id: Book.copy_deltas(instance.status),
+        })
+        return
+    old_state = getattr(instance, '_old_state', None)
+    if old_state is None:
+        return
+    # Sale del estado (y libro) anterior y entra en el nuevo; si no ha
+    # cambiado nada los deltas se anulan y no hay UPDATE.
+    deltas = {}
+    for book_id, status, n in (
+        (old_state['book_id'], old_state['status'], -1),
+        (instance.book_id, instance.status, 1),
+    ):
+        book = deltas.setdefault(book_id, {})
+        for name, delta in Book.copy_deltas(status, n).items():
+            book[name] = book.get(name, 0) + delta
+    Book.count_copies(deltas)
+
+
+@receiver(post_delete, sender=BookInstance)
+def count_deleted_copy(sender, instance, **kwargs):
+    # Sin estado anterior la copia ya estaba borrada: no se descuenta
+    old_state = getattr(instance, '_old_state', None)
+    if old_state is not None:
+        Book.count_copies({
+            old_state['book_id']: Book.copy_deltas(old_state['status'], -1),
+        })
+
+
+@receiver(post_save, sender=Author)
+def count_saved_author(sender, instance, created, **kwargs):
+    if created:
+        CatalogStats.bump(num_authors=1)
+
+
+@receiver(post_delete, sender=Author)
+def count_deleted_author(sender, instance, **kwargs):
+    CatalogStats.bump(num_authors=-1)
+
+
+@receiver(post_save, sender=Genre)
+def count_saved_genre(sender, instance, created, **kwargs):
+    if created:
+        CatalogStats.bump(num_genres=1)
+
+
+@receiver(post_delete, sender=Genre)
+def count_deleted_genre(sender, instance, **kwargs):
+    CatalogStats.bump(num_genres=-1)
+
+
+# Indice de busqueda: cada libro es un documento con su titulo, autor,
+# generos y resumen, asi que tambien hay que reindexar cuando cambian
+# su autor o sus generos.
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, **kwargs):
+    get_backend().index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    get_backend().remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def index_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            get_backend().index_books([instance.pk])
+    elif action == 'pre_clear':
+        # genre.book_set.clear(): despues ya no sabremos que libros tenia
+        instance._search_book_ids = list(
+            instance.book_set.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        get_backend().index_books(getattr(instance, '_search_book_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        get_backend().index_books(pk_set)
+
+
+@receiver(post_save, sender=Author)
+def index_author_books(sender, instance, created, **kwargs):
+    if not created:
+        get_backend().index_books(
+            instance.book_set.values_list('pk', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Genre)
+def remember_genre_books(sender, instance, **kwargs):
+    # El borrado en cascada de la tabla intermedia no envia m2m_changed
+    instance._search_book_ids = list(
+        instance.book_set.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Genre)
+def index_genre_books(sender, instance, created, **kwargs):
+    if not created:
+        get_backend().index_books(
+            instance.book_set.values_list('pk', flat=True)
+        )
+
+
+@receiver(post_delete, sender=Genre)
+def index_deleted_genre_books(sender, instance, **kwargs):
+    get_backend().index_books(getattr(instance, '_search_book_ids', []))
+
+
+# Cache de paginas: cada cambio sustituye el token de version de los
+# objetos cuyas paginas muestran el dato modificado (ver page_cache.py).
+
+def _bump_books(book_ids, *names):
+    page_cache.bump(
+        *names, *(page_cache.book_key(book_id) for book_id in book_ids)
+    )
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_pages(sender, instance, **kwargs):
+    page_cache.bump(
+        page_cache.book_key(instance.pk),
+        page_cache.BOOK_LIST,
+        page_cache.FACETS,
+        page_cache.author_key(instance.author_id),
+        page_cache.author_key(_old(instance, 'author_id')),
+    )
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def invalidate_bookinstance_pages(sender, instance, **kwargs):
+    names = [
+        page_cache.book_key(instance.book_id),
+        page_cache.book_key(_old(instance, 'book_id')),
+    ]
+    # El listado de libros muestra las copias disponibles de cada uno
+    old_state = getattr(instance, '_old_state', None)
+    if kwargs.get('created', True) or old_state != {
+        'book_id': instance.book_id, 'status': instance.status,
+    }:
+        names.append(page_cache.BOOK_LIST)
+    page_cache.bump(*names)
+
+
+# El listado de libros muestra las facetas de genero, idioma y autor con
+# sus nombres y cuentas (ver facets.py), asi que tambien depende de ellos;
+# los recuentos sin filtros se cachean aparte bajo FACETS.
+FACET_LISTS = (page_cache.BOOK_LIST, page_cache.FACETS)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def invalidate_book_genre_pages(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            page_cache.bump(
+                page_cache.book_key(instance.pk), *FACET_LISTS
+            )
+    elif action == 'post_clear':
+        _bump_books(getattr(instance, '_search_book_ids', []), *FACET_LISTS)
+    elif action in ('post_add', 'post_remove'):
+        _bump_books(pk_set, *FACET_LISTS)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_pages(sender, instance, **kwargs):
+    # El nombre del autor aparece en su ficha, en el listado de autores,
+    # en el listado de libros y en la ficha de cada uno de sus libros.
+    book_ids = []
+    if not kwargs.get('created', True):
+        book_ids = instance.book_set.values_list('pk', flat=True)
+    _bump_books(
+        book_ids,
+        page_cache.author_key(instance.pk),
+        page_cache.AUTHOR_LIST,
+        *FACET_LISTS,
+    )
+
+
+@receiver(post_save, sender=Genre)
+def invalidate_genre_pages(sender, instance, created, **kwargs):
+    if not created:
+        _bump_books(
+            instance.book_set.values_list('pk', flat=True), *FACET_LISTS,
+        )
+
+
+@receiver(post_delete, sender=Genre)
+def invalidate_deleted_genre_pages(sender, instance, **kwargs):
+    _bump_books(getattr(instance, '_search_book_ids', []), *FACET_LISTS)
+
+
+@receiver(pre_delete, sender=Language)
+def remember_language_books(sender, instance, **kwargs):
+    # on_delete=SET_NULL actualiza los libros con un UPDATE sin señales
+    instance._cache_book_ids = list(
+        instance.book_set.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Language)
+def invalidate_language_pages(sender, instance, created, **kwargs):
+    if not created:
+        _bump_books(
+            instance.book_set.values_list('pk', flat=True), *FACET_LISTS,
+        )
+
+
+@receiver(post_delete, sender=Language)
+def invalidate_deleted_language_pages(sender, instance, **kwargs):
+    _bump_books(getattr(instance, '_cache_book_ids', []), *FACET_LISTS)
+
+
+# Marcas de modificacion (updated_at): el Last-Modified de una ficha tiene
+# que cambiar tambien cuando cambia algo que la ficha muestra de otro
+# objeto (ver TimestampedModel.touch y page_cache.ConditionalGetMixin).
+
+def _touch_related_books(instance):
+    instance.book_set.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def touch_bookinstance_book(sender, instance, **kwargs):
+    Book.touch([instance.book_id, _old(instance, 'book_id')])
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def touch_book_author(sender, instance, **kwargs):
+    Author.touch([instance.author_id, _old(instance, 'author_id')])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Book.touch([instance.pk])
+    elif action == 'post_clear':
+        Book.touch(getattr(instance, '_search_book_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        Book.touch(pk_set)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Language)
+def touch_renamed_books(sender, instance, created, **kwargs):
+    if not created:
+        _touch_related_books(instance)
+
+
+@receiver(post_delete, sender=Genre)
+def touch_deleted_genre_books(sender, instance, **kwargs):
+    Book.touch(getattr(instance, '_search_book_ids', []))
+
+
+@receiver(post_delete, sender=Language)
+def touch_deleted_language_books(sender, instance, **kwargs):
+    Book.touch(getattr(instance, '_cache_book_ids', []))
+
+
+# Permisos cacheados (ver catalog/permissions.py): cada cambio sustituye
+# el token de version del usuario afectado, o el de todos cuando cambian
+# los permisos de un grupo o no se sabe a quien afecta.
+
+def _bump_users(user_ids):
+    page_cache.bump(
+        *(permissions.user_key(user_id) for user_id in user_ids)
+    )
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_permissions(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _bump_users([instance.pk])
+    elif action == 'post_clear':
+        # permission.user_set.clear(): ya no sabemos que usuarios tenia
+        page_cache.bump(permissions.PERMISSIONS)
+    else:
+        _bump_users(pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        page_cache.bump(permissions.PERMISSIONS)
+
+
+@receiver(post_save, sender=User)
+def invalidate_saved_user_permissions(sender, instance, update_fields,
+                                      **kwargs):
+    # is_superuser e is_active cambian sus permisos; el login solo
+    # actualiza last_login
+    if update_fields is None or not update_fields <= {'last_login'}:
+        _bump_users([instance.pk])
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user_permissions(sender, instance, **kwargs):
+    _bump_users([instance.pk])
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(post_delete, sender=Group)
+def invalidate_all_permissions(sender, **kwargs):
+    # El borrado en cascada de las tablas intermedias no envia
+    # m2m_changed, y los superusuarios tienen todos los permisos
+    page_cache.bump(permissions.PERMISSIONS)
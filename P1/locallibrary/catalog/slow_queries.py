@@ -0,0 +1,203 @@
+"""
+Opt-in capture of slow and repeated SQL queries.
+
+When ``SLOW_QUERY_THRESHOLD_MS`` is set, ``SlowQueryMiddleware`` (in
+catalog.middleware) installs a ``RequestRecorder`` on every connection with
+``execute_wrapper`` for the duration of each request, which:
+
+* logs queries slower than the threshold together with the view that ran
+  them, the line of project code they came from and an ``EXPLAIN QUERY
+  PLAN`` (SQLite) or ``EXPLAIN`` (PostgreSQL) of the statement;
+* detects N+1 patterns: the same statement repeated at least
+  ``SLOW_QUERY_REPEAT_THRESHOLD`` times in one request.
+
+Statements are aggregated by fingerprint (the SQL with literals and IN
+lists normalized), so each pattern is logged in full (with its plan) the
+first time only; later occurrences are logged when its count reaches a
+power of two, with the running totals. ``report()`` returns the
+aggregates of this process.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def normalize(sql):
+    """The SQL with literals, numbers and IN lists replaced by ``?``."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+@dataclass
+class Pattern:
+    fingerprint: str
+    sql: str
+    origin: str
+    plan: str = None
+    count: int = 0
+    slow: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    max_repeats: int = 0
+    n_plus_one: int = 0
+    views: set = field(default_factory=set)
+
+
+_patterns = {}
+
+
+def report():
+    """Aggregated patterns of this process, most expensive first."""
+    with _lock:
+        patterns = list(_patterns.values())
+    return sorted(patterns, key=lambda p: p.total_time, reverse=True)
+
+
+def reset():
+    with _lock:
+        _patterns.clear()
+
+
+def origin():
+    """First frame of project code (not Django, not this module)."""
+    base = str(settings.BASE_DIR)
+    fallback = None
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        filename = frame.filename
+        if filename == __file__ or filename.endswith('catalog/middleware.py'):
+            continue
+        if filename.startswith(base) and 'site-packages' not in filename:
+            return f'{filename[len(base) + 1:]}:{frame.lineno} in {frame.name}'
+        if fallback is None and '/django/db/' not in filename:
+            fallback = f'{filename}:{frame.lineno} in {frame.name}'
+    return fallback or '<unknown>'
+
+
+def explain(connection, sql, params):
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+    if prefix is None or not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    _local.explaining = True
+    try:
+        # Savepoint: un EXPLAIN fallido no debe romper la transaccion
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+    except DatabaseError as e:
+        return f'<EXPLAIN failed: {e}>'
+    finally:
+        _local.explaining = False
+    return '\n'.join(' | '.join(str(col) for col in row) for row in rows)
+
+
+class RequestRecorder:
+    """Collects the statements of one request (one per thread)."""
+
+    def __init__(self, threshold, view=None):
+        self.threshold = threshold
+        self.view = view
+        self.repeats = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            key = fingerprint(sql)
+            self.repeats[key] = self.repeats.get(key, 0) + 1
+            if elapsed >= self.threshold:
+                connection = context['connection']
+                self.record(
+                    key, sql, elapsed, slow=True,
+                    plan=lambda: None if many else explain(connection, sql, params),
+                )
+            else:
+                self.record(key, sql, elapsed, slow=False)
+
+    def record(self, key, sql, elapsed, slow, plan=None):
+        with _lock:
+            pattern = _patterns.get(key)
+            new = pattern is None
+            if new:
+                pattern = _patterns[key] = Pattern(key, normalize(sql), origin())
+            pattern.count += 1
+            pattern.slow += slow
+            pattern.total_time += elapsed
+            pattern.max_time = max(pattern.max_time, elapsed)
+            if self.view:
+                pattern.views.add(self.view)
+            capture_plan = slow and pattern.plan is None and plan is not None
+        if capture_plan:
+            pattern.plan = plan()
+        if slow:
+            self.log('Slow query', pattern, pattern.slow, elapsed)
+
+    def finish(self):
+        """Reports the statements repeated enough to be an N+1."""
+        limit = getattr(settings, 'SLOW_QUERY_REPEAT_THRESHOLD', 10)
+        for key, repeats in self.repeats.items():
+            if repeats < limit:
+                continue
+            with _lock:
+                pattern = _patterns[key]
+                pattern.max_repeats = max(pattern.max_repeats, repeats)
+                pattern.n_plus_one += 1
+                occurrences = pattern.n_plus_one
+            self.log(
+                f'Repeated query (x{repeats} in one request)', pattern,
+                occurrences,
+            )
+
+    def log(self, kind, pattern, occurrences, elapsed=None):
+        # Solo la primera vez con todo el detalle; despues, al llegar a
+        # potencias de dos, un resumen con los totales acumulados.
+        if occurrences & (occurrences - 1):
+            return
+        timing = f' took {elapsed * 1000:.1f}ms' if elapsed is not None else ''
+        if occurrences == 1:
+            logger.warning(
+                '%s [%s]%s in view %s\n  origin: %s\n  sql: %s\n  plan:\n%s',
+                kind, pattern.fingerprint, timing, self.view or '-',
+                pattern.origin, pattern.sql, pattern.plan or '  (none)',
+            )
+        else:
+            logger.warning(
+                '%s [%s] seen %d times (%d executions, %.1fms total, '
+                'max %.1fms) in views %s',
+                kind, pattern.fingerprint, occurrences, pattern.count,
+                pattern.total_time * 1000, pattern.max_time * 1000,
+                ', '.join(sorted(pattern.views)) or '-',
+            )
@@ -0,0 +1,28 @@
+"""
+Shared test data for the loan tests (circulation desk, overdue report).
+
+Call it from ``setUpTestData``::
+
+    cls.book, cls.reader, cls.librarian = create_loan_fixture()
+
+Both users have the password ``x``; the librarian can mark copies
+returned.
+"""
+
+from django.contrib.auth.models import Permission, User
+
+from catalog.models import Author, Book
+
+
+def create_loan_fixture():
+    """Returns a book, a reader and a librarian."""
+    author = Author.objects.create(first_name='John', last_name='Smith')
+    book = Book.objects.create(
+        title='Book Title', summary='-', isbn='ABCDEFG', author=author
+    )
+    reader = User.objects.create_user('reader', password='x')
+    librarian = User.objects.create_user('librarian', password='x')
+    librarian.user_permissions.add(
+        Permission.objects.get(codename='can_mark_returned')
+    )
+    return book, reader, librarian
@@ -0,0 +1,50 @@
+"""
+Query budget helper for the catalog tests.
+
+``query_budget(n)`` works as a context manager or as a decorator and fails
+the test if the wrapped code runs more than ``n`` SQL queries, listing the
+captured queries so the N+1 pattern responsible is easy to spot::
+
+    with query_budget(4):
+        self.client.get(reverse('book-detail', args=[book.pk]))
+
+    @query_budget(4)
+    def test_book_detail(self):
+        ...
+"""
+
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget(ContextDecorator):
+    def __init__(self, max_queries, using=DEFAULT_DB_ALIAS):
+        self.max_queries = max_queries
+        self.using = using
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        return self.context
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        executed = len(self.context)
+        if executed > self.max_queries:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}'
+                for i, query in enumerate(self.context.captured_queries, 1)
+            )
+            raise QueryBudgetExceeded(
+                f'{executed} queries executed, at most {self.max_queries} '
+                f'allowed\nCaptured queries were:\n{queries}'
+            )
+        return False
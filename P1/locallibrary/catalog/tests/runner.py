@@ -0,0 +1,29 @@
+"""
+Test runner for the catalog tests.
+
+The rendered page cache (see catalog/page_cache.py) lives in the process
+cache, which survives from one TestCase to the next while the database is
+rolled back and primary keys are reused, so a page cached by one test could
+be served to another. ``CatalogTestRunner`` runs the suite with the page
+cache off; the tests that exercise it turn it on with::
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=600)
+
+and clear the cache in ``setUp``.
+"""
+
+from django.core.cache import cache
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class CatalogTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._page_cache = override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+        self._page_cache.enable()
+        cache.clear()
+
+    def teardown_test_environment(self, **kwargs):
+        self._page_cache.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,167 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.admin import CappedInlineFormSet
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.pagination import EstimatedCountPaginator, estimated_count
+
+
+class CatalogAdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        cls.author = Author.objects.create(first_name='Stephen', last_name='King')
+        cls.genres = [Genre.objects.create(name=f'Genre {i}') for i in range(4)]
+        cls.reader = User.objects.create_user('reader')
+        cls.language = Language.objects.create(name='English')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_books(self, n, copies=1):
+        for i in range(n):
+            book = Book.objects.create(
+                title=f'Book {Book.objects.count()}', summary='-',
+                isbn=f'{Book.objects.count():013d}', author=self.author,
+                language=self.language,
+            )
+            book.genre.set(self.genres)
+            for _ in range(copies):
+                BookInstance.objects.create(
+                    book=book, imprint='-', status='o', borrower=self.reader,
+                )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_book_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:catalog_book_changelist')
+        self.add_books(2)
+        few = self.count_queries(url)
+        self.add_books(10)
+        self.assertEqual(self.count_queries(url), few)
+        response = self.client.get(url)
+        self.assertContains(response, 'Genre 0, Genre 1, Genre 2')
+
+    def test_bookinstance_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:catalog_bookinstance_changelist')
+        self.add_books(2)
+        few = self.count_queries(url)
+        self.add_books(10)
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_filtered_changelist_skips_full_count(self):
+        self.add_books(3)
+        url = reverse('admin:catalog_bookinstance_changelist') + '?status__exact=o'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertIsNone(response.context['cl'].full_result_count)
+        counts = [q['sql'] for q in queries if 'COUNT(' in q['sql'] and 'catalog_bookinstance' in q['sql']]
+        self.assertEqual(len(counts), 1)
+
+    def test_autocomplete(self):
+        for model, field, term in (
+            ('book', 'author', 'Ki'),
+            ('bookinstance', 'book', 'Book'),
+            ('bookinstance', 'borrower', 'rea'),
+        ):
+            self.add_books(1)
+            response = self.client.get(reverse('admin:autocomplete'), {
+                'app_label': 'catalog', 'model_name': model,
+                'field_name': field, 'term': term,
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()['results'], (model, field))
+
+    def test_inline_shows_at_most_max_rows(self):
+        self.add_books(3)
+        url = reverse('admin:catalog_author_change', args=[self.author.pk])
+        with mock.patch.object(CappedInlineFormSet, 'max_rows', 2):
+            response = self.client.get(url)
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.initial_forms), 2)
+        self.assertContains(response, 'Showing 2 of 3 books.')
+        self.assertContains(
+            response,
+            reverse('admin:catalog_book_changelist') + f'?author__id__exact={self.author.pk}',
+        )
+        response = self.client.get(formset.changelist_url())
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_inline_without_truncation(self):
+        self.add_books(1, copies=2)
+        book = Book.objects.get()
+        response = self.client.get(reverse('admin:catalog_book_change', args=[book.pk]))
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.initial_forms), 2)
+        self.assertFalse(formset.truncated)
+        self.assertNotContains(response, 'View all')
+
+    def test_capped_inline_saves(self):
+        self.add_books(3)
+        url = reverse('admin:catalog_author_change', args=[self.author.pk])
+        with mock.patch.object(CappedInlineFormSet, 'max_rows', 2):
+            formset = self.client.get(url).context['inline_admin_formsets'][0].formset
+            data = {
+                'first_name': 'Stephen', 'last_name': 'King',
+                'book_set-TOTAL_FORMS': '2', 'book_set-INITIAL_FORMS': '2',
+                'book_set-MIN_NUM_FORMS': '0', 'book_set-MAX_NUM_FORMS': '1000',
+            }
+            for i, form in enumerate(formset.initial_forms):
+                book = form.instance
+                data.update({
+                    f'book_set-{i}-id': book.pk, f'book_set-{i}-author': self.author.pk,
+                    f'book_set-{i}-title': book.title + ' (2nd ed.)',
+                    f'book_set-{i}-summary': book.summary, f'book_set-{i}-isbn': book.isbn,
+                    f'book_set-{i}-genre': [genre.pk for genre in self.genres],
+                    f'book_set-{i}-language': self.language.pk,
+                })
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Book.objects.filter(title__endswith='(2nd ed.)').count(), 2)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        for i in range(12):
+            Book.objects.create(title=f'Book {i}', summary='-', isbn=f'{i:013d}', author=author)
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_estimate_from_statistics(self):
+        self.analyze()
+        self.assertEqual(estimated_count(Book.objects.all()), 12)
+        self.assertEqual(estimated_count(Book.objects.select_related('author')), 12)
+        self.assertIsNone(estimated_count(Book.objects.filter(title='Book 1')))
+        self.assertIsNone(estimated_count(Book.objects.distinct()))
+
+    @override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=10)
+    def test_big_unfiltered_tables_are_not_counted(self):
+        self.analyze()
+        Book.objects.filter(title='Book 0').delete()
+        paginator = EstimatedCountPaginator(Book.objects.all(), 5)
+        with self.assertNumQueries(1):
+            # Estadisticas anteriores al borrado
+            self.assertEqual(paginator.count, 12)
+
+        paginator = EstimatedCountPaginator(Book.objects.filter(title__startswith='Book 1'), 5)
+        self.assertEqual(paginator.count, 3)
+
+    def test_small_tables_are_counted(self):
+        self.analyze()
+        Book.objects.filter(title='Book 0').delete()
+        self.assertEqual(EstimatedCountPaginator(Book.objects.all(), 5).count, 11)
+        self.assertEqual(EstimatedCountPaginator(list(range(4)), 5).count, 4)
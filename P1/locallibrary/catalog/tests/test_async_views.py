@@ -0,0 +1,106 @@
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import async_views
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.tests.query_budget import query_budget
+from catalog.visits import visit_counter
+
+
+class AsyncViewsTest(TestCase):
+    """The ASGI handler (AsyncClient) serves the read-only pages with
+    catalog.async_views, on the same URLs and templates."""
+
+    @classmethod
+    def setUpTestData(cls):
+        language = Language.objects.create(name='English')
+        genre = Genre.objects.create(name='Horror')
+        cls.author = Author.objects.create(first_name='Stephen', last_name='King')
+        for i in range(3):
+            book = Book.objects.create(
+                title=f'Book {i}', summary='Summary', isbn=f'{i:013d}',
+                author=cls.author, language=language,
+            )
+            book.genre.add(genre)
+        cls.book = book
+        for i in range(5):
+            BookInstance.objects.create(book=book, imprint=f'Imprint {i}', status='a')
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        visit_counter.flush()
+
+    def get(self, url, **extra):
+        return async_to_sync(self.async_client.get)(url, **extra)
+
+    def test_read_only_pages_use_async_views(self):
+        for url, view in [
+            (reverse('index'), async_views.index),
+            (reverse('books'), async_views.book_list),
+            (reverse('authors'), async_views.author_list),
+            (self.book.get_absolute_url(), async_views.book_detail),
+            (self.author.get_absolute_url(), async_views.author_detail),
+        ]:
+            response = self.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIs(response.resolver_match.func, view)
+        # Las demas URLs siguen con las vistas sincronas
+        self.assertEqual(self.get(reverse('search')).status_code, 200)
+
+    def test_index(self):
+        response = self.get(reverse('index'))
+        self.assertTemplateUsed(response, 'index.html')
+        self.assertEqual(response.context['num_books'], 3)
+        self.assertEqual(response.context['num_visits'], 1)
+
+    def test_book_list_pagination(self):
+        response = self.get(reverse('books'))
+        self.assertContains(response, 'Page 1 of 2')
+        self.assertEqual(len(response.context['book_list']), 2)
+        response = self.get(reverse('books') + '?page=2')
+        self.assertEqual(len(response.context['book_list']), 1)
+        response = self.get(reverse('books') + '?page=last')
+        self.assertEqual(response.context['page_obj'].number, 2)
+        for page in ('3', 'x', '0'):
+            response = self.get(reverse('books') + f'?page={page}')
+            self.assertEqual(response.status_code, 404)
+
+    @override_settings(CATALOG_PAGINATION_MODE='keyset')
+    def test_keyset_pagination(self):
+        response = self.get(reverse('books'))
+        self.assertTrue(response.context['is_keyset_paginated'])
+        self.assertTrue(response.context['page_obj'].has_next())
+
+    def test_book_detail_queries_and_conditional_get(self):
+        # Libro+autor+idioma, generos y copias, como la vista sincrona
+        with query_budget(3):
+            response = self.get(self.book.get_absolute_url())
+        self.assertContains(response, 'Imprint 4')
+        self.assertContains(response, 'Horror')
+        with query_budget(1):
+            response = self.get(
+                self.book.get_absolute_url(),
+                headers={'if-none-match': response['ETag']},
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get(reverse('book-detail', args=[999])).status_code, 404)
+
+    def test_author_detail(self):
+        response = self.get(self.author.get_absolute_url())
+        self.assertTemplateUsed(response, 'catalog/author_detail.html')
+        self.assertContains(response, 'Book 2')
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=600)
+    def test_page_cache(self):
+        first = self.get(reverse('authors'))
+        with query_budget(0):
+            second = self.get(reverse('authors'))
+        self.assertEqual(first.content, second.content)
+
+    def test_only_safe_methods(self):
+        response = async_to_sync(self.async_client.post)(reverse('books'))
+        self.assertEqual(response.status_code, 405)
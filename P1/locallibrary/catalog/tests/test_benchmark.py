@@ -0,0 +1,89 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from catalog.benchmark import RenewalLoad, loan_ids, percentile
+from catalog.generator import CatalogGenerator
+from catalog.models import BookInstance
+
+
+class PercentileTest(TestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+class BenchmarkCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        CatalogGenerator(seed=1, authors=5, books=20, copies=60, readers=3).run()
+
+    def test_in_process_run_is_saved_and_compared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(2):
+                out = io.StringIO()
+                call_command(
+                    'benchmark_catalog', '--requests', '3', '--warmup', '1',
+                    '--output-dir', directory, stdout=out,
+                )
+            reports = sorted(Path(directory).glob('*.json'))
+            self.assertEqual(len(reports), 2)
+            data = json.loads(reports[-1].read_text())
+
+        names = {row['name'] for row in data['results']}
+        self.assertEqual(names, {
+            'index', 'books', 'authors', 'all-borrowed', 'my-borrowed',
+            'book-detail', 'author-detail', 'renew',
+        })
+        for row in data['results']:
+            self.assertEqual(row['errors'], 0, row['name'])
+            self.assertEqual(row['requests'], 3)
+            self.assertGreater(row['mean_queries'], 0)
+        self.assertEqual(data['dataset']['books'], 20)
+        self.assertIn('p95', out.getvalue())
+
+    def test_asgi_run_is_compared_with_wsgi(self):
+        with tempfile.TemporaryDirectory() as directory:
+            out = io.StringIO()
+            call_command(
+                'benchmark_catalog', '--mode', 'inprocess-asgi', '--vs-wsgi',
+                '--requests', '3', '--warmup', '1', '--only', 'books',
+                'book-detail', '--output-dir', directory, stdout=out,
+            )
+            reports = sorted(Path(directory).glob('*.json'))
+            self.assertEqual(len(reports), 2)
+            data = json.loads(reports[-1].read_text())
+        self.assertEqual(data['mode'], 'inprocess-asgi')
+        for row in data['results']:
+            self.assertEqual(row['errors'], 0, row['name'])
+        self.assertIn('[inprocess]', out.getvalue())
+        self.assertIn('vs inprocess', out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_catalog', '--vs-wsgi', '--no-save')
+
+    def test_renewal_load(self):
+        copies = loan_ids(count=5, seed=1)
+        self.assertTrue(copies)
+        load = RenewalLoad(writers=2, copies=copies, seed=1)
+        for _ in range(5):
+            load.renew_once()
+        self.assertEqual(load.result.requests, 5)
+        self.assertEqual(load.result.errors, 0)
+        self.assertEqual(
+            BookInstance.objects.filter(pk__in=copies).exclude(status='o').count(), 0
+        )
+        with RenewalLoad(writers=0, copies=copies) as idle:
+            pass
+        self.assertEqual(idle.threads, [])
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_catalog', '--vs-sqlite-default', '--vs-wsgi', '--no-save')
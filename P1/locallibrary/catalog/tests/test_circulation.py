@@ -0,0 +1,183 @@
+import datetime
+import json
+import uuid
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import circulation
+from catalog.circulation import CirculationError, circulate
+from catalog.models import BookInstance, CatalogStats
+from catalog.tests.fixtures import create_loan_fixture
+
+
+class CirculationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book, cls.reader, cls.librarian = create_loan_fixture()
+        due = datetime.date.today() + datetime.timedelta(days=5)
+        cls.on_loan = [
+            BookInstance.objects.create(
+                book=cls.book, imprint='Imprint', status='o',
+                due_back=due, borrower=cls.reader,
+            )
+            for _ in range(5)
+        ]
+        cls.available = [
+            BookInstance.objects.create(
+                book=cls.book, imprint='Imprint', status='a'
+            )
+            for _ in range(3)
+        ]
+        cls.maintenance = BookInstance.objects.create(
+            book=cls.book, imprint='Imprint', status='m'
+        )
+
+    def test_return_uses_one_select_and_one_update(self):
+        ids = [str(copy.pk) for copy in self.on_loan]
+        with CaptureQueriesContext(connection) as queries:
+            result = circulate(circulation.RETURN, ids)
+        self.assertEqual(result.done, 5)
+        statements = [
+            q['sql'].split()[0] for q in queries.captured_queries
+            if q['sql'].split()[0] in ('SELECT', 'UPDATE')
+        ]
+        # SELECT de las copias, UPDATE de las copias, del contador y del
+        # updated_at de sus libros
+        self.assertEqual(statements, ['SELECT', 'UPDATE', 'UPDATE', 'UPDATE'])
+        self.assertEqual(
+            BookInstance.objects.filter(
+                status='a', borrower__isnull=True, due_back__isnull=True
+            ).count(),
+            8,
+        )
+        self.assertEqual(CatalogStats.load().num_instances_available, 8)
+
+    def test_per_item_validation(self):
+        missing = str(uuid.uuid4())
+        items = [
+            str(self.on_loan[0].pk), 'not-a-uuid', str(self.on_loan[0].pk),
+            missing, str(self.available[0].pk),
+        ]
+        result = circulate(circulation.RETURN, items)
+        self.assertEqual(
+            [(item.ok, item.message) for item in result.items],
+            [
+                (True, 'OK'),
+                (False, 'ID no valido'),
+                (False, 'Duplicado'),
+                (False, 'No existe'),
+                (False, 'Estado no permitido (Available)'),
+            ],
+        )
+        self.assertEqual(result.as_dict()['done'], 1)
+
+    def test_lend_and_renew(self):
+        due = datetime.date.today() + datetime.timedelta(weeks=2)
+        ids = [str(copy.pk) for copy in self.available]
+        ids.append(str(self.maintenance.pk))
+        result = circulate(circulation.LEND, ids, borrower=self.reader,
+                           due_back=due)
+        self.assertEqual((result.done, result.failed), (3, 1))
+        self.assertEqual(
+            BookInstance.objects.filter(
+                status='o', borrower=self.reader, due_back=due
+            ).count(),
+            3,
+        )
+        self.assertEqual(CatalogStats.load().num_instances_available, 0)
+
+        result = circulate(circulation.RENEW, [str(self.on_loan[0].pk)])
+        self.assertEqual(result.done, 1)
+        self.on_loan[0].refresh_from_db()
+        self.assertEqual(
+            self.on_loan[0].due_back,
+            datetime.date.today() + circulation.LOAN_PERIOD,
+        )
+
+    def test_lend_requires_borrower(self):
+        with self.assertRaises(CirculationError):
+            circulate(circulation.LEND, [str(self.available[0].pk)])
+
+    def test_requires_permission(self):
+        url = reverse('bulk-circulation')
+        self.assertRedirects(
+            self.client.get(url), f'{reverse("login")}?next={url}'
+        )
+        self.client.login(username='reader', password='x')
+        response = self.client.post(
+            reverse('bulk-circulation-api', args=['return']),
+            str(self.on_loan[0].pk), content_type='text/plain',
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_form_shows_results(self):
+        self.client.login(username='librarian', password='x')
+        response = self.client.post(reverse('bulk-circulation'), {
+            'action': 'return',
+            'items': '\n'.join(str(copy.pk) for copy in self.on_loan[:2]),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/bulk_circulation.html')
+        self.assertEqual(response.context['result'].done, 2)
+        self.assertContains(response, 'Book Title')
+
+    def test_form_lend_needs_existing_borrower(self):
+        self.client.login(username='librarian', password='x')
+        response = self.client.post(reverse('bulk-circulation'), {
+            'action': 'lend', 'items': str(self.available[0].pk),
+            'borrower': 'nobody',
+        })
+        self.assertFormError(
+            response.context['form'], 'borrower', 'El usuario no existe'
+        )
+
+    def test_api_scan_stream_and_json(self):
+        self.client.login(username='librarian', password='x')
+        stream = '\n'.join(str(copy.pk) for copy in self.on_loan) + '\n'
+        response = self.client.post(
+            reverse('bulk-circulation-api', args=['return']),
+            stream, content_type='text/plain',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['done'], 5)
+
+        response = self.client.post(
+            reverse('bulk-circulation-api', args=['lend']),
+            json.dumps({
+                'items': [str(copy.pk) for copy in self.available],
+                'borrower': 'reader',
+            }),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['done'], 3)
+
+        response = self.client.post(
+            reverse('bulk-circulation-api', args=['burn']),
+            json.dumps({'items': [str(self.available[0].pk)]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('action', response.json()['errors'])
+
+    def test_bad_payloads_and_circulation_errors(self):
+        self.client.login(username='librarian', password='x')
+        url = reverse('bulk-circulation-api', args=['return'])
+        response = self.client.post(url, b'\xff\xfe\x00', content_type='text/plain')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Invalid encoding'})
+
+        error = CirculationError('Copies changed while being processed, try again')
+        with mock.patch.object(circulation, 'circulate', side_effect=error):
+            response = self.client.post(url, str(self.on_loan[0].pk), content_type='text/plain')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': str(error)})
+
+            response = self.client.post(reverse('bulk-circulation'), {
+                'action': 'return', 'items': str(self.on_loan[0].pk),
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertFormError(response.context['form'], None, str(error))
@@ -0,0 +1,111 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.tests.query_budget import query_budget
+
+
+class UpdatedAtPropagationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.language = Language.objects.create(name='English')
+        cls.genre = Genre.objects.create(name='Horror')
+        cls.author = Author.objects.create(first_name='Stephen', last_name='King')
+        cls.book = Book.objects.create(
+            title='The Shining', summary='Overlook Hotel', isbn='9780345806789',
+            author=cls.author, language=cls.language,
+        )
+
+    def assertTouched(self, obj):
+        before = obj.updated_at
+        obj.refresh_from_db(fields=['updated_at'])
+        self.assertGreater(obj.updated_at, before)
+
+    def test_copies_and_genres_touch_their_book(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='First')
+        self.assertTouched(self.book)
+        copy.status = 'a'
+        copy.save()
+        self.assertTouched(self.book)
+        self.book.genre.add(self.genre)
+        self.assertTouched(self.book)
+        self.genre.name = 'Terror'
+        self.genre.save()
+        self.assertTouched(self.book)
+        self.language.name = 'Inglés'
+        self.language.save()
+        self.assertTouched(self.book)
+        copy.delete()
+        self.assertTouched(self.book)
+
+    def test_book_and_author_touch_each_other(self):
+        self.book.title = 'It'
+        self.book.save()
+        self.assertTouched(self.author)
+        self.author.last_name = 'Bachman'
+        self.author.save()
+        self.assertTouched(self.book)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Stephen', last_name='King')
+        cls.book = Book.objects.create(
+            title='The Shining', summary='Overlook Hotel', isbn='9780345806789',
+            author=cls.author,
+        )
+        BookInstance.objects.create(book=cls.book, imprint='First', status='a')
+        User.objects.create_user('reader', password='biblioteca')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified_without_rendering(self):
+        for url in (self.book.get_absolute_url(),
+                    self.author.get_absolute_url()):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Last-Modified', response)
+            # Solo la lectura del objeto: ni prefetch ni plantilla
+            with query_budget(1):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response.templates, [])
+
+    def test_if_modified_since(self):
+        url = self.book.get_absolute_url()
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        url = self.book.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        BookInstance.objects.create(book=self.book, imprint='Second')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Second')
+
+    def test_etag_depends_on_user(self):
+        url = self.book.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        self.client.login(username='reader', password='biblioteca')
+        self.client.get(url)  # fija la cookie CSRF
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=600)
+    def test_cached_page_answers_conditional_requests(self):
+        url = self.book.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        with query_budget(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
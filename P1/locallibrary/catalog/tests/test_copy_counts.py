@@ -0,0 +1,205 @@
+import io
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import circulation, page_cache
+from catalog.generator import CatalogGenerator
+from catalog.importer import COPIES, CatalogImporter
+from catalog.models import Author, Book, BookInstance
+from catalog.tests.query_budget import query_budget
+
+
+class CopyCountsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.book = Book.objects.create(
+            title='The Dispossessed', summary='-', isbn='9780061054884',
+            author=cls.author,
+        )
+        cls.other = Book.objects.create(
+            title='The Lathe of Heaven', summary='-', isbn='9781416556961',
+            author=cls.author,
+        )
+        for status in ('a', 'a', 'o', 'r', 'm'):
+            BookInstance.objects.create(book=cls.book, imprint='Harper', status=status)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertCounts(self, book, total, available, on_loan, reserved):
+        book = Book.objects.get(pk=book.pk)
+        self.assertEqual(
+            (book.copies_total, book.copies_available, book.copies_on_loan,
+             book.copies_reserved),
+            (total, available, on_loan, reserved),
+        )
+        self.assertFalse(Book.drifted().exists())
+
+    def add_available_copies(self):
+        for _ in range(3):
+            BookInstance.objects.create(book=self.other, imprint='Ace', status='a')
+
+    def book_list_version(self):
+        return page_cache.versions([page_cache.BOOK_LIST])
+
+    def test_counts_follow_creations(self):
+        self.assertCounts(self.book, 5, 2, 1, 1)
+        self.assertEqual(Book.objects.get(pk=self.book.pk).copies_in_maintenance, 1)
+        self.assertCounts(self.other, 0, 0, 0, 0)
+
+    def test_counts_follow_status_changes_moves_and_deletes(self):
+        copy = BookInstance.objects.get(status='o')
+        copy.status = 'a'
+        copy.save()
+        self.assertCounts(self.book, 5, 3, 0, 1)
+
+        copy.book = self.other
+        copy.save()
+        self.assertCounts(self.book, 4, 2, 0, 1)
+        self.assertCounts(self.other, 1, 1, 0, 0)
+
+        copy.delete()
+        self.assertCounts(self.other, 0, 0, 0, 0)
+
+    def test_unchanged_status_does_not_update_book(self):
+        copy = BookInstance.objects.get(status='o')
+        copy.imprint = 'Reprint'
+        with self.assertNumQueries(3):
+            # SELECT del estado anterior, UPDATE de la copia y updated_at
+            # del libro: sin UPDATE de los contadores
+            copy.save()
+        self.assertCounts(self.book, 5, 2, 1, 1)
+
+    def test_stale_copies_use_the_database_state(self):
+        copy = BookInstance.objects.get(status='o')
+        stale = BookInstance.objects.get(pk=copy.pk)
+        copy.status = 'a'
+        copy.save()
+        stale.status = 'r'
+        stale.save()
+        self.assertCounts(self.book, 5, 2, 0, 2)
+
+        copy.delete()
+        self.assertCounts(self.book, 4, 2, 0, 1)
+        # Segundo borrado de la misma copia: no descuenta otra vez
+        stale.delete()
+        self.assertCounts(self.book, 4, 2, 0, 1)
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_previous_state_is_read_with_a_lock(self):
+        copy = BookInstance.objects.get(status='o')
+        copy.status = 'a'
+        with CaptureQueriesContext(connection) as queries:
+            copy.save()
+            copy.delete()
+        locks = [q['sql'] for q in queries if 'FOR UPDATE' in q['sql']]
+        self.assertEqual(len(locks), 2)
+
+    def test_stale_book_save_keeps_counts(self):
+        stale = Book.objects.get(pk=self.other.pk)
+        BookInstance.objects.create(book=self.other, imprint='Ace', status='a')
+        stale.summary = 'Dreams change reality'
+        stale.save()
+        self.assertCounts(self.other, 1, 1, 0, 0)
+
+    def test_bulk_circulation(self):
+        loaned = BookInstance.objects.get(status='o')
+        circulation.circulate(circulation.RETURN, [str(loaned.pk)])
+        self.assertCounts(self.book, 5, 3, 0, 1)
+
+        reserved = BookInstance.objects.get(status='r')
+        available = BookInstance.objects.filter(status='a').first()
+        circulation.circulate(
+            circulation.LEND, [str(reserved.pk), str(available.pk)],
+            borrower=User.objects.create_user('reader'),
+        )
+        self.assertCounts(self.book, 5, 2, 2, 0)
+
+        circulation.circulate(circulation.RENEW, [str(reserved.pk)])
+        self.assertCounts(self.book, 5, 2, 2, 0)
+
+    def test_importer_recounts_books(self):
+        CatalogImporter().run([
+            {'isbn': self.other.isbn, 'imprint': 'Ace', 'status': 'a'},
+            {'isbn': self.other.isbn, 'imprint': 'Ace', 'status': 'o'},
+            {'isbn': self.book.isbn, 'imprint': 'Ace', 'status': 'm'},
+        ], kind=COPIES)
+        self.assertCounts(self.other, 2, 1, 1, 0)
+        self.assertCounts(self.book, 6, 2, 1, 1)
+
+    def test_generator_recounts_books(self):
+        CatalogGenerator(seed=2, authors=3, books=10, copies=40, readers=2).run()
+        self.assertFalse(Book.drifted().exists())
+        self.assertEqual(
+            sum(Book.objects.values_list('copies_total', flat=True)),
+            BookInstance.objects.count(),
+        )
+
+    def test_reconcile_command(self):
+        Book.objects.filter(pk=self.book.pk).update(copies_total=1, copies_available=9)
+        out = io.StringIO()
+        call_command('reconcile_copy_counts', '--dry-run', stdout=out)
+        self.assertIn('1 libros descuadrados', out.getvalue())
+        self.assertIn('1/9/1/1, deberían ser 5/2/1/1', out.getvalue())
+        self.assertEqual(Book.objects.get(pk=self.book.pk).copies_total, 1)
+
+        out = io.StringIO()
+        call_command('reconcile_copy_counts', stdout=out)
+        self.assertIn('corregidos en 1 libros', out.getvalue())
+        self.assertCounts(self.book, 5, 2, 1, 1)
+
+    def test_book_list_shows_and_sorts_by_availability(self):
+        self.add_available_copies()
+        with query_budget(2):
+            response = self.client.get(reverse('books'), {'sort': 'available'})
+        self.assertEqual(response.context['sort'], 'available')
+        self.assertEqual(list(response.context['book_list']), [self.other, self.book])
+        self.assertContains(response, '2 de 5 copias disponibles')
+        self.assertContains(response, '3 de 3 copias disponibles')
+
+        response = self.client.get(reverse('books'), {'sort': 'nope'})
+        self.assertEqual(response.context['sort'], 'title')
+        self.assertEqual(list(response.context['book_list']), [self.book, self.other])
+
+    def test_book_list_sort_with_keyset_pagination(self):
+        self.add_available_copies()
+        with self.settings(CATALOG_PAGINATION_MODE='keyset'):
+            response = self.client.get(reverse('books'), {'sort': 'available'})
+            self.assertEqual(list(response.context['book_list']), [self.other, self.book])
+
+    def test_book_detail_shows_availability(self):
+        response = self.client.get(self.book.get_absolute_url())
+        self.assertContains(response, '2 of 5 available')
+        self.assertContains(response, '1 on loan')
+        self.assertContains(response, '1 in maintenance')
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=600)
+    def test_book_list_follows_availability(self):
+        self.client.get(reverse('books'))
+        copy = BookInstance.objects.filter(status='a').first()
+        copy.status = 'm'
+        copy.save()
+        self.assertContains(self.client.get(reverse('books')), '1 de 5 copias disponibles')
+
+        loaned = BookInstance.objects.get(status='o')
+        circulation.circulate(circulation.RETURN, [str(loaned.pk)])
+        self.assertContains(self.client.get(reverse('books')), '2 de 5 copias disponibles')
+
+        copy.delete()
+        self.assertContains(self.client.get(reverse('books')), '2 de 4 copias disponibles')
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=600)
+    def test_unchanged_status_keeps_book_list(self):
+        before = self.book_list_version()
+        copy = BookInstance.objects.get(status='o')
+        copy.imprint = 'Reprint'
+        copy.save()
+        circulation.circulate(circulation.RENEW, [str(copy.pk)])
+        self.assertEqual(self.book_list_version(), before)
@@ -0,0 +1,119 @@
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import exporter
+from catalog.importer import COPIES, CatalogImporter
+from catalog.models import BookInstance
+from catalog.tests.test_import import book_record
+
+
+def parse_csv(lines):
+    return list(csv.DictReader(io.StringIO(''.join(lines))))
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.records = [
+            book_record(i, genres='Historical;Science Fiction' if i % 2 else 'Horror')
+            for i in range(25)
+        ]
+        CatalogImporter().run(cls.records)
+        cls.reader = User.objects.create_user('reader', password='x')
+        cls.due = datetime.date.today() + datetime.timedelta(days=3)
+        CatalogImporter().run([
+            {'isbn': record['isbn'], 'imprint': 'Imprint', 'status': 'o',
+             'due_back': cls.due.isoformat(), 'borrower': 'reader'}
+            for record in cls.records[:4]
+        ] + [
+            {'isbn': record['isbn'], 'imprint': 'Imprint', 'status': 'a'}
+            for record in cls.records[4:6]
+        ], kind=COPIES)
+
+    def test_books_round_trip_with_import_format(self):
+        # 1 consulta de libros + 1 de generos por bloque de 10
+        with self.assertNumQueries(4):
+            exported = parse_csv(
+                exporter.export_lines('books', 'csv', chunk_size=10)
+            )
+        self.assertEqual(exported, self.records)
+
+    def test_jsonl_copies_and_loans(self):
+        copies = [
+            json.loads(line)
+            for line in exporter.export_lines('copies', 'jsonl')
+        ]
+        self.assertEqual(len(copies), 6)
+        self.assertEqual(
+            sorted(copy['status'] for copy in copies), ['a', 'a', 'o', 'o', 'o', 'o']
+        )
+        self.assertIn(
+            {'isbn': self.records[0]['isbn'], 'imprint': 'Imprint',
+             'status': 'o', 'due_back': self.due.isoformat(),
+             'borrower': 'reader'},
+            copies,
+        )
+
+        loans = parse_csv(exporter.export_lines('loans', 'csv'))
+        self.assertEqual(len(loans), 4)
+        self.assertEqual({loan['days_late'] for loan in loans}, {'-3'})
+        self.assertEqual(
+            {loan['id'] for loan in loans},
+            {str(pk) for pk in BookInstance.objects.on_loan().values_list(
+                'pk', flat=True
+            )},
+        )
+
+    def test_view_streams_with_permission(self):
+        url = reverse('catalog-export', args=['books', 'jsonl'])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.reader.user_permissions.add(
+            Permission.objects.get(codename='view_book')
+        )
+        self.client.login(username='reader', password='x')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8'
+        )
+        self.assertIn('books.jsonl', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 25)
+
+        # Los prestamos necesitan permiso de bibliotecario
+        response = self.client.get(
+            reverse('catalog-export', args=['loans', 'csv'])
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(
+            reverse('catalog-export', args=['authors', 'csv'])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'copies.csv')
+            out = io.StringIO()
+            call_command(
+                'export_catalog', 'copies', '--output', path,
+                '--chunk-size', '2', stdout=out,
+            )
+            self.assertIn('Exportadas 6 filas', out.getvalue())
+            with open(path, newline='', encoding='utf-8') as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 6)
+
+        out = io.StringIO()
+        call_command('export_catalog', 'loans', '--format', 'jsonl',
+                     '--overdue', stdout=out)
+        self.assertEqual(out.getvalue(), '')
@@ -0,0 +1,183 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import facets, page_cache
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.tests.query_budget import query_budget
+
+
+def counts(result, name):
+    return {value.label: value.count for value in result.values.get(name, [])}
+
+
+class FacetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.english = Language.objects.create(name='English')
+        cls.spanish = Language.objects.create(name='Spanish')
+        cls.horror = Genre.objects.create(name='Horror')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.king = Author.objects.create(first_name='Stephen', last_name='King')
+        cls.borges = Author.objects.create(first_name='Jorge Luis', last_name='Borges')
+        books = [
+            # titulo, autor, idioma, generos, copias disponibles
+            ('Carrie', cls.king, cls.english, [cls.horror], 1),
+            ('It', cls.king, cls.english, [cls.horror, cls.fantasy], 0),
+            ('The Gunslinger', cls.king, cls.english, [cls.fantasy], 2),
+            ('Ficciones', cls.borges, cls.spanish, [cls.fantasy], 0),
+            ('El Aleph', cls.borges, cls.spanish, [], 1),
+        ]
+        cls.books = {}
+        for i, (title, author, language, genres, available) in enumerate(books):
+            book = Book.objects.create(
+                title=title, summary='-', isbn=f'{i:013d}',
+                author=author, language=language,
+            )
+            book.genre.set(genres)
+            for _ in range(available):
+                BookInstance.objects.create(book=book, imprint='-', status='a')
+            BookInstance.objects.create(book=book, imprint='-', status='o')
+            cls.books[title] = book
+
+    def setUp(self):
+        cache.clear()
+
+    def facets(self, query=''):
+        return facets.facet_counts(QueryDict(query))
+
+    def test_unfiltered_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            result = self.facets()
+        self.assertEqual(result.total, 5)
+        self.assertFalse(result.active)
+        self.assertEqual(counts(result, 'genre'), {'Fantasy': 3, 'Horror': 2})
+        self.assertEqual(counts(result, 'language'), {'English': 3, 'Spanish': 2})
+        self.assertEqual(counts(result, 'author'), {'King, Stephen': 3, 'Borges, Jorge Luis': 2})
+        self.assertEqual(counts(result, 'available'), {'': 3})
+        # Ordenados por numero de libros
+        self.assertEqual([value.label for value in result.values['genre']], ['Fantasy', 'Horror'])
+
+    def test_counts_of_a_facet_ignore_its_own_selection(self):
+        result = self.facets(f'genre={self.horror.pk}')
+        self.assertEqual(result.total, 2)
+        self.assertEqual(counts(result, 'genre'), {'Fantasy': 3, 'Horror': 2})
+        self.assertEqual(counts(result, 'language'), {'English': 2})
+        self.assertEqual(counts(result, 'available'), {'': 1})
+        selected = {value.label: value.selected for value in result.values['genre']}
+        self.assertEqual(selected, {'Fantasy': False, 'Horror': True})
+
+    def test_values_of_a_facet_are_ored(self):
+        # "It" tiene los dos generos y solo cuenta una vez
+        result = self.facets(f'genre={self.horror.pk}&genre={self.fantasy.pk}')
+        self.assertEqual(result.total, 4)
+        self.assertEqual(counts(result, 'author'), {'King, Stephen': 3, 'Borges, Jorge Luis': 1})
+
+    def test_facets_are_anded(self):
+        result = self.facets(f'genre={self.fantasy.pk}&language={self.english.pk}&available=1')
+        self.assertEqual(result.total, 1)
+        self.assertEqual(counts(result, 'available'), {'': 1})
+        self.assertTrue(result.values['available'][0].selected)
+        self.assertEqual(counts(result, 'genre'), {'Fantasy': 1, 'Horror': 1})
+        self.assertEqual(counts(result, 'language'), {'English': 1})
+
+    def test_invalid_values_are_ignored(self):
+        result = self.facets('genre=x&genre=&language=99&available=yes')
+        self.assertEqual(result.selection['genre'], [])
+        self.assertFalse(result.selection['available'])
+        self.assertEqual(result.total, 0)
+
+    def test_author_facet_is_limited(self):
+        with mock.patch.object(facets, 'AUTHOR_LIMIT', 1):
+            result = self.facets()
+            self.assertEqual(counts(result, 'author'), {'King, Stephen': 3})
+            # Los autores elegidos siempre aparecen
+            result = self.facets(f'author={self.borges.pk}')
+            self.assertEqual(counts(result, 'author'), {'King, Stephen': 3, 'Borges, Jorge Luis': 2})
+
+    def test_toggle_links(self):
+        result = self.facets(f'sort=available&page=2&genre={self.horror.pk}')
+        links = {value.label: value.query for value in result.values['genre']}
+        self.assertEqual(links['Horror'], '?sort=available')
+        self.assertEqual(
+            QueryDict(links['Fantasy'][1:]).getlist('genre'),
+            [str(self.horror.pk), str(self.fantasy.pk)],
+        )
+        self.assertEqual(
+            result.values['available'][0].query,
+            f'?available=1&genre={self.horror.pk}&sort=available',
+        )
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=600)
+    def test_unfiltered_counts_are_cached_until_the_catalog_changes(self):
+        self.facets()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.facets().total, 5)
+        with self.assertNumQueries(1):
+            self.facets('available=1')
+        page_cache.bump(page_cache.FACETS)
+        with self.assertNumQueries(2):
+            self.facets()
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=600)
+    def test_copy_changes_keep_the_cached_counts(self):
+        # Un cambio de estado de copia no recalcula los generos, idiomas y
+        # autores; la disponibilidad caduca por su cuenta
+        self.facets()
+        copy = BookInstance.objects.filter(status='a').first()
+        copy.status = 'm'
+        copy.save()
+        with self.assertNumQueries(0):
+            self.facets()
+        with self.settings(CATALOG_FACET_AVAILABILITY_TIMEOUT=0):
+            cache.clear()
+            self.facets()
+            with self.assertNumQueries(1):
+                self.facets()
+        self.horror.name = 'Terror'
+        self.horror.save()
+        with self.assertNumQueries(2):
+            self.assertIn('Terror', counts(self.facets(), 'genre'))
+
+    def test_book_list_filters_and_counts(self):
+        # Facetas y pagina: el total de la paginacion sale de las facetas
+        with query_budget(2):
+            response = self.client.get(reverse('books'), {
+                'language': self.english.pk, 'available': '1',
+            })
+        self.assertEqual(
+            [book.title for book in response.context['book_list']],
+            ['Carrie', 'The Gunslinger'],
+        )
+        self.assertEqual(response.context['paginator'].count, 2)
+        self.assertEqual(response.context['facets'].total, 2)
+        self.assertContains(response, 'quitar filtros')
+        self.assertContains(response, 'Horror</a> (1)')
+
+    def test_pagination_keeps_filters(self):
+        response = self.client.get(reverse('books'), {'genre': self.fantasy.pk})
+        self.assertContains(response, 'Page 1 of 2')
+        self.assertContains(response, f'?genre={self.fantasy.pk}&amp;page=2')
+        response = self.client.get(reverse('books'), {'genre': self.fantasy.pk, 'page': 'last'})
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_no_matches(self):
+        response = self.client.get(reverse('books'), {
+            'author': self.borges.pk, 'genre': self.horror.pk,
+        })
+        self.assertContains(response, 'Ningún libro cumple los filtros.')
+
+    def test_async_book_list(self):
+        response = async_to_sync(self.async_client.get)(
+            reverse('books'), {'genre': self.horror.pk, 'sort': 'available'},
+        )
+        self.assertEqual(
+            [book.title for book in response.context['book_list']],
+            ['Carrie', 'It'],
+        )
+        self.assertEqual(response.context['paginator'].count, 2)
+        self.assertEqual(counts(response.context['facets'], 'language'), {'English': 2})
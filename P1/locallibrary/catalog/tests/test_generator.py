@@ -0,0 +1,86 @@
+import datetime
+import io
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from catalog.generator import CatalogGenerator
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, Language
+
+TODAY = datetime.date(2026, 1, 15)
+
+
+class CatalogGeneratorTest(TestCase):
+    def generate(self, seed):
+        CatalogGenerator(
+            seed=seed, authors=20, books=60, copies=200, readers=10,
+            today=TODAY, batch_size=25,
+        ).run()
+        return (
+            list(Book.objects.order_by('isbn').values_list('title', 'summary', 'author__last_name')),
+            list(BookInstance.objects.order_by('id').values_list(
+                'id', 'book__isbn', 'status', 'due_back', 'borrower__username',
+            )),
+        )
+
+    def clear(self):
+        BookInstance.objects.all().delete()
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_same_seed_same_catalog(self):
+        first = self.generate(seed=7)
+        self.clear()
+        self.assertEqual(self.generate(seed=7), first)
+        self.clear()
+        self.assertNotEqual(self.generate(seed=8), first)
+
+    def test_runs_on_a_populated_database(self):
+        # Misma semilla: sin choques de usuarios, ISBN ni ids de copias
+        self.generate(seed=7)
+        self.generate(seed=7)
+        self.assertEqual(Book.objects.count(), 120)
+        self.assertEqual(BookInstance.objects.count(), 400)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertTrue(User.objects.filter(username='reader0000019').exists())
+
+    def test_isbns_continue_after_deletes(self):
+        # Tras borrar libros, Book.objects.count() ya no sirve de base
+        self.generate(seed=7)
+        oldest = list(Book.objects.order_by('isbn')[:10].values_list('pk', flat=True))
+        BookInstance.objects.filter(book__in=oldest).delete()
+        Book.objects.filter(pk__in=oldest).delete()
+        Book.objects.create(
+            title='Real', summary='-', isbn='9791234567890',
+            author=Author.objects.first(),
+        )
+        self.generate(seed=8)
+        self.assertEqual(Book.objects.count(), 111)
+        self.assertTrue(Book.objects.filter(isbn='9791234567950').exists())
+
+    def test_sizes_and_distributions(self):
+        self.generate(seed=1)
+        self.assertEqual(Author.objects.count(), 20)
+        self.assertEqual(Book.objects.count(), 60)
+        self.assertEqual(BookInstance.objects.count(), 200)
+        self.assertTrue(Genre.objects.exists())
+        self.assertTrue(Language.objects.exists())
+        self.assertFalse(Book.objects.filter(genre=None).exists())
+        for status in 'aorm':
+            self.assertTrue(BookInstance.objects.filter(status=status).exists(), status)
+        on_loan = BookInstance.objects.filter(status='o')
+        self.assertFalse(on_loan.filter(due_back=None).exists())
+        self.assertFalse(on_loan.filter(borrower=None).exists())
+        self.assertTrue(on_loan.filter(due_back__lt=TODAY).exists())
+        self.assertEqual(CatalogStats.load().num_instances, 200)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command(
+            'generate_catalog', '--authors', '3', '--books', '5', '--copies', '8',
+            '--readers', '2', '--seed', '3', '--today', '2026-01-15', stdout=out,
+        )
+        self.assertIn('5 books', out.getvalue())
+        self.assertEqual(BookInstance.objects.count(), 8)
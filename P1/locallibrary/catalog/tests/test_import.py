@@ -0,0 +1,152 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from catalog.importer import CatalogImporter
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, Language
+from catalog.search import search_books
+from catalog.tests.query_budget import query_budget
+
+
+def book_record(i, **extra):
+    record = {
+        'title': f'Book {i}',
+        'summary': f'Summary {i}',
+        'isbn': f'{i:013d}',
+        'author_first_name': 'Isaac',
+        'author_last_name': f'Asimov {i % 3}',
+        'author_date_of_birth': '1920-01-02',
+        'author_date_of_death': '',
+        'genres': 'Science Fiction;Historical' if i % 2 else 'Horror',
+        'language': 'English' if i % 2 else 'Spanish',
+    }
+    record.update(extra)
+    return record
+
+
+class ImportCatalogCommandTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_csv(self, records):
+        path = os.path.join(self.tmp.name, 'books.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(records[0]))
+            writer.writeheader()
+            writer.writerows(records)
+        return path
+
+    def write_jsonl(self, records):
+        path = os.path.join(self.tmp.name, 'copies.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        return path
+
+    def test_import_books_and_copies(self):
+        Genre.objects.create(name='horror')
+        path = self.write_csv([book_record(i) for i in range(25)])
+        out = io.StringIO()
+        call_command('import_catalog', path, '--batch-size', '10', stdout=out)
+        self.assertIn('Importados 25 registros', out.getvalue())
+        self.assertIn('filas/s', out.getvalue())
+
+        self.assertEqual(Book.objects.count(), 25)
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Genre.objects.count(), 3)
+        self.assertEqual(Language.objects.count(), 2)
+        book = Book.objects.get(isbn=book_record(1)['isbn'])
+        self.assertEqual(
+            sorted(book.genre.values_list('name', flat=True)),
+            ['Historical', 'Science Fiction'],
+        )
+        self.assertEqual(str(book.author), 'Asimov 1, Isaac')
+        self.assertEqual(str(book.language), 'English')
+        self.assertEqual([b.title for b in search_books('Summary 7')][0], 'Book 7')
+
+        copies = self.write_jsonl([
+            {'isbn': book_record(i)['isbn'], 'imprint': f'Copy {i}',
+             'status': 'oa'[i % 2], 'due_back': '2030-01-01' if i % 2 == 0 else ''}
+            for i in range(12)
+        ])
+        call_command('import_catalog', copies, '--kind', 'copies', stdout=io.StringIO())
+        self.assertEqual(BookInstance.objects.count(), 12)
+        stats = CatalogStats.load()
+        self.assertEqual(stats.num_books, 25)
+        self.assertEqual(stats.num_instances, 12)
+        self.assertEqual(stats.num_instances_available, 6)
+
+    def test_queries_do_not_grow_with_batch(self):
+        def run(n):
+            importer = CatalogImporter(batch_size=n)
+            importer.run(book_record(i, isbn=f'9{n:04d}{i:08d}') for i in range(n))
+
+        # Cada lote hace un numero fijo de consultas: maps, ISBN existentes,
+        # altas de nombres, libros, generos, indice de busqueda...
+        with query_budget(25):
+            run(5)
+        with query_budget(25):
+            run(200)
+
+    def test_duplicate_isbn(self):
+        path = self.write_csv([book_record(1), book_record(2)])
+        call_command('import_catalog', path, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('import_catalog', path, stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('import_catalog', path, '--skip-existing', stdout=out)
+        self.assertIn('(2 omitidos)', out.getvalue())
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_unknown_isbn_for_copies(self):
+        path = self.write_jsonl([{'isbn': 'nope', 'imprint': 'x'}])
+        with self.assertRaises(CommandError):
+            call_command('import_catalog', path, '--kind', 'copies', stdout=io.StringIO())
+
+    def test_invalid_dates_and_statuses(self):
+        path = self.write_csv([
+            book_record(1), book_record(2, author_date_of_birth='1947-13-45'),
+        ])
+        with self.assertRaisesMessage(CommandError, "Line 3: invalid author_date_of_birth '1947-13-45'"):
+            call_command('import_catalog', path, stdout=io.StringIO())
+        self.assertFalse(Book.objects.exists())
+
+        call_command('import_catalog', self.write_csv([book_record(1)]), stdout=io.StringIO())
+        isbn = book_record(1)['isbn']
+        for record, message in (
+            ({'isbn': isbn, 'status': 'x'}, "Line 2: invalid status 'x'"),
+            ({'isbn': isbn, 'due_back': '10/10/2030'}, "Line 2: invalid due_back '10/10/2030'"),
+        ):
+            path = self.write_jsonl([{'isbn': isbn, 'imprint': 'ok'}, record])
+            with self.assertRaisesMessage(CommandError, message):
+                call_command('import_catalog', path, '--kind', 'copies', stdout=io.StringIO())
+        self.assertFalse(BookInstance.objects.exists())
+
+    def test_invalid_values_name_the_line(self):
+        for record, message in (
+            (book_record(2, isbn=''), 'Line 3: record without ISBN'),
+            (book_record(2, title='x' * 201), 'Line 3: title longer than 200 characters'),
+            (book_record(2, genres='Horror;' + 'x' * 201), 'Line 3: genres longer than 200 characters'),
+            (book_record(2, author_last_name='x' * 101), 'Line 3: author_last_name longer than 100 characters'),
+        ):
+            path = self.write_csv([book_record(1), record])
+            with self.assertRaisesMessage(CommandError, message):
+                call_command('import_catalog', path, stdout=io.StringIO())
+        self.assertFalse(Book.objects.exists())
+
+        call_command('import_catalog', self.write_csv([book_record(1)]), stdout=io.StringIO())
+        isbn = book_record(1)['isbn']
+        for record, message in (
+            ({'isbn': isbn, 'status': 'o', 'borrower': 'nobody'}, "Line 2: unknown borrower 'nobody'"),
+            ({'isbn': isbn, 'imprint': 'x' * 201}, 'Line 2: imprint longer than 200 characters'),
+        ):
+            path = self.write_jsonl([{'isbn': isbn, 'imprint': 'ok'}, record])
+            with self.assertRaisesMessage(CommandError, message):
+                call_command('import_catalog', path, '--kind', 'copies', stdout=io.StringIO())
+        self.assertFalse(BookInstance.objects.exists())
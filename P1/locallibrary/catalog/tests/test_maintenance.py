@@ -0,0 +1,45 @@
+import io
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from catalog import maintenance
+from catalog.models import Book
+
+
+class OptimizeDatabaseCommandTest(TestCase):
+    def test_optimize_and_analyze(self):
+        for args in ([], ['--analyze']):
+            out = io.StringIO()
+            call_command('optimize_database', *args, stdout=out)
+            self.assertIn('actualizadas', out.getvalue())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_unknown_database(self):
+        with self.assertRaises(CommandError):
+            call_command('optimize_database', '--database', 'nope')
+
+
+@override_settings(DATABASE_OPTIMIZE_INTERVAL=60)
+class PeriodicOptimizeTest(TransactionTestCase):
+    def test_runs_at_most_once_per_interval(self):
+        Book.objects.exists()
+        with mock.patch.object(maintenance, 'optimize') as optimize, \
+                mock.patch.object(maintenance, '_last_run', 0):
+            maintenance.periodic_optimize()
+            maintenance.periodic_optimize()
+        optimize.assert_called_once_with('default')
+
+    def test_disabled_or_inside_transaction(self):
+        Book.objects.exists()
+        with mock.patch.object(maintenance, 'optimize') as optimize, \
+                mock.patch.object(maintenance, '_last_run', 0):
+            with override_settings(DATABASE_OPTIMIZE_INTERVAL=0):
+                maintenance.periodic_optimize()
+            with mock.patch.object(connection, 'in_atomic_block', True):
+                maintenance.periodic_optimize()
+        optimize.assert_not_called()
@@ -0,0 +1,112 @@
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import metrics
+
+
+class MetricsRegistryTest(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_threads_are_merged(self):
+        def work():
+            for _ in range(1000):
+                metrics.inc('catalog_db_queries_total', (('view', 'books'),))
+                metrics.observe('catalog_http_request_duration_seconds', (('view', 'books'),), 0.02)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        data = metrics.snapshot()
+        self.assertEqual(data[('catalog_db_queries_total', (('view', 'books'),))], 4000)
+        histogram = data[('catalog_http_request_duration_seconds', (('view', 'books'),))]
+        self.assertEqual(histogram[-1], 4000)
+        self.assertEqual(histogram[metrics.BUCKETS.index(0.025)], 4000)
+
+    def test_exposition_format(self):
+        labels = (('view', 'index'),)
+        metrics.observe('catalog_http_request_duration_seconds', labels, 0.007)
+        metrics.observe('catalog_http_request_duration_seconds', labels, 20)
+        text = metrics.render()
+        self.assertIn('# TYPE catalog_http_request_duration_seconds histogram', text)
+        self.assertIn('catalog_http_request_duration_seconds_bucket{view="index",le="0.005"} 0', text)
+        self.assertIn('catalog_http_request_duration_seconds_bucket{view="index",le="0.01"} 1', text)
+        self.assertIn('catalog_http_request_duration_seconds_bucket{view="index",le="+Inf"} 2', text)
+        self.assertIn('catalog_http_request_duration_seconds_count{view="index"} 2', text)
+
+    def test_workers_are_aggregated_through_metrics_dir(self):
+        with tempfile.TemporaryDirectory() as directory:
+            other = [['catalog_db_queries_total', [['view', 'books']], 5]]
+            Path(directory, '99999999.json').write_text(json.dumps(other))
+            with override_settings(METRICS_DIR=directory):
+                metrics.inc('catalog_db_queries_total', (('view', 'books'),), 2)
+                metrics.dump(force=True)
+                self.assertEqual(len(list(Path(directory).glob('*.json'))), 2)
+                data = metrics.collect()
+        self.assertEqual(data[('catalog_db_queries_total', (('view', 'books'),))], 7)
+
+    def test_dead_workers_are_not_counted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            other = [['catalog_db_queries_total', [['view', 'books']], 5]]
+            Path(directory, '99999998.json').write_text(json.dumps(other))
+            Path(directory, '99999999.json').write_text(json.dumps(other))
+            with override_settings(METRICS_DIR=directory):
+                metrics.inc('catalog_db_queries_total', (('view', 'books'),), 2)
+                metrics.dump(force=True)
+                metrics.mark_process_dead(99999999)
+                data = metrics.collect()
+                self.assertEqual(data[('catalog_db_queries_total', (('view', 'books'),))], 7)
+                metrics.clear()
+                self.assertEqual(list(Path(directory).glob('*.json')), [])
+
+
+class MetricsEndpointTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('staff', password='biblioteca', is_staff=True)
+        User.objects.create_user('reader', password='biblioteca')
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.login(username='reader', password='biblioteca')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.login(username='staff', password='biblioteca')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_bearer_token(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(response.status_code, 403)
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('books'))
+        self.client.get('/catalog/does-not-exist/')
+        data = metrics.snapshot()
+        self.assertEqual(
+            data[('catalog_http_requests_total', (('view', 'index'), ('method', 'GET'), ('status', 200)))], 1
+        )
+        self.assertEqual(
+            data[('catalog_http_requests_total', (('view', '<unresolved>'), ('method', 'GET'), ('status', 404)))], 1
+        )
+        self.assertGreater(data[('catalog_db_queries_total', (('view', 'books'),))], 0)
+        self.assertEqual(data[('catalog_template_render_seconds', (('view', 'index'),))][-1], 1)
+
+        self.client.login(username='staff', password='biblioteca')
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('catalog_http_requests_total{view="books",method="GET",status="200"} 1', text)
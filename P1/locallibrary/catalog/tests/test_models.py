@@ -1,5 +1,6 @@
 from django.test import TestCase
-from catalog.models import Author
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre
+from catalog.routers import use_replica
 
 
 class AuthorModelTest(TestCase):
@@ -31,3 +32,67 @@ class AuthorModelTest(TestCase):
         author = Author.objects.get(id=1)
         expected_object_name = f'{author.last_name}, {author.first_name}'
         self.assertEqual(str(author), expected_object_name)
+
+
+class CatalogStatsModelTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Isaac', last_name='Asimov')
+        cls.genre = Genre.objects.create(name='Science Fiction')
+        cls.book = Book.objects.create(
+            title='I Robot', summary='Robots', isbn='9780194242363',
+            author=cls.author,
+        )
+        BookInstance.objects.create(book=cls.book, imprint='First', status='a')
+        BookInstance.objects.create(book=cls.book, imprint='Second', status='o')
+
+    def assertStatsMatchRebuild(self):
+        stats = CatalogStats.load()
+        fresh = CatalogStats.rebuild()
+        for field in ('num_books', 'num_books_a', 'num_instances',
+                      'num_instances_available', 'num_authors', 'num_genres'):
+            self.assertEqual(getattr(stats, field), getattr(fresh, field), field)
+
+    def test_counters_follow_creations(self):
+        stats = CatalogStats.load()
+        self.assertEqual(stats.num_books, 1)
+        self.assertEqual(stats.num_books_a, 0)
+        self.assertEqual(stats.num_instances, 2)
+        self.assertEqual(stats.num_instances_available, 1)
+        self.assertEqual(stats.num_authors, 1)
+        self.assertEqual(stats.num_genres, 1)
+
+    def test_counters_follow_updates_and_deletes(self):
+        self.book.title = 'I Robot and Stars'
+        self.book.save()
+        copy = BookInstance.objects.get(imprint='Second')
+        copy.status = 'a'
+        copy.save()
+        BookInstance.objects.get(imprint='First').delete()
+        self.genre.delete()
+        self.assertStatsMatchRebuild()
+        self.assertEqual(CatalogStats.load().num_books_a, 1)
+
+    def test_load_rebuilds_missing_row(self):
+        CatalogStats.objects.all().delete()
+        self.assertEqual(CatalogStats.load().num_instances, 2)
+
+    def test_rebuild_reads_from_the_primary(self):
+        with use_replica('replica'):
+            self.assertEqual(CatalogStats.rebuild().num_instances, 2)
+
+    def test_index_uses_single_stats_query(self):
+        CatalogStats.load()
+        with self.assertNumQueries(1):
+            CatalogStats.load()
+
+    def test_drifted_counters_do_not_break_deletes(self):
+        # Escrituras sin signals (update, SQL, fixtures) dejan los
+        # contadores por debajo: un borrado normal no debe fallar
+        CatalogStats.objects.update(num_instances=0, num_instances_available=0)
+        Book.objects.update(copies_total=0, copies_available=0)
+        BookInstance.objects.get(imprint='First').delete()
+        stats = CatalogStats.load()
+        self.assertEqual((stats.num_instances, stats.num_instances_available), (0, 0))
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual((book.copies_total, book.copies_available), (0, 0))
@@ -0,0 +1,95 @@
+import csv
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import BookInstance
+from catalog.tests.fixtures import create_loan_fixture
+
+
+class OverdueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        book, cls.reader, cls.librarian = create_loan_fixture()
+        cls.today = datetime.date.today()
+        for days, status in [(-10, 'o'), (-3, 'o'), (0, 'o'), (5, 'o'),
+                             (-20, 'a'), (None, 'o')]:
+            BookInstance.objects.create(
+                book=book, imprint='Imprint', status=status,
+                borrower=cls.reader,
+                due_back=(cls.today + datetime.timedelta(days=days)
+                          if days is not None else None),
+            )
+
+    def test_overdue_filters_loans_past_due(self):
+        overdue = BookInstance.objects.overdue(self.today).order_by('due_back')
+        self.assertEqual(
+            [copy.due_back for copy in overdue],
+            [self.today - datetime.timedelta(days=10),
+             self.today - datetime.timedelta(days=3)],
+        )
+
+    def test_with_overdue_annotation(self):
+        rows = BookInstance.objects.with_overdue(self.today).order_by(
+            'due_back'
+        ).values_list('status', 'overdue', 'days_late')
+        self.assertEqual(list(rows), [
+            ('o', False, None),
+            ('a', False, datetime.timedelta(days=20)),
+            ('o', True, datetime.timedelta(days=10)),
+            ('o', True, datetime.timedelta(days=3)),
+            ('o', False, datetime.timedelta(0)),
+            ('o', False, datetime.timedelta(days=-5)),
+        ])
+
+    def test_is_overdue_uses_annotation(self):
+        copy = BookInstance.objects.with_overdue(self.today).get(
+            status='a'
+        )
+        with self.assertNumQueries(0):
+            self.assertFalse(copy.is_overdue)
+        copy = BookInstance.objects.with_overdue(self.today).overdue(
+            self.today
+        ).first()
+        self.assertTrue(copy.is_overdue)
+
+    def test_is_overdue_agrees_with_annotation(self):
+        # La copia disponible con fecha pasada no esta vencida en ningun caso
+        annotated = dict(
+            BookInstance.objects.with_overdue().values_list('pk', 'overdue')
+        )
+        for copy in BookInstance.objects.all():
+            self.assertEqual(copy.is_overdue, annotated[copy.pk], copy.status)
+
+    def test_requires_permission(self):
+        self.client.login(username='reader', password='x')
+        self.assertEqual(self.client.get(reverse('overdue')).status_code, 403)
+        self.assertEqual(
+            self.client.get(reverse('overdue-export')).status_code, 403
+        )
+
+    def test_report_sorted_by_days_late(self):
+        self.client.login(username='librarian', password='x')
+        response = self.client.get(reverse('overdue'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['overdue_count'], 2)
+        self.assertEqual(
+            [copy.days_late.days for copy in response.context['bookinstance_list']],
+            [10, 3],
+        )
+        self.assertContains(response, '2 préstamos vencidos')
+
+    def test_export(self):
+        self.client.login(username='librarian', password='x')
+        response = self.client.get(reverse('overdue-export'))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(
+            b''.join(response.streaming_content).decode().splitlines()
+        ))
+        self.assertEqual(
+            rows[0],
+            ['id', 'title', 'isbn', 'borrower', 'due_back', 'days_late'],
+        )
+        self.assertEqual([row[5] for row in rows[1:]], ['10', '3'])
+        self.assertEqual(rows[1][3], 'reader')
@@ -0,0 +1,131 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.tests.query_budget import query_budget
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=600)
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.language = Language.objects.create(name='English')
+        cls.genre = Genre.objects.create(name='Horror')
+        cls.author = Author.objects.create(first_name='Stephen', last_name='King')
+        cls.book = Book.objects.create(
+            title='The Shining', summary='Overlook Hotel', isbn='9780345806789',
+            author=cls.author, language=cls.language,
+        )
+        cls.book.genre.add(cls.genre)
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='First', status='a')
+        cls.staff = User.objects.create_user('staff', password='biblioteca', is_staff=True)
+        User.objects.create_user('reader', password='biblioteca')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_cached(self, url, budget=0):
+        first = self.client.get(url)
+        with query_budget(budget):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+        return second
+
+    def test_pages_are_served_from_cache(self):
+        self.get_cached(self.book.get_absolute_url())
+        self.get_cached(self.author.get_absolute_url())
+        self.get_cached(reverse('books'))
+        self.get_cached(reverse('authors'))
+
+    def test_book_detail_invalidation(self):
+        url = self.book.get_absolute_url()
+        changes = [
+            lambda: setattr(self.copy, 'status', 'o') or self.copy.save(),
+            lambda: BookInstance.objects.create(book=self.book, imprint='Second'),
+            lambda: self.book.genre.add(Genre.objects.create(name='Thriller')),
+            lambda: setattr(self.genre, 'name', 'Terror') or self.genre.save(),
+            lambda: setattr(self.language, 'name', 'Inglés') or self.language.save(),
+            lambda: setattr(self.author, 'first_name', 'Steve') or self.author.save(),
+            lambda: setattr(self.book, 'summary', 'Snowed in') or self.book.save(),
+        ]
+        for change in changes:
+            before = self.get_cached(url).content
+            change()
+            self.assertNotEqual(self.client.get(url).content, before)
+
+    def test_list_and_author_invalidation(self):
+        before = self.get_cached(self.author.get_absolute_url()).content
+        books = self.get_cached(reverse('books')).content
+        Book.objects.create(
+            title='Carrie', summary='Prom', isbn='9780307743664', author=self.author,
+        )
+        self.assertNotEqual(self.client.get(self.author.get_absolute_url()).content, before)
+        self.assertNotEqual(self.client.get(reverse('books')).content, books)
+
+        authors = self.get_cached(reverse('authors')).content
+        Author.objects.create(first_name='Isaac', last_name='Asimov')
+        self.assertNotEqual(self.client.get(reverse('authors')).content, authors)
+
+    def test_book_list_facet_invalidation(self):
+        # Las facetas del listado muestran los generos e idiomas
+        url = reverse('books')
+        thriller = Genre.objects.create(name='Thriller')
+        changes = [
+            (lambda: self.book.genre.add(thriller), 'Thriller'),
+            (lambda: thriller.book_set.remove(self.book), 'Horror'),
+            (lambda: setattr(self.genre, 'name', 'Terror') or self.genre.save(), 'Terror'),
+            (lambda: setattr(self.language, 'name', 'Inglés') or self.language.save(), 'Inglés'),
+        ]
+        for change, label in changes:
+            self.get_cached(url)
+            change()
+            self.assertContains(self.client.get(url), f'{label}</a> (1)')
+
+        self.get_cached(url)
+        self.genre.delete()
+        self.language.delete()
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Terror')
+        self.assertNotContains(response, 'Inglés')
+
+    def test_language_delete_invalidates_books(self):
+        before = self.get_cached(self.book.get_absolute_url()).content
+        self.language.delete()
+        self.assertNotEqual(self.client.get(self.book.get_absolute_url()).content, before)
+
+    def test_pages_vary_per_user(self):
+        url = self.book.get_absolute_url()
+        self.client.get(url)
+        self.client.login(username='staff', password='biblioteca')
+        self.client.get(url)  # fija la cookie CSRF
+        response = self.get_cached(url, budget=2)
+        self.assertContains(response, 'Renew book')
+        self.assertContains(response, 'User: staff')
+
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Renew book')
+
+        self.client.login(username='reader', password='biblioteca')
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Renew book')
+        self.assertContains(response, 'User: reader')
+
+    def test_versions_are_bumped_again_on_commit(self):
+        # Otra conexion puede cachear lo que lee antes de la confirmacion
+        # bajo el primer token nuevo: la confirmacion lo descarta
+        url = self.book.get_absolute_url()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.copy.status = 'o'
+            self.copy.save()
+        self.get_cached(url)
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertTrue(queries)
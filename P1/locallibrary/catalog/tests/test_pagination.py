@@ -0,0 +1,164 @@
+import datetime
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance
+from catalog.pagination import KeysetPaginator, count_rows
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Apellidos y nombres repetidos para forzar el desempate por pk
+        for i in range(23):
+            Author.objects.create(first_name=f'Name {i % 3}', last_name=f'Surname {i % 4}')
+        book = Book.objects.create(title='Book', summary='Summary', isbn='1234567890123')
+        today = datetime.date.today()
+        for i in range(17):
+            due_back = None if i % 5 == 0 else today + datetime.timedelta(days=i % 4)
+            BookInstance.objects.create(book=book, imprint=f'Imprint {i}', due_back=due_back)
+
+    def walk(self, queryset, per_page):
+        paginator = KeysetPaginator(queryset, per_page)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous():
+            backwards.append(paginator.page(before=backwards[-1].previous_cursor))
+        return pages, backwards[::-1]
+
+    def assertPagesMatchOffset(self, queryset, per_page):
+        expected = list(queryset.order_by(*queryset.query.order_by or queryset.model._meta.ordering, 'pk'))
+        pages, backwards = self.walk(queryset, per_page)
+        self.assertEqual([obj for page in pages for obj in page], expected)
+        self.assertEqual(
+            [list(page) for page in backwards], [list(page) for page in pages]
+        )
+        self.assertFalse(pages[0].has_previous())
+
+    def test_authors_with_ties(self):
+        self.assertPagesMatchOffset(Author.objects.all(), 5)
+
+    def test_copies_with_null_due_back(self):
+        self.assertPagesMatchOffset(BookInstance.objects.order_by('due_back'), 4)
+
+    def test_descending_ordering(self):
+        self.assertPagesMatchOffset(BookInstance.objects.order_by('-due_back'), 3)
+
+    def next_page_sql(self, queryset, backwards=False):
+        paginator = KeysetPaginator(queryset, 4)
+        page = paginator.page()
+        if backwards:
+            page = paginator.page(after=page.next_cursor)
+        with CaptureQueriesContext(connection) as queries:
+            if backwards:
+                paginator.page(before=page.previous_cursor)
+            else:
+                paginator.page(after=page.next_cursor)
+        return queries[0]['sql']
+
+    @skipUnlessDBFeature('supports_tuple_lookups')
+    def test_seek_is_a_row_value_comparison(self):
+        sql = self.next_page_sql(BookInstance.objects.filter(due_back__isnull=False).order_by('due_back'))
+        self.assertRegex(sql, r'\("catalog_bookinstance"."due_back", "catalog_bookinstance"."id"\) >')
+        self.assertNotIn('NULLS', sql)
+
+    def test_pages_use_the_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite specific')
+        for queryset, index in (
+            (BookInstance.objects.filter(status='m').order_by('due_back'), 'bookinst_status_due_idx'),
+            (Author.objects.all(), 'author_name_idx'),
+            (Book.objects.all(), 'book_title_idx'),
+        ):
+            for backwards in (False, True):
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + self.next_page_sql(queryset, backwards))
+                    plan = ' '.join(str(row) for row in cursor.fetchall())
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(CATALOG_PAGINATION_MODE='keyset')
+class KeysetListViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(13):
+            Author.objects.create(first_name=f'Christian {i}', last_name=f'Surname {i}')
+        cls.user = User.objects.create_user('reader', password='biblioteca')
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('authors'))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'])
+        self.assertTrue(response.context['is_keyset_paginated'])
+        self.assertEqual(len(response.context['author_list']), 10)
+
+    def test_next_and_previous_links(self):
+        response = self.client.get(reverse('authors'))
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?after={next_cursor}')
+        response = self.client.get(reverse('authors'), {'after': next_cursor})
+        self.assertEqual(len(response.context['author_list']), 3)
+        page = response.context['page_obj']
+        self.assertFalse(page.has_next())
+        self.assertContains(response, f'?before={page.previous_cursor}')
+        response = self.client.get(reverse('authors'), {'before': page.previous_cursor})
+        self.assertEqual(len(response.context['author_list']), 10)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('authors'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_loan_list(self):
+        self.client.login(username='reader', password='biblioteca')
+        response = self.client.get(reverse('my-borrowed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_keyset_paginated'])
+
+
+class EstimatedCountListViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            Author.objects.create(first_name=f'Name {i}', last_name=f'Surname {i}')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        # Las estadisticas aun cuentan 12 autores
+        Author.objects.filter(last_name='Surname 0').delete()
+
+    @override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=10)
+    def test_big_tables_use_the_estimate(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('authors'))
+        # Estimacion (sin COUNT) y pagina
+        self.assertEqual(len(queries), 2)
+        self.assertIn('sqlite_stat1', queries[0]['sql'])
+        self.assertEqual(response.context['paginator'].count, 12)
+
+        response = async_to_sync(self.async_client.get)(reverse('authors'))
+        self.assertEqual(response.context['paginator'].count, 12)
+
+    @override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=100)
+    def test_small_tables_are_counted(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('authors'))
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(response.context['paginator'].count, 11)
+
+        response = async_to_sync(self.async_client.get)(reverse('authors') + '?page=last')
+        self.assertEqual(response.context['paginator'].count, 11)
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_filtered_and_unanalyzed_tables_are_counted(self):
+        self.assertEqual(count_rows(Author.objects.filter(first_name='Name 1'), 0), 1)
+        self.assertEqual(count_rows(Author.objects.all(), 0), 12)
+        # Sin estadisticas de la tabla
+        self.assertEqual(count_rows(Book.objects.all(), 0), 0)
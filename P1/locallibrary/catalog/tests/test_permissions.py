@@ -0,0 +1,138 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import page_cache, permissions
+from catalog.models import Book, BookInstance
+from catalog.tests.query_budget import query_budget
+from catalog.visits import visit_counter
+
+PERM = 'catalog.can_mark_returned'
+
+
+class CachedModelBackendTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.permission = Permission.objects.get(codename='can_mark_returned')
+        cls.group = Group.objects.create(name='Librarians')
+        cls.group.permissions.add(cls.permission)
+        cls.librarian = User.objects.create_user('librarian', password='biblioteca')
+        cls.librarian.groups.add(cls.group)
+        cls.reader = User.objects.create_user('reader', password='biblioteca')
+        book = Book.objects.create(title='Book', summary='-', isbn='1234567890123')
+        cls.copy = BookInstance.objects.create(
+            book=book, imprint='-', status='o', borrower=cls.reader,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        visit_counter.flush()
+
+    def fresh(self, user):
+        # Un objeto nuevo en cada peticion, sin la cache por instancia
+        return User.objects.get(pk=user.pk)
+
+    def assertPerm(self, user, expected):
+        # Como una peticion aparte, que confirma su transaccion
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.fresh(user).has_perm(PERM), expected)
+
+    def test_warm_checks_do_not_query(self):
+        self.assertPerm(self.librarian, True)
+        user = self.fresh(self.librarian)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm(PERM))
+            self.assertFalse(user.has_perm('catalog.add_book'))
+            self.assertIn(PERM, user.get_all_permissions())
+
+    def test_async_checks(self):
+        user = self.fresh(self.librarian)
+        self.assertTrue(async_to_sync(user.ahas_perm)(PERM))
+
+    def test_user_permissions_and_groups(self):
+        self.assertPerm(self.reader, False)
+        self.reader.user_permissions.add(self.permission)
+        self.assertPerm(self.reader, True)
+        self.permission.user_set.remove(self.reader)
+        self.assertPerm(self.reader, False)
+
+        self.group.user_set.add(self.reader)
+        self.assertPerm(self.reader, True)
+        self.reader.groups.clear()
+        self.assertPerm(self.reader, False)
+
+    def test_reads_before_the_commit_are_discarded(self):
+        self.assertPerm(self.librarian, True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.remove(self.permission)
+            # Otra peticion lee los permisos aun confirmados con el token nuevo
+            cache.set(permissions.permissions_key(self.librarian), {PERM})
+        self.assertPerm(self.librarian, False)
+
+    def test_rolled_back_reads_are_not_cached(self):
+        self.assertPerm(self.reader, False)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.reader.user_permissions.add(self.permission)
+            self.assertTrue(self.fresh(self.reader).has_perm(PERM))
+            raise RuntimeError
+        self.assertPerm(self.reader, False)
+
+    def test_reverse_clear_invalidates_everyone(self):
+        self.reader.user_permissions.add(self.permission)
+        self.assertPerm(self.reader, True)
+        self.permission.user_set.clear()
+        self.assertPerm(self.reader, False)
+
+    def test_group_permissions(self):
+        self.assertPerm(self.librarian, True)
+        self.group.permissions.remove(self.permission)
+        self.assertPerm(self.librarian, False)
+        self.group.permissions.add(self.permission)
+        self.assertPerm(self.librarian, True)
+        self.group.delete()
+        self.assertPerm(self.librarian, False)
+
+    def test_superuser_and_inactive(self):
+        self.assertPerm(self.reader, False)
+        self.reader.is_superuser = True
+        self.reader.save()
+        self.assertPerm(self.reader, True)
+        self.librarian.is_active = False
+        self.librarian.save()
+        self.assertPerm(self.librarian, False)
+
+    def test_login_keeps_cached_permissions(self):
+        self.assertPerm(self.librarian, True)
+        before = page_cache.versions([permissions.user_key(self.librarian.pk)])
+        self.client.login(username='librarian', password='biblioteca')
+        self.assertEqual(
+            page_cache.versions([permissions.user_key(self.librarian.pk)]), before
+        )
+
+    @override_settings(CATALOG_PERMISSION_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        self.assertPerm(self.librarian, True)
+        user = self.fresh(self.librarian)
+        with self.assertNumQueries(2):
+            self.assertTrue(user.has_perm(PERM))
+
+    def test_warm_requests_check_permissions_without_queries(self):
+        self.client.login(username='librarian', password='biblioteca')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('all-borrowed'))
+        # Sesion, usuario, COUNT y pagina
+        with query_budget(4):
+            response = self.client.get(reverse('all-borrowed'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_renew_requires_permission(self):
+        url = reverse('renew-book-librarian', args=[self.copy.pk])
+        self.client.login(username='reader', password='biblioteca')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.login(username='librarian', password='biblioteca')
+        self.assertEqual(self.client.get(url).status_code, 200)
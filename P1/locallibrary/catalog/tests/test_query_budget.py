@@ -0,0 +1,148 @@
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.tests.query_budget import QueryBudgetExceeded, query_budget
+from catalog.visits import visit_counter
+
+
+class QueryBudgetHelperTest(TestCase):
+    def test_within_budget(self):
+        with query_budget(1):
+            Author.objects.count()
+
+    def test_over_budget_fails(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1):
+                Author.objects.count()
+                Genre.objects.count()
+
+    def test_decorator(self):
+        @query_budget(0)
+        def run():
+            Author.objects.count()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            run()
+
+
+class CatalogViewQueryBudgetTest(TestCase):
+    """Maximum number of queries of every read-only catalog view.
+
+    The data set is large enough that any per-row lazy access (books per
+    author, copies per book, authors per book in the list) would blow the
+    budget, so these tests fail on N+1 regressions.
+    """
+
+    NUM_COPIES = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        language = Language.objects.create(name='English')
+        genres = [Genre.objects.create(name=f'Genre {i}') for i in range(3)]
+        cls.author = Author.objects.create(first_name='Stephen', last_name='King')
+        for i in range(10):
+            Author.objects.create(first_name=f'First {i}', last_name=f'Last {i}')
+        cls.book = None
+        for i in range(10):
+            book = Book.objects.create(
+                title=f'Book {i}', summary='Summary', isbn=f'{i:013d}',
+                author=cls.author, language=language,
+            )
+            book.genre.set(genres)
+            cls.book = cls.book or book
+        cls.librarian = User.objects.create_user('librarian', password='biblioteca')
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename='can_mark_returned')
+        )
+        for i in range(cls.NUM_COPIES):
+            BookInstance.objects.create(
+                book=cls.book, imprint=f'Imprint {i}', status='oa'[i % 2],
+                borrower=cls.librarian if i % 2 == 0 else None,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        visit_counter.flush()
+
+    def test_index(self):
+        self.client.get(reverse('index'))
+        with query_budget(3):
+            self.client.get(reverse('index'))
+
+    def test_book_list(self):
+        with query_budget(2):
+            self.client.get(reverse('books'))
+
+    def test_book_detail(self):
+        with query_budget(3):
+            response = self.client.get(self.book.get_absolute_url())
+        self.assertEqual(len(response.context['book'].bookinstance_set.all()), self.NUM_COPIES)
+
+    def test_author_list(self):
+        with query_budget(2):
+            self.client.get(reverse('authors'))
+
+    def test_author_detail(self):
+        with query_budget(2):
+            response = self.client.get(self.author.get_absolute_url())
+        self.assertContains(response, 'Book 9')
+
+    def test_all_borrowed(self):
+        self.client.login(username='librarian', password='biblioteca')
+        # Sesion, usuario, permisos (usuario y grupos), COUNT y pagina
+        with query_budget(6):
+            response = self.client.get(reverse('all-borrowed'))
+        self.assertEqual(len(response.context['bookinstance_list']), 10)
+
+    def test_my_borrowed(self):
+        self.client.login(username='librarian', password='biblioteca')
+        # La barra lateral comprueba perms.catalog.can_mark_returned
+        with query_budget(6):
+            response = self.client.get(reverse('my-borrowed'))
+        self.assertEqual(len(response.context['bookinstance_list']), 10)
+
+    def test_bookinstance_str_with_joined_book(self):
+        copy = BookInstance.objects.select_related('book').first()
+        with query_budget(0):
+            str(copy)
+
+
+class LoanIndexTest(TestCase):
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' '.join(str(row) for row in cursor.fetchall())
+
+    def test_all_borrowed_uses_status_due_back_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite specific')
+        plan = self.explain(
+            BookInstance.objects.filter(status='o').order_by('due_back')
+        )
+        self.assertIn('bookinst_status_due_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_borrowed_by_user_uses_borrower_due_back_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite specific')
+        plan = self.explain(
+            BookInstance.objects.filter(borrower_id=1).order_by('due_back')
+        )
+        self.assertIn('bookinst_borrower_due_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_overdue_report_uses_status_due_back_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite specific')
+        plan = self.explain(
+            BookInstance.objects.overdue().with_overdue().order_by('due_back')
+        )
+        self.assertIn('bookinst_status_due_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from catalog import page_cache, routers
+from catalog.middleware import ReplicaRoutingMiddleware
+from catalog.models import Book, BookInstance
+from catalog.routers import ReplicaRouter, use_replica
+
+REPLICAS = override_settings(
+    DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_PIN_SECONDS=5,
+)
+
+
+@REPLICAS
+class ReplicaRouterTest(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def test_reads_use_replica_only_when_asked(self):
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+        with use_replica('replica'):
+            self.assertEqual(self.router.db_for_read(Book), 'replica')
+            self.assertEqual(self.router.db_for_read(BookInstance), 'replica')
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+    def test_auth_and_sessions_read_from_primary(self):
+        with use_replica('replica'):
+            for model in (User, Permission, Session):
+                self.assertEqual(self.router.db_for_read(model), 'default')
+
+    def test_writes_go_to_primary(self):
+        book = Book(title='Replicated')
+        book._state.db = 'replica'
+        with use_replica('replica'):
+            self.assertEqual(self.router.db_for_write(Book, instance=book), 'default')
+
+    def test_relations_and_migrations(self):
+        book, copy = Book(), BookInstance()
+        book._state.db, copy._state.db = 'replica', 'default'
+        self.assertTrue(self.router.allow_relation(book, copy))
+        self.assertFalse(self.router.allow_migrate('replica', 'catalog'))
+        self.assertIsNone(self.router.allow_migrate('default', 'catalog'))
+
+
+class ReplicaRoutingMiddlewareTest(SimpleTestCase):
+    factory = RequestFactory()
+
+    def call(self, request):
+        seen = []
+
+        def view(request):
+            seen.append(routers.current_replica())
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        self.assertIsNone(routers.current_replica())
+        return seen[0], response
+
+    @REPLICAS
+    def test_reads_go_to_replica(self):
+        replica, response = self.call(self.factory.get('/catalog/books/'))
+        self.assertEqual(replica, 'replica')
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+    @REPLICAS
+    def test_writes_pin_client_to_primary(self):
+        replica, response = self.call(self.factory.post('/catalog/book/1/renew/'))
+        self.assertIsNone(replica)
+        cookie = response.cookies[routers.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertTrue(cookie['httponly'])
+
+        request = self.factory.get('/catalog/books/')
+        request.COOKIES[routers.PIN_COOKIE] = '1'
+        replica, response = self.call(request)
+        self.assertIsNone(replica)
+
+    def test_without_replicas(self):
+        replica, response = self.call(self.factory.get('/catalog/books/'))
+        self.assertIsNone(replica)
+        replica, response = self.call(self.factory.post('/catalog/books/'))
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+
+@REPLICAS
+class ReplicaPageCacheTest(SimpleTestCase):
+    factory = RequestFactory()
+
+    def setUp(self):
+        cache.clear()
+
+    def page_key(self):
+        request = self.factory.get('/catalog/books/')
+        request.user = mock.Mock(is_authenticated=False)
+        with use_replica('replica'):
+            return page_cache.page_key(request, [page_cache.BOOK_LIST])
+
+    def test_recent_changes_are_not_cached_from_replica(self):
+        page_cache.bump(page_cache.BOOK_LIST)
+        self.assertIsNone(self.page_key())
+        with mock.patch('time.time', return_value=page_cache.time.time() + 6):
+            self.assertIsNotNone(self.page_key())
+
+    def test_primary_reads_are_cached(self):
+        page_cache.bump(page_cache.BOOK_LIST)
+        request = self.factory.get('/catalog/books/')
+        request.user = mock.Mock(is_authenticated=False)
+        self.assertIsNotNone(page_cache.page_key(request, [page_cache.BOOK_LIST]))
@@ -0,0 +1,102 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, Genre
+from catalog.search import SearchBackend, get_backend, search_books
+
+
+class BookSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.king = Author.objects.create(first_name='Stephen', last_name='King')
+        cls.asimov = Author.objects.create(first_name='Isaac', last_name='Asimov')
+        cls.horror = Genre.objects.create(name='Horror')
+        cls.scifi = Genre.objects.create(name='Science Fiction')
+        cls.shining = Book.objects.create(
+            title='The Shining', author=cls.king, isbn='9780345806789',
+            summary='A writer becomes caretaker of the Overlook Hotel.',
+        )
+        cls.shining.genre.add(cls.horror)
+        cls.robot = Book.objects.create(
+            title='I Robot', author=cls.asimov, isbn='9780194242363',
+            summary='Short stories about robots and the Shining laws.',
+        )
+        cls.robot.genre.add(cls.scifi)
+
+    def titles(self, query):
+        return [book.title for book in search_books(query)]
+
+    def test_matches_every_field(self):
+        self.assertEqual(self.titles('overlook'), ['The Shining'])
+        self.assertEqual(self.titles('asimov'), ['I Robot'])
+        self.assertEqual(self.titles('horror'), ['The Shining'])
+
+    def test_title_ranks_above_summary(self):
+        self.assertEqual(self.titles('shining'), ['The Shining', 'I Robot'])
+
+    def test_prefix_and_accents(self):
+        self.assertEqual(self.titles('Cément'), [])
+        book = Book.objects.create(
+            title='Cementerio de Animales', author=self.king,
+            isbn='9780450057694', summary='El Dr. Louis Creed...',
+        )
+        self.assertEqual(self.titles('cemen'), [book.title])
+
+    def test_user_syntax_is_not_interpreted(self):
+        self.assertEqual(self.titles('"robot" OR NEAR('), [])
+        self.assertEqual(self.titles('***'), [])
+
+    def test_index_follows_changes(self):
+        self.robot.title = 'The Caves of Steel'
+        self.robot.save()
+        self.assertEqual(self.titles('caves'), ['The Caves of Steel'])
+        self.asimov.last_name = 'Azimov'
+        self.asimov.save()
+        self.assertEqual(self.titles('azimov'), ['The Caves of Steel'])
+        self.robot.genre.add(self.horror)
+        self.assertEqual(set(self.titles('horror')), {'The Shining', 'The Caves of Steel'})
+        self.horror.book_set.clear()
+        self.assertEqual(self.titles('horror'), [])
+        self.scifi.delete()
+        self.assertEqual(self.titles('science'), [])
+        self.robot.delete()
+        self.assertEqual(self.titles('steel'), [])
+
+    def test_rebuild(self):
+        get_backend().rebuild()
+        self.assertEqual(self.titles('hotel'), ['The Shining'])
+
+    def test_orphan_documents_are_skipped(self):
+        # Un borrado sin señales (flush, SQL a mano) deja el documento
+        Book.genre.through.objects.filter(book=self.robot).delete()
+        Book.objects.filter(pk=self.robot.pk)._raw_delete('default')
+        ranked = get_backend().search('shining', 10)
+        self.assertEqual([book_id for book_id, _ in ranked], [self.shining.pk])
+        get_backend().rebuild()
+        self.assertEqual(self.titles('robots'), [])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('search'), {'q': 'robots'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/book_search.html')
+        self.assertContains(response, 'I Robot')
+        self.assertNotContains(response, 'The Shining</a>')
+
+    def test_search_view_without_query(self):
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['book_list']), [])
+
+    def test_incomplete_backends_fail_on_instantiation(self):
+        class NoSearch(SearchBackend):
+            def index_books(self, book_ids):
+                pass
+
+            def remove_books(self, book_ids):
+                pass
+
+            def rebuild(self):
+                pass
+
+        with self.assertRaises(TypeError):
+            NoSearch()
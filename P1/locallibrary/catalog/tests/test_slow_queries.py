@@ -0,0 +1,72 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import slow_queries
+from catalog.models import Author, Book
+from catalog.slow_queries import RequestRecorder, fingerprint, normalize
+
+
+class NormalizeTest(TestCase):
+    def test_literals_and_in_lists(self):
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE a = 'x''y' AND b IN (%s, %s, %s)\n LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?',
+        )
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s)'),
+            fingerprint('SELECT 2 FROM t WHERE id IN (%s, %s)'),
+        )
+
+
+class SlowQueryRecorderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            author = Author.objects.create(first_name=f'First {i}', last_name=f'Last {i}')
+            Book.objects.create(title=f'Book {i}', summary='-', isbn=f'{i:013d}', author=author)
+
+    def setUp(self):
+        slow_queries.reset()
+
+    def n_plus_one_request(self):
+        recorder = RequestRecorder(threshold=60, view='authors')
+        with connection.execute_wrapper(recorder):
+            for author in Author.objects.all():
+                author.book_set.count()
+        recorder.finish()
+
+    def test_repeated_queries_are_reported_once_per_pattern(self):
+        with self.assertLogs('catalog.slow_queries') as logs:
+            self.n_plus_one_request()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Repeated query (x12 in one request)', logs.output[0])
+        self.assertIn('catalog/tests/test_slow_queries.py', logs.output[0])
+
+        with self.assertLogs('catalog.slow_queries') as logs:
+            self.n_plus_one_request()
+        self.assertIn('seen 2 times (24 executions', logs.output[0])
+
+        with self.assertNoLogs('catalog.slow_queries'):
+            self.n_plus_one_request()
+        pattern = slow_queries.report()[0]
+        self.assertEqual(pattern.count, 36)
+        self.assertEqual(pattern.max_repeats, 12)
+        self.assertEqual(pattern.views, {'authors'})
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_queries_are_logged_with_plan_and_view(self):
+        with self.assertLogs('catalog.slow_queries') as logs:
+            self.client.get(reverse('authors'))
+        output = '\n'.join(logs.output)
+        self.assertIn('Slow query', output)
+        self.assertIn('in view authors', output)
+        if connection.vendor == 'sqlite':
+            self.assertIn('SCAN', output)
+        patterns = slow_queries.report()
+        self.assertTrue(all(p.slow == p.count for p in patterns))
+
+    def test_disabled_by_default(self):
+        with self.assertNoLogs('catalog.slow_queries'):
+            self.client.get(reverse('authors'))
+        self.assertEqual(slow_queries.report(), [])
@@ -1,6 +1,11 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from catalog.models import Author
+from catalog.models import Author, PageVisit
+from catalog.routers import use_replica
+from catalog.visits import visit_counter
 
 
 class AuthorListViewTest(TestCase):
@@ -226,3 +231,48 @@ class AuthorCreateViewTest(TestCase):
 
     def test_redirects_to_detail_view_on_success(self):
         pass
+
+
+class IndexVisitCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        visit_counter.flush()
+
+    def test_first_visit_seeds_session(self):
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 1)
+        self.assertEqual(self.client.session['num_visits'], 1)
+
+    def test_later_visits_do_not_write_session(self):
+        self.client.get(reverse('index'))
+        session_key = self.client.session.session_key
+        for expected in (2, 3, 4):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('index'))
+            self.assertEqual(response.context['num_visits'], expected)
+            for query in queries.captured_queries:
+                self.assertTrue(query['sql'].startswith('SELECT'), query['sql'])
+        self.assertEqual(self.client.session.session_key, session_key)
+        self.assertEqual(self.client.session['num_visits'], 1)
+        self.assertEqual(visit_counter.pending(f'session:{session_key}'), 3)
+
+    def test_flush_persists_buffered_visits(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        key = f'session:{self.client.session.session_key}'
+        self.assertEqual(visit_counter.flush(), 2)
+        self.assertEqual(PageVisit.objects.get(key=key).count, 2)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 4)
+        visit_counter.flush()
+        self.assertEqual(PageVisit.objects.get(key=key).count, 3)
+
+    def test_flush_during_a_replica_request_uses_the_primary(self):
+        visit_counter.record('session:abc')
+        visit_counter.flush()
+        visit_counter.record('session:abc')
+        # Las claves existentes se leen de la primaria, no de la replica
+        with use_replica('replica'):
+            self.assertEqual(visit_counter.flush(requeue=False), 1)
+        self.assertEqual(PageVisit.objects.get(key='session:abc').count, 2)
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('books/', views.BookListView.as_view(), name='books'),
+    path('search/', views.BookSearchView.as_view(), name='search'),
     path(
         'book/<int:pk>',
         views.BookDetailView.as_view(),
@@ -19,6 +20,26 @@ urlpatterns = [
         views.AllBorrowedListView.as_view(),
         name='all-borrowed'
     ),
+    path(
+        'overdue/',
+        views.OverdueListView.as_view(),
+        name='overdue'
+    ),
+    path(
+        'overdue/export/',
+        views.overdue_export,
+        name='overdue-export'
+    ),
+    path(
+        'circulation/',
+        views.bulk_circulation,
+        name='bulk-circulation'
+    ),
+    path(
+        'circulation/<str:action>/',
+        views.bulk_circulation_api,
+        name='bulk-circulation-api'
+    ),
 
     # Herramientas de Autor
     path(
@@ -56,6 +77,16 @@ urlpatterns = [
         name='book-delete'
     ),
 
+    # Exportacion en streaming (books/copies/loans en csv/jsonl)
+    path(
+        'export/<str:kind>.<str:fmt>',
+        views.export_view,
+        name='catalog-export'
+    ),
+
+    # Metricas por vista en formato Prometheus (solo staff)
+    path('metrics/', views.metrics_view, name='metrics'),
+
     # Libros prestados (Usuario actual)
     path(
         'mybooks/',
@@ -0,0 +1,23 @@
+"""
+URLs of the catalog for ASGI requests: the routes of catalog.urls, with the
+read-only pages served by catalog.async_views (see AsyncViewsMiddleware).
+"""
+
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'index': async_views.index,
+    'books': async_views.book_list,
+    'book-detail': async_views.book_detail,
+    'authors': async_views.author_list,
+    'author-detail': async_views.author_detail,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]
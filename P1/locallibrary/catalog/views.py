@@ -1,55 +1,152 @@
 import datetime
+import json
 
-from django.shortcuts import render, get_object_or_404
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.utils.crypto import constant_time_compare
+from django.shortcuts import get_object_or_404
+from django.db.models import prefetch_related_objects
 from django.views import generic
+from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import (
     LoginRequiredMixin,
     PermissionRequiredMixin
 )
 from django.urls import reverse, reverse_lazy
-from django.http import HttpResponseRedirect
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.template.response import TemplateResponse
+from django.views.decorators.http import require_POST
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
-from .models import Book, BookInstance, Author, Genre
-from catalog.forms import RenewBookForm
+from .models import Book, BookInstance, Author, CatalogStats
+from catalog.forms import BulkCirculationForm, RenewBookForm
+from catalog import (
+    circulation, exporter, facets, metrics, page_cache, routers
+)
+from catalog.page_cache import CachedPageMixin, ConditionalGetMixin
+from catalog.pagination import KeysetPaginationMixin
+from catalog.search import search_books
+from catalog.visits import record_visit
 
 
 def index(request):
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-    num_instances_available = BookInstance.objects.filter(
-        status__exact='a'
-    ).count()
-    num_authors = Author.objects.count()
-    num_genres = Genre.objects.all().count()
-    num_books_a = Book.objects.filter(title__icontains='a').count()
-
-    num_visits = request.session.get('num_visits', 0)
-    num_visits += 1
-    request.session['num_visits'] = num_visits
+    # Los contadores se mantienen por señales (ver catalog/signals.py), asi
+    # que la portada hace una unica lectura por clave primaria.
+    stats = CatalogStats.load()
+
+    # Las visitas se acumulan en memoria y se vuelcan por lotes (ver
+    # catalog/visits.py): la sesion solo se escribe en la primera visita.
+    num_visits = record_visit(request)
 
     context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_genres': num_genres,
-        'num_authors': num_authors,
+        'num_books': stats.num_books,
+        'num_instances': stats.num_instances,
+        'num_instances_available': stats.num_instances_available,
+        'num_genres': stats.num_genres,
+        'num_authors': stats.num_authors,
         'num_visits': num_visits,
-        'num_books_a': num_books_a,
+        'num_books_a': stats.num_books_a,
     }
 
-    return render(request, 'index.html', context=context)
+    # TemplateResponse (y no render()) para que el middleware de metricas
+    # pueda medir el tiempo de renderizado por separado
+    return TemplateResponse(request, 'index.html', context=context)
+
+
+# Ordenaciones del listado de libros (?sort=...); la primera es la de
+# por defecto
+BOOK_ORDERINGS = {
+    'title': ('title',),
+    # Usa el indice book_available_title_idx
+    'available': ('-copies_available', 'title'),
+}
+
 
+def book_sort(request):
+    sort = request.GET.get('sort')
+    return sort if sort in BOOK_ORDERINGS else next(iter(BOOK_ORDERINGS))
 
-class BookListView(generic.ListView):
+
+class BookListView(
+    CachedPageMixin, KeysetPaginationMixin, generic.ListView
+):
     model = Book
     paginate_by = 2
 
+    def get_cache_dependencies(self):
+        return [page_cache.BOOK_LIST]
+
+    def get_ordering(self):
+        return BOOK_ORDERINGS[book_sort(self.request)]
+
+    def get_queryset(self):
+        # Recuentos de las facetas en una consulta (ver catalog/facets.py)
+        self.facets = facets.facet_counts(self.request.GET)
+        # La plantilla muestra el autor de cada libro
+        return facets.filter_books(
+            super().get_queryset().select_related('author'),
+            self.facets.selection,
+        )
+
+    def get_paginator(self, *args, **kwargs):
+        paginator = super().get_paginator(*args, **kwargs)
+        # El total ya sale de la consulta de facetas: sin COUNT aparte
+        paginator.count = self.facets.total
+        return paginator
 
-class BookDetailView(generic.DetailView):
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['sort'] = book_sort(self.request)
+        context['facets'] = self.facets
+        return context
+
+
+class BookSearchView(generic.ListView):
+    """Full-text search over titles, summaries, authors and genres."""
+    template_name = 'catalog/book_search.html'
+    context_object_name = 'book_list'
+    paginate_by = 20
+
+    def get_queryset(self):
+        # Lista ya ordenada por relevancia (ver catalog/search.py)
+        self.query = self.request.GET.get('q', '').strip()
+        if not self.query:
+            return []
+        return search_books(self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
+
+
+class BookDetailView(
+    CachedPageMixin, ConditionalGetMixin, generic.DetailView
+):
     model = Book
 
+    def get_cache_dependencies(self):
+        return [page_cache.book_key(self.kwargs['pk'])]
+
+    def get_queryset(self):
+        return Book.objects.select_related('author', 'language')
+
+    def get_context_data(self, **kwargs):
+        # Cargamos todo el grafo que recorre la plantilla en 3 consultas
+        # (libro+autor+idioma, generos y copias), sin importar cuantas
+        # copias tenga el libro. Generos y copias se cargan aqui, despues
+        # de la comprobacion del 304.
+        prefetch_related_objects([self.object], 'genre', 'bookinstance_set')
+        return super().get_context_data(**kwargs)
+
 
+@permission_required('catalog.can_mark_returned')
 def renew_book_librarian(request, pk):
     book_instance = get_object_or_404(BookInstance, pk=pk)
 
@@ -70,22 +167,109 @@ def renew_book_librarian(request, pk):
         'book_instance': book_instance,
     }
 
-    return render(request, 'catalog/book_renew_librarian.html', context)
+    return TemplateResponse(
+        request, 'catalog/book_renew_librarian.html', context
+    )
 
 
-class AllBorrowedListView(PermissionRequiredMixin, generic.ListView):
+class AllBorrowedListView(
+    PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView
+):
     model = BookInstance
     permission_required = 'catalog.can_mark_returned'
     template_name = 'catalog/bookinstance_list_all_borrowed.html'
     paginate_by = 10
 
     def get_queryset(self):
-        return BookInstance.objects.filter(
-            status__exact='o'
+        return BookInstance.objects.on_loan().with_overdue().select_related(
+            'book', 'borrower'
         ).order_by('due_back')
 
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class OverdueListView(
+    PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView
+):
+    """Overdue loans, most days late first.
+
+    Filtering, counting and sorting run in SQL over the
+    (status, due_back) index: sorting by ``due_back`` ascending is
+    sorting by days late descending.
+    """
+
+    model = BookInstance
+    permission_required = 'catalog.can_mark_returned'
+    template_name = 'catalog/bookinstance_list_overdue.html'
+    paginate_by = 50
+
+    def get_queryset(self):
+        self.today = datetime.date.today()
+        return BookInstance.objects.overdue(self.today).with_overdue(
+            self.today
+        ).select_related('book', 'borrower').order_by('due_back')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        paginator = context.get('paginator')
+        context['today'] = self.today
+        context['overdue_count'] = (
+            paginator.count if hasattr(paginator, 'count')
+            else self.object_list.count()
+        )
+        return context
+
+
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def overdue_export(request):
+    """Overdue loans as CSV, in the same order as the report."""
+    today = datetime.date.today()
+    return _export_response(
+        exporter.LOANS, 'csv', f'overdue-{today.isoformat()}',
+        today=today, overdue=True,
+    )
+
+
+# Permiso necesario para cada exportacion: los prestamos incluyen los
+# usuarios, asi que solo los ven los bibliotecarios.
+EXPORT_PERMISSIONS = {
+    exporter.BOOKS: 'catalog.view_book',
+    exporter.COPIES: 'catalog.view_bookinstance',
+    exporter.LOANS: 'catalog.can_mark_returned',
+}
+
+
+def _export_response(kind, fmt, filename, **options):
+    response = StreamingHttpResponse(
+        exporter.export_lines(
+            kind, fmt,
+            chunk_size=getattr(
+                settings, 'CATALOG_EXPORT_CHUNK_SIZE',
+                exporter.DEFAULT_CHUNK_SIZE,
+            ),
+            # La respuesta se recorre fuera del middleware: la replica de
+            # la peticion se fija aqui
+            using=routers.current_replica(),
+            **options,
+        ),
+        content_type=exporter.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename}.{fmt}"'
+    )
+    return response
+
+
+def export_view(request, kind, fmt):
+    """Streams the whole catalog (books, copies or loans) as CSV or JSONL."""
+    if kind not in EXPORT_PERMISSIONS or fmt not in exporter.FORMATS:
+        raise Http404('Unknown export.')
+    if not request.user.has_perm(EXPORT_PERMISSIONS[kind]):
+        raise PermissionDenied
+    return _export_response(kind, fmt, kind)
+
+
+class LoanedBooksByUserListView(
+    LoginRequiredMixin, KeysetPaginationMixin, generic.ListView
+):
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
@@ -96,7 +280,87 @@ class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
         # el estatus a 'o'.
         return BookInstance.objects.filter(
             borrower=self.request.user
-        ).order_by('due_back')
+        ).with_overdue().select_related('book').order_by('due_back')
+
+
+@permission_required('catalog.can_mark_returned')
+def bulk_circulation(request):
+    """Returns desk: return, lend or renew many copies at once."""
+    result = None
+    if request.method == 'POST':
+        form = BulkCirculationForm(request.POST)
+        if form.is_valid():
+            try:
+                result = circulation.circulate(
+                    form.cleaned_data['action'],
+                    form.cleaned_data['items'],
+                    borrower=form.cleaned_data['borrower'],
+                    due_back=form.cleaned_data['due_back'],
+                )
+            except circulation.CirculationError as e:
+                form.add_error(None, str(e))
+            else:
+                # Formulario limpio para la siguiente tanda de lecturas
+                form = BulkCirculationForm(
+                    initial={'action': form.cleaned_data['action']}
+                )
+    else:
+        form = BulkCirculationForm(initial={'action': circulation.RETURN})
+
+    return TemplateResponse(
+        request, 'catalog/bulk_circulation.html',
+        {'form': form, 'result': result},
+    )
+
+
+@require_POST
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def bulk_circulation_api(request, action):
+    """JSON endpoint for scanners and scripts.
+
+    The body is either JSON (``{"items": [...], "borrower": "username",
+    "due_back": "YYYY-MM-DD"}``) or plain text with one copy ID per line.
+    """
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        items = payload.get('items') or []
+        if isinstance(items, str):
+            items = circulation.parse_items(items)
+        data = {
+            'action': action,
+            'items': '\n'.join(str(item) for item in items),
+            'borrower': payload.get('borrower') or '',
+            'due_back': payload.get('due_back') or '',
+        }
+    else:
+        try:
+            items = request.body.decode(request.encoding or 'utf-8')
+        except (UnicodeDecodeError, LookupError):
+            return JsonResponse({'error': 'Invalid encoding'}, status=400)
+        data = {
+            'action': action,
+            'items': items,
+            'borrower': request.GET.get('borrower', ''),
+            'due_back': request.GET.get('due_back', ''),
+        }
+    form = BulkCirculationForm(data)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        result = circulation.circulate(
+            action,
+            form.cleaned_data['items'],
+            borrower=form.cleaned_data['borrower'],
+            due_back=form.cleaned_data['due_back'],
+        )
+    except circulation.CirculationError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(result.as_dict())
 
 
 # Vistas de Autores
@@ -119,14 +383,28 @@ class AuthorDelete(PermissionRequiredMixin, DeleteView):
     permission_required = 'catalog.delete_author'
 
 
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(
+    CachedPageMixin, ConditionalGetMixin, generic.DetailView
+):
     model = Author
 
+    def get_cache_dependencies(self):
+        return [page_cache.author_key(self.kwargs['pk'])]
+
+    def get_context_data(self, **kwargs):
+        prefetch_related_objects([self.object], 'book_set')
+        return super().get_context_data(**kwargs)
+
 
-class AuthorListView(generic.ListView):
+class AuthorListView(
+    CachedPageMixin, KeysetPaginationMixin, generic.ListView
+):
     model = Author
     paginate_by = 10
 
+    def get_cache_dependencies(self):
+        return [page_cache.AUTHOR_LIST]
+
 
 # Vistas de Libros (Ahora con permisos)
 class BookCreate(PermissionRequiredMixin, CreateView):
@@ -145,3 +423,22 @@ class BookDelete(PermissionRequiredMixin, DeleteView):
     model = Book
     success_url = reverse_lazy('books')
     permission_required = 'catalog.delete_book'
+
+
+def metrics_view(request):
+    """Per-view metrics in Prometheus text format (staff only).
+
+    Scrapers that cannot log in can send ``Authorization: Bearer <token>``
+    with the token configured in ``METRICS_TOKEN``.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorized = request.user.is_staff or (
+        token and constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}'
+        )
+    )
+    if not authorized:
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,171 @@
+"""
+Buffered visit counter for the index page.
+
+Incrementing ``request.session['num_visits']`` on every request forces a
+session UPDATE on the hottest URL. Instead, visits are accumulated in a
+per-process buffer and flushed to PageVisit in batches, either every
+``VISIT_FLUSH_INTERVAL`` seconds or once ``VISIT_FLUSH_BATCH`` visits are
+pending. The count shown to the visitor is the flushed total (cached) plus
+what this process still has pending, which is accurate enough for display.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, router, transaction
+from django.db.models import F
+
+from .models import PageVisit
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'catalog:visits:'
+
+
+class VisitCounter:
+    """Thread-safe in-memory buffer of visits, flushed in batches."""
+
+    def __init__(self, flush_interval=None, flush_batch=None):
+        self._flush_interval = flush_interval
+        self._flush_batch = flush_batch
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._last_flush = time.monotonic()
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'VISIT_FLUSH_INTERVAL', 30)
+
+    @property
+    def flush_batch(self):
+        if self._flush_batch is not None:
+            return self._flush_batch
+        return getattr(settings, 'VISIT_FLUSH_BATCH', 500)
+
+    def record(self, key):
+        """Counts one visit for ``key`` and returns its approximate total."""
+        with self._lock:
+            self._pending[key] += 1
+            pending = self._pending[key]
+            total_pending = sum(self._pending.values())
+            due = (
+                total_pending >= self.flush_batch
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        count = self.stored(key) + pending
+        if due:
+            self.flush()
+        return count
+
+    def stored(self, key):
+        """Returns the flushed count for ``key`` (cached between flushes)."""
+        cache_key = CACHE_PREFIX + key
+        count = cache.get(cache_key)
+        if count is None:
+            count = PageVisit.objects.filter(key=key).values_list(
+                'count', flat=True
+            ).first() or 0
+            cache.set(cache_key, count)
+        return count
+
+    def pending(self, key=None):
+        """Returns the visits not yet flushed (for ``key`` or in total)."""
+        with self._lock:
+            if key is None:
+                return sum(self._pending.values())
+            return self._pending[key]
+
+    def flush(self, requeue=True):
+        """Writes the buffered visits to the database in one transaction.
+
+        Keys are grouped by their increment so existing rows are updated
+        with one UPDATE per distinct increment, and new keys are inserted
+        with a single bulk_create. Returns the number of visits written.
+        If the write fails the visits go back to the buffer, unless
+        ``requeue`` is False, in which case the error is raised.
+
+        Existing keys are read from the database the rows are written to:
+        during a GET the router would send the read to a replica, which may
+        not have the keys inserted by a recent flush yet.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        using = router.db_for_write(PageVisit)
+        visits = PageVisit.objects.using(using)
+        try:
+            with transaction.atomic(using=using):
+                existing = set(
+                    visits.filter(key__in=pending).values_list(
+                        'key', flat=True
+                    )
+                )
+                by_increment = defaultdict(list)
+                for key in existing:
+                    by_increment[pending[key]].append(key)
+                for increment, keys in by_increment.items():
+                    visits.filter(key__in=keys).update(
+                        count=F('count') + increment
+                    )
+                visits.bulk_create([
+                    PageVisit(key=key, count=n)
+                    for key, n in pending.items() if key not in existing
+                ])
+        except Exception:
+            if not requeue:
+                raise
+            # No perdemos las visitas: vuelven al buffer para el siguiente
+            # intento y la peticion que disparo el volcado no falla.
+            logger.exception('Could not flush %d visits', sum(pending.values()))
+            with self._lock:
+                self._pending.update(pending)
+            return 0
+
+        cache.delete_many([CACHE_PREFIX + key for key in pending])
+        return sum(pending.values())
+
+
+visit_counter = VisitCounter()
+
+
+@atexit.register
+def _flush_at_exit():
+    # Al salir ya no hay reintento posible (y tras la suite de tests la BD
+    # ya no existe), asi que un fallo aqui solo se ignora.
+    try:
+        visit_counter.flush(requeue=False)
+    except DatabaseError:
+        pass
+
+
+def visit_key(request):
+    """Returns the counter key for the user, or for the anonymous session."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'session:{request.session.session_key}'
+
+
+def record_visit(request):
+    """Counts a visit to the index and returns the number to display.
+
+    Only the first visit of a new session writes ``num_visits`` to the
+    session (it has to be created anyway to get a key to count under).
+    Later visits leave the session untouched and go to the buffer.
+    """
+    session = request.session
+    if not request.user.is_authenticated and session.session_key is None:
+        session['num_visits'] = 1
+        return 1
+    return session.get('num_visits', 0) + visit_counter.record(
+        visit_key(request)
+    )
@@ -0,0 +1,19 @@
+"""
+gunicorn settings read by ``gunicorn locallibrary.wsgi`` from this directory.
+
+Keeps METRICS_DIR (see catalog/metrics.py) limited to the live workers.
+"""
+
+import os
+
+from catalog import metrics
+
+
+def on_starting(server):
+    # Ficheros de un arranque anterior
+    metrics.clear(os.environ.get('METRICS_DIR'))
+
+
+def child_exit(server, worker):
+    # Tambien los workers que mueren sin ejecutar sus atexit
+    metrics.mark_process_dead(worker.pid, os.environ.get('METRICS_DIR'))
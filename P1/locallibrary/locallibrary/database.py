@@ -0,0 +1,190 @@
+"""
+Builds ``DATABASES['default']`` from ``DATABASE_URL`` and the ``DB_*``
+environment variables.
+
+On PostgreSQL with psycopg 3 and ``psycopg_pool`` installed, each process
+keeps a connection pool (Django 5.1+ ``OPTIONS['pool']``): requests borrow
+an open connection instead of connecting, and ``DB_POOL_MAX_SIZE`` bounds
+the connections of the process. With ``DB_MAX_CONNECTIONS`` and
+``WEB_CONCURRENCY`` (the number of gunicorn workers) the size is derived
+so that all the workers together never go over the server's limit.
+
+The pool is created lazily, on the first query of each process, so it is
+not shared across the fork of gunicorn workers. SQLite, or PostgreSQL
+without the pool (``DB_POOL=0`` or psycopg2), keeps one persistent
+connection per thread for ``DB_CONN_MAX_AGE`` seconds.
+
+With ``DB_SQLITE_PROFILE=production``, SQLite connections get tuned pragmas
+(WAL, relaxed fsync, memory-mapped I/O, a larger page cache, a busy
+timeout); see ``sqlite_options``.
+
+Read replicas (``DATABASE_URL_<NAME>``) get the same options; each one
+has its own pool, so ``DB_MAX_CONNECTIONS`` applies per server.
+"""
+
+import os
+
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_POOL_MIN_SIZE = 2
+DEFAULT_POOL_MAX_SIZE = 10
+
+REPLICA_PREFIX = 'DATABASE_URL_'
+
+SQLITE_PROFILES = ('default', 'production')
+
+
+def _int(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _float(environ, name, default):
+    value = environ.get(name)
+    return float(value) if value not in (None, '') else default
+
+
+def _flag(environ, name, default):
+    value = environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.lower() not in ('0', 'false', 'no', 'off')
+
+
+def pool_available():
+    """True if the installed driver supports Django's connection pool."""
+    try:
+        import psycopg  # noqa: F401
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def pool_options(environ):
+    """Options of ``psycopg_pool.ConnectionPool`` from the environment."""
+    max_size = _int(environ, 'DB_POOL_MAX_SIZE', None)
+    total = _int(environ, 'DB_MAX_CONNECTIONS', None)
+    if max_size is None:
+        max_size = DEFAULT_POOL_MAX_SIZE
+        if total:
+            # Reparto del maximo del servidor entre los workers de gunicorn
+            workers = max(_int(environ, 'WEB_CONCURRENCY', 1), 1)
+            max_size = max(total // workers, 1)
+    min_size = min(
+        _int(environ, 'DB_POOL_MIN_SIZE', DEFAULT_POOL_MIN_SIZE), max_size
+    )
+    return {
+        'min_size': min_size,
+        'max_size': max_size,
+        # Segundos que una peticion espera por una conexion libre antes
+        # de fallar (PoolTimeout) en vez de encolarse indefinidamente
+        'timeout': _float(environ, 'DB_POOL_TIMEOUT', 10.0),
+        # Las conexiones por encima de min_size se cierran tras max_idle
+        # segundos sin uso; todas se renuevan tras max_lifetime
+        'max_idle': _float(environ, 'DB_POOL_MAX_IDLE', 300.0),
+        'max_lifetime': _float(environ, 'DB_POOL_MAX_LIFETIME', 3600.0),
+    }
+
+
+def sqlite_options(environ, profile=None):
+    """SQLite ``OPTIONS`` of the ``DB_SQLITE_PROFILE`` profile.
+
+    ``default`` (the default) keeps SQLite's own settings (rollback
+    journal, writers block readers); ``production`` applies the pragmas
+    below on every new connection and starts every transaction, read-only
+    ones included, with the write lock (``BEGIN IMMEDIATE``). The journal
+    mode is stored in the database file: going back from ``production``
+    needs a one-off ``PRAGMA journal_mode=DELETE`` with no other
+    connection open.
+    """
+    profile = profile or environ.get('DB_SQLITE_PROFILE') or 'default'
+    if profile not in SQLITE_PROFILES:
+        raise ImproperlyConfigured(
+            f'DB_SQLITE_PROFILE must be one of {", ".join(SQLITE_PROFILES)}'
+        )
+    if profile == 'default':
+        return {}
+    pragmas = [
+        # Los lectores no esperan al escritor ni al reves
+        'journal_mode=WAL',
+        # En WAL, NORMAL solo sincroniza en los checkpoints: un corte de
+        # luz puede perder las ultimas transacciones, pero no corrompe
+        'synchronous=NORMAL',
+        f'mmap_size={_int(environ, "DB_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)}',
+        # Negativo: KiB de cache de paginas por conexion
+        f'cache_size=-{_int(environ, "DB_SQLITE_CACHE_KIB", 64 * 1024)}',
+        'temp_store=MEMORY',
+        # Recomendado al abrir conexiones de larga duracion (SQLite 3.46+
+        # analiza las tablas sin estadisticas; antes no hace nada)
+        'optimize=0x10002',
+    ]
+    return {
+        'init_command': ';'.join(f'PRAGMA {pragma}' for pragma in pragmas),
+        # Segundos que se espera a un bloqueo antes de "database is locked"
+        'timeout': _float(environ, 'DB_SQLITE_BUSY_TIMEOUT', 5.0),
+        # BEGIN IMMEDIATE toma el bloqueo de escritura al empezar: con el
+        # BEGIN diferido por defecto, pasar de lectura a escritura en una
+        # transaccion falla al momento sin respetar el timeout.
+        'transaction_mode': 'IMMEDIATE',
+    }
+
+
+def database_config(environ=None, default=None):
+    """Returns the settings dict of the default database.
+
+    ``environ`` defaults to ``os.environ``; ``default`` is the URL used
+    when ``DATABASE_URL`` is not set.
+    """
+    environ = os.environ if environ is None else environ
+    return _config(environ.get('DATABASE_URL') or default, environ)
+
+
+def replica_configs(environ=None):
+    """Returns ``{alias: settings}`` of the read replicas.
+
+    Every ``DATABASE_URL_<NAME>`` variable is a replica with alias
+    ``<name>`` (e.g. ``DATABASE_URL_REPLICA1`` -> ``replica1``), with the
+    same connection options as the default database. Under test they
+    mirror the default database.
+    """
+    environ = os.environ if environ is None else environ
+    configs = {}
+    for name in sorted(environ):
+        alias = name[len(REPLICA_PREFIX):].lower()
+        if name.startswith(REPLICA_PREFIX) and alias != 'default' and environ[name]:
+            config = _config(environ[name], environ)
+            config['TEST'] = {'MIRROR': 'default'}
+            configs[alias] = config
+    return configs
+
+
+def _config(url, environ):
+    # Con CONN_HEALTH_CHECKS Django comprueba la conexion persistente antes
+    # de reutilizarla, y el pool antes de prestarla.
+    health_checks = _flag(environ, 'DB_CONN_HEALTH_CHECKS', True)
+    config = dj_database_url.parse(
+        url,
+        conn_max_age=_int(environ, 'DB_CONN_MAX_AGE', 600),
+        conn_health_checks=health_checks,
+    )
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        options = config.setdefault('OPTIONS', {})
+        for name, value in sqlite_options(environ).items():
+            options.setdefault(name, value)
+        return config
+    if config['ENGINE'] != 'django.db.backends.postgresql':
+        return config
+
+    options = config.setdefault('OPTIONS', {})
+    options.setdefault('connect_timeout', _int(environ, 'DB_CONNECT_TIMEOUT', 5))
+    use_pool = _flag(environ, 'DB_POOL', None)
+    if use_pool is None:
+        use_pool = pool_available()
+    if use_pool:
+        options['pool'] = pool_options(environ)
+        # El pool no admite conexiones persistentes: cada peticion devuelve
+        # la suya al pool al terminar.
+        config['CONN_MAX_AGE'] = 0
+    return config
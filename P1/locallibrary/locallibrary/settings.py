@@ -12,9 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-import dj_database_url
 from dotenv import load_dotenv
 
+from locallibrary.database import database_config, replica_configs
+
 # Cargar variables del fichero .env
 load_dotenv()
 
@@ -60,6 +61,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalog.middleware.MetricsMiddleware',
+    'catalog.middleware.SlowQueryMiddleware',
+    'catalog.middleware.AsyncViewsMiddleware',
+    'catalog.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,7 +72,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'catalog.middleware.StaticFilesMiddleware',
 ]
 
 ROOT_URLCONF = 'locallibrary.urls'
@@ -92,12 +97,103 @@ WSGI_APPLICATION = 'locallibrary.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Con PostgreSQL (psycopg 3) cada proceso usa un pool de conexiones; su
+# tamano, esperas y comprobaciones se ajustan con las variables DB_*
+# descritas en locallibrary/database.py.
 
 DATABASES = {
-    'default': dj_database_url.config(
-        default=f'sqlite:///{BASE_DIR / "db.sqlite3"}',
-        conn_max_age=600
-    )
+    'default': database_config(default=f'sqlite:///{BASE_DIR / "db.sqlite3"}')
+}
+
+# Replicas de lectura: una por cada variable DATABASE_URL_<NOMBRE>. Las
+# peticiones GET del catalogo leen de ellas (catalog/routers.py); tras una
+# escritura el cliente lee de la primaria durante
+# DATABASE_REPLICA_PIN_SECONDS, que debe cubrir el retraso de replicacion.
+DATABASES.update(replica_configs())
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_REPLICA_PIN_SECONDS = int(
+    os.environ.get('DATABASE_REPLICA_PIN_SECONDS', 10)
+)
+DATABASE_ROUTERS = ['catalog.routers.ReplicaRouter']
+
+# Cada cuantos segundos se ejecuta PRAGMA optimize en la conexion SQLite de
+# cada proceso (catalog/maintenance.py); 0 lo desactiva. Las pragmas de
+# rendimiento de SQLite se activan con DB_SQLITE_PROFILE=production (por
+# defecto, default: las de SQLite), ver locallibrary/database.py.
+DATABASE_OPTIMIZE_INTERVAL = int(
+    os.environ.get('DATABASE_OPTIMIZE_INTERVAL', 3600)
+)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Con REDIS_URL la cache se comparte entre todos los workers de gunicorn
+# (necesario para que la invalidacion de paginas sea global); si no, cada
+# proceso usa su propia cache en memoria.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'locallibrary',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Segundos que se guardan las paginas renderizadas del catalogo (0 = sin
+# cache). La invalidacion por cambios es inmediata, ver catalog/page_cache.py
+CATALOG_PAGE_CACHE_TIMEOUT = int(
+    os.environ.get('CATALOG_PAGE_CACHE_TIMEOUT', 600)
+)
+# Segundos que puede ir retrasada la faceta de disponibilidad del listado
+# de libros sin filtros (el resto de recuentos se invalida con cada cambio)
+CATALOG_FACET_AVAILABILITY_TIMEOUT = int(
+    os.environ.get('CATALOG_FACET_AVAILABILITY_TIMEOUT', 60)
+)
+# Los tests se ejecutan sin cache de paginas salvo donde la piden con
+# override_settings (ver catalog/tests/runner.py)
+TEST_RUNNER = 'catalog.tests.runner.CatalogTestRunner'
+
+
+# Metricas por vista (catalog/metrics.py). Con varios workers de gunicorn,
+# METRICS_DIR debe apuntar a un directorio compartido por todos ellos.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_DUMP_INTERVAL = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+
+# Registro de consultas lentas con su EXPLAIN (catalog/slow_queries.py).
+# Desactivado salvo que se defina SLOW_QUERY_THRESHOLD_MS.
+SLOW_QUERY_THRESHOLD_MS = (
+    float(os.environ['SLOW_QUERY_THRESHOLD_MS'])
+    if os.environ.get('SLOW_QUERY_THRESHOLD_MS') else None
+)
+# Repeticiones de una misma consulta en una peticion para avisar de un N+1
+SLOW_QUERY_REPEAT_THRESHOLD = int(
+    os.environ.get('SLOW_QUERY_REPEAT_THRESHOLD', 10)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'catalog.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -144,6 +240,37 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = '/'
 
+# Los permisos de cada usuario (suyos y de sus grupos) se guardan en la
+# cache compartida durante CATALOG_PERMISSION_CACHE_TIMEOUT segundos (0 =
+# sin cache); cada cambio los invalida, ver catalog/permissions.py
+AUTHENTICATION_BACKENDS = ['catalog.permissions.CachedModelBackend']
+CATALOG_PERMISSION_CACHE_TIMEOUT = int(
+    os.environ.get('CATALOG_PERMISSION_CACHE_TIMEOUT', 3600)
+)
+
+# Contador de visitas de la portada: se acumula en memoria y se vuelca a la
+# base de datos cada VISIT_FLUSH_INTERVAL segundos o VISIT_FLUSH_BATCH visitas
+VISIT_FLUSH_INTERVAL = int(os.environ.get('VISIT_FLUSH_INTERVAL', 30))
+VISIT_FLUSH_BATCH = int(os.environ.get('VISIT_FLUSH_BATCH', 500))
+
+# Paginacion de los listados del catalogo: 'offset' (paginador de Django,
+# con COUNT) o 'keyset' (por cursor, sin COUNT ni OFFSET)
+CATALOG_PAGINATION_MODE = os.environ.get('CATALOG_PAGINATION_MODE', 'offset')
+
+# En modo 'offset', los listados sin filtrar de tablas con al menos estas
+# filas toman el total de las estadisticas del planificador en vez de
+# hacer COUNT(*) (ver catalog/pagination.py)
+CATALOG_ESTIMATED_COUNT_THRESHOLD = int(
+    os.environ.get('CATALOG_ESTIMATED_COUNT_THRESHOLD', 100_000)
+)
+
+# Las peticiones ASGI (locallibrary/asgi.py) usan las vistas asincronas de
+# catalog/async_views.py; CATALOG_ASYNC_VIEWS=0 las desactiva.
+CATALOG_ASYNC_URLCONF = (
+    'locallibrary.urls_async'
+    if os.environ.get('CATALOG_ASYNC_VIEWS', '1') != '0' else None
+)
+
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # Configuración de seguridad para producción (Render)
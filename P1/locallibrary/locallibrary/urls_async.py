@@ -0,0 +1,14 @@
+"""
+Root URL configuration for ASGI requests: locallibrary.urls with the
+catalog routes of catalog.urls_async (see catalog.middleware).
+"""
+from django.urls import include, path
+
+import catalog.urls
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('catalog/', include('catalog.urls_async'))
+    if getattr(pattern, 'urlconf_name', None) is catalog.urls else pattern
+    for pattern in sync_urlpatterns
+]